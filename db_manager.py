@@ -8,14 +8,22 @@ import os
 import sys
 import argparse
 from datetime import datetime, timedelta
+from urllib.request import pathname2url
 
 def get_db_path():
     """Get the database path"""
     return "recommendations.db"
 
+def connect_readonly(db_path):
+    """Open the database read-only, so reports never take the write lock from the running apps"""
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
 def show_stats(db_path):
     """Show database statistics"""
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     cursor = conn.cursor()
     
     try:
@@ -138,7 +146,7 @@ def backup_database(db_path, backup_path=None):
     
     try:
         # Use SQLite's backup API for consistent backup
-        source = sqlite3.connect(db_path)
+        source = connect_readonly(db_path)
         backup = sqlite3.connect(backup_path)
         
         source.backup(backup)
@@ -155,7 +163,7 @@ def backup_database(db_path, backup_path=None):
 
 def analyze_patterns(db_path):
     """Analyze user behavior patterns"""
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     cursor = conn.cursor()
     
     try:
@@ -220,7 +228,7 @@ def export_data(db_path, format='csv'):
     import csv
     import json
     
-    conn = sqlite3.connect(db_path)
+    conn = connect_readonly(db_path)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -2,112 +2,50 @@
 
 import os
 import sys
-import csv
 import random
-import subprocess
 import webbrowser
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared_models.feed_index import FeedIndex
+from shared_models.feed_items import ArticleItem
+from shared_models.url_state import UrlStateFile
+
 # Configuration - matching the web app
 FEEDS_DIR = os.path.expanduser("~/rss/news/feeds")
 URLS_FILE = os.path.expanduser("~/rss/urls")
 
-# Increase CSV field size limit to handle large RSS fields
-try:
-    csv.field_size_limit(10 * 1024 * 1024)  # 10 MB
-except OverflowError:
-    max_limit = 2147483647
-    csv.field_size_limit(max_limit)
-
-def read_urls_file():
-    """Read the list of read URLs"""
-    if not os.path.exists(URLS_FILE):
-        return set()
-
-    with open(URLS_FILE, 'r') as f:
-        return set(line.strip() for line in f if line.strip())
-
-def parse_feed_file(filepath):
-    """Parse a single sfeed TSV file"""
-    items = []
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f, delimiter='\t')
-            for row_num, row in enumerate(reader, 1):
-                try:
-                    if len(row) >= 8:
-                        timestamp, title, link, content, content_type, guid, author, enclosure = row[:8]
-
-                        # Convert timestamp to readable format
-                        try:
-                            dt = datetime.fromtimestamp(int(timestamp))
-                            formatted_date = dt.strftime('%Y-%m-%d %H:%M')
-                        except (ValueError, TypeError):
-                            formatted_date = "Unknown"
-
-                        items.append({
-                            'timestamp': timestamp,
-                            'title': title,
-                            'link': link,
-                            'date': formatted_date,
-                            'feed_name': os.path.basename(filepath)
-                        })
-                except Exception as row_error:
-                    print(f"Warning: Error parsing row {row_num} in {filepath}: {row_error}")
-                    continue
-    except Exception as e:
-        print(f"Error parsing {filepath}: {e}")
-
-    return items
+# Shares the news frontend's parsed-feed cache, so files it has already
+# parsed are not tokenized again
+FEED_CACHE_FILE = os.path.expanduser("~/rss/feed-cache-news.db")
 
 def get_unread_articles():
-    """Get all unread articles from all feeds"""
+    """Get all unread articles from all feeds, newest first"""
     if not os.path.exists(FEEDS_DIR):
         print(f"Error: Feeds directory {FEEDS_DIR} does not exist")
         return []
 
-    all_items = []
-    read_urls = read_urls_file()
-
-    for filename in os.listdir(FEEDS_DIR):
-        filepath = os.path.join(FEEDS_DIR, filename)
-        if os.path.isfile(filepath):
-            items = parse_feed_file(filepath)
-            # Filter out read articles
-            unread_items = [item for item in items if item['link'] not in read_urls]
-            all_items.extend(unread_items)
+    index = FeedIndex(FEEDS_DIR, ArticleItem, {'read': URLS_FILE}, cache_path=FEED_CACHE_FILE,
+                      executor='process')
+    return index.query(exclude=('read',))
 
-    # Sort by timestamp (newest first)
-    all_items.sort(key=lambda x: int(x['timestamp']) if x['timestamp'].isdigit() else 0, reverse=True)
-    return all_items
+def format_date(timestamp):
+    """Convert a unix timestamp to a readable date"""
+    try:
+        return datetime.fromtimestamp(int(timestamp)).strftime('%Y-%m-%d %H:%M')
+    except (ValueError, TypeError):
+        return "Unknown"
 
 def mark_articles_read(urls):
-    """Mark articles as read using sfeed_markread"""
+    """Mark articles as read in the sfeed urls file, as sfeed_markread would"""
     if not urls:
         return True
 
     try:
-        # Format URLs with newlines for sfeed_markread
-        urls_input = '\n'.join(urls) + '\n'
-
-        # Use sfeed_markread to mark the URLs as read
-        process = subprocess.Popen(
-            ['sfeed_markread', 'read', URLS_FILE],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-
-        stdout, stderr = process.communicate(input=urls_input)
-
-        if process.returncode == 0:
-            return True
-        else:
-            print(f"Error marking articles as read: {stderr}")
-            return False
-    except Exception as e:
-        print(f"Error running sfeed_markread: {e}")
+        UrlStateFile(URLS_FILE, journal=False).add_many(urls)
+        return True
+    except OSError as e:
+        print(f"Error marking articles as read: {e}")
         return False
 
 def main():
@@ -149,17 +87,17 @@ def main():
         print(f"Randomly selected {num_articles} articles")
 
     # Extract URLs for marking as read
-    urls_to_mark = [article['link'] for article in selected_articles]
+    urls_to_mark = [article['url'] for article in selected_articles]
 
     # Open articles in browser
     print("\nOpening articles:")
     for i, article in enumerate(selected_articles, 1):
         print(f"{i:2d}. {article['title'][:80]}{'...' if len(article['title']) > 80 else ''}")
-        print(f"     {article['link']}")
-        print(f"     [{article['feed_name']}] {article['date']}")
+        print(f"     {article['url']}")
+        print(f"     [{article['source']}] {format_date(article['timestamp'])}")
 
         try:
-            webbrowser.open(article['link'])
+            webbrowser.open(article['url'])
         except Exception as e:
             print(f"     Warning: Could not open URL: {e}")
 
@@ -0,0 +1,311 @@
+"""
+Persistent cache of parsed sfeed files.
+
+Parsed items are stored in an SQLite sidecar under ~/rss, keyed by the feed
+file path and validated against its mtime and size, so a freshly started
+frontend can load pre-parsed items instead of re-tokenizing every TSV file.
+Each file's items are stored as the list of their to_row() tuples (str and
+int fields, no flags: those come from the URL state files), serialized with
+marshal, which loads such tuples much faster than re-parsing the TSV.
+
+Each entry also remembers how far the file was parsed and a checksum of the
+bytes just before that point. When a file has only grown since, callers can
+parse just the appended bytes (see read_feed_file) and store the new rows as
+one more chunk of the entry, keyed by the offset they were parsed from,
+instead of rewriting all of the file's rows.
+"""
+import marshal
+import multiprocessing
+import os
+import sqlite3
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .sqlite_pool import ConnectionPool
+
+# Bumped whenever the parsed_feeds or feed_chunks table layout changes
+SCHEMA_VERSION = 3
+
+# Number of bytes before the parsed offset covered by the tail checksum
+TAIL_BYTES = 4096
+
+# Appended chunks an entry may have before they are merged back into one
+MAX_CHUNKS = 32
+
+# Below this many changed files a pool costs more than it saves
+PARALLEL_MIN_FILES = 8
+
+# Start method of worker processes. Never fork: a forked child of a
+# threaded process inherits whatever locks other threads held at the time
+PROCESS_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# State of a feed file at the time it was parsed. offset is the number of
+# bytes consumed (None when the file did not end on a line boundary, which
+# forces a full re-parse next time) and tail the CRC32 of the TAIL_BYTES
+# bytes before offset.
+FeedFileState = namedtuple('FeedFileState', ['mtime', 'size', 'offset', 'tail'])
+
+
+def _tail_checksum(f, offset):
+    """Return the CRC32 of the TAIL_BYTES bytes of f preceding offset"""
+    start = max(0, offset - TAIL_BYTES)
+    f.seek(start)
+    return zlib.crc32(f.read(offset - start))
+
+
+def read_feed_file(filepath, stat, previous=None):
+    """
+    Read the bytes of a feed file that still need to be parsed.
+
+    If previous describes an earlier parse and the file has only been
+    appended to since (same bytes before the old offset), only the new
+    bytes are read. Otherwise the whole file is read.
+
+    Args:
+        filepath: feed file to read
+        stat: os.stat result for filepath
+        previous: FeedFileState of the last parse, or None
+
+    Returns:
+        (data, appended, state): the raw bytes to parse, whether they are
+        an append to the previously parsed items, and the new FeedFileState
+    """
+    with open(filepath, 'rb') as f:
+        appended = False
+        start = 0
+        if (previous is not None and previous.offset is not None
+                and previous.offset <= stat.st_size
+                and _tail_checksum(f, previous.offset) == previous.tail):
+            appended = True
+            start = previous.offset
+
+        f.seek(start)
+        data = f.read()
+        size = start + len(data)
+
+        if size == 0 or data.endswith(b'\n') or (appended and not data):
+            tail = _tail_checksum(f, size)
+            offset = size
+        else:
+            tail = None
+            offset = None
+
+    return data, appended, FeedFileState(stat.st_mtime, size, offset, tail)
+
+
+def _parse_job(job):
+    """Read and parse one feed file; runs in a worker process or thread"""
+    filepath, stat, previous, parse = job
+    data, appended, state = read_feed_file(filepath, stat, previous)
+    return appended, state, parse(data, filepath, state.size - len(data))
+
+
+def parse_feed_files(jobs, parse, workers=None, executor='thread'):
+    """
+    Read and parse several feed files, fanning out to a pool when worthwhile.
+
+    Args:
+        jobs: list of (filepath, stat, previous FeedFileState or None)
+        parse: function(data, filepath, start) parsing the raw bytes read
+            from filepath at offset start; it must be picklable (e.g. a
+            module-level function or classmethod) when executor is 'process'
+        workers: pool size; None uses the CPU count, 0 or 1 parses serially
+        executor: 'thread' for threads, 'process' for a ProcessPoolExecutor
+            started with PROCESS_START_METHOD; worker processes import the
+            __main__ module, so it must not do real work at import time
+
+    Returns:
+        list aligned with jobs holding (appended, state, items) for each file,
+        or the exception raised while reading or parsing it
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    tasks = [(filepath, stat, previous, parse) for filepath, stat, previous in jobs]
+
+    if workers <= 1 or len(tasks) < PARALLEL_MIN_FILES:
+        results = []
+        for task in tasks:
+            try:
+                results.append(_parse_job(task))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    max_workers = min(workers, len(tasks))
+    try:
+        if executor == 'process':
+            pool = ProcessPoolExecutor(max_workers=max_workers,
+                                       mp_context=multiprocessing.get_context(PROCESS_START_METHOD))
+        else:
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+        with pool:
+            futures = [pool.submit(_parse_job, task) for task in tasks]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+            return results
+    except (OSError, RuntimeError) as e:
+        # e.g. process creation not permitted; parse in this process instead
+        print(f"Parallel feed loading unavailable, parsing serially: {e}")
+        return parse_feed_files(jobs, parse, workers=1)
+
+
+class FeedCache:
+    """
+    Disk-backed cache of parsed feed files.
+
+    Args:
+        cache_path: SQLite file to store the cache in
+        format_version: bumped by the caller whenever the shape of parsed
+            items changes; entries written under another version are discarded
+    """
+
+    def __init__(self, cache_path, format_version=1):
+        self.cache_path = cache_path
+        self.format_version = format_version
+        # A few shared connections, opened on first use
+        self._pool = ConnectionPool(cache_path)
+        self._disabled = False
+        try:
+            self._init_database()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Feed cache disabled ({cache_path}): {e}")
+            self._disabled = True
+
+    def close(self):
+        """Close the connections to the cache database"""
+        self._pool.close()
+
+    def _init_database(self):
+        """Create the cache schema and drop entries from other item formats"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with self._pool.connection() as conn, conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+            versions = dict(conn.execute("SELECT key, value FROM cache_meta").fetchall())
+            if (versions.get('schema_version') != SCHEMA_VERSION
+                    or versions.get('format_version') != self.format_version):
+                conn.execute("DROP TABLE IF EXISTS parsed_feeds")
+                conn.execute("DROP TABLE IF EXISTS feed_chunks")
+                conn.executemany("""
+                    INSERT OR REPLACE INTO cache_meta (key, value) VALUES (?, ?)
+                """, [('schema_version', SCHEMA_VERSION), ('format_version', self.format_version)])
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS parsed_feeds (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    parsed_offset INTEGER,
+                    tail_checksum INTEGER
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS feed_chunks (
+                    path TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    items BLOB NOT NULL,
+                    PRIMARY KEY (path, start)
+                ) WITHOUT ROWID
+            """)
+
+    def get(self, path):
+        """
+        Return (FeedFileState, items) from the last time path was parsed,
+        or None. The caller decides whether the state is still current.
+        """
+        if self._disabled:
+            return None
+        try:
+            # One statement, so the state and the chunks come from the same commit
+            with self._pool.connection() as conn:
+                rows = conn.execute("""
+                    SELECT f.mtime, f.size, f.parsed_offset, f.tail_checksum, c.items
+                    FROM parsed_feeds f JOIN feed_chunks c ON c.path = f.path
+                    WHERE f.path = ? ORDER BY c.start
+                """, (path,)).fetchall()
+            if not rows:
+                return None
+            items = []
+            for row in rows:
+                items.extend(marshal.loads(row[4]))
+            return FeedFileState(*rows[0][:4]), items
+        except (sqlite3.Error, ValueError, EOFError, TypeError) as e:
+            print(f"Error reading feed cache for {path}: {e}")
+            return None
+
+    def put(self, path, state, items, appended_at=None):
+        """
+        Store the parsed items of path together with its FeedFileState.
+
+        With appended_at, items are only the ones parsed from that file
+        offset on. They are added as a new chunk of the stored entry, so an
+        append costs as much as the appended rows rather than the whole
+        file; every MAX_CHUNKS appends the chunks are merged into one.
+        """
+        if self._disabled:
+            return
+        try:
+            with self._pool.connection() as conn, conn:
+                if appended_at is None:
+                    conn.execute("DELETE FROM feed_chunks WHERE path = ?", (path,))
+                else:
+                    row = conn.execute("SELECT parsed_offset FROM parsed_feeds WHERE path = ?",
+                                       (path,)).fetchone()
+                    if row is None or row[0] != appended_at:
+                        # The stored entry is not the one that was appended to;
+                        # drop it so that the next load parses the whole file
+                        self._delete(conn, [path])
+                        return
+                conn.execute("""
+                    INSERT OR REPLACE INTO parsed_feeds
+                    (path, mtime, size, parsed_offset, tail_checksum)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (path, state.mtime, state.size, state.offset, state.tail))
+                if appended_at is None or items:
+                    conn.execute("""
+                        INSERT OR REPLACE INTO feed_chunks (path, start, items) VALUES (?, ?, ?)
+                    """, (path, appended_at or 0, marshal.dumps(items)))
+                if appended_at is not None:
+                    self._merge_chunks(conn, path)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error writing feed cache for {path}: {e}")
+
+    def _merge_chunks(self, conn, path):
+        """Merge the chunks of path into one once there are more than MAX_CHUNKS"""
+        count = conn.execute("SELECT COUNT(*) FROM feed_chunks WHERE path = ?", (path,)).fetchone()[0]
+        if count <= MAX_CHUNKS:
+            return
+        items = []
+        for (blob,) in conn.execute("SELECT items FROM feed_chunks WHERE path = ? ORDER BY start", (path,)):
+            items.extend(marshal.loads(blob))
+        conn.execute("DELETE FROM feed_chunks WHERE path = ?", (path,))
+        conn.execute("INSERT INTO feed_chunks (path, start, items) VALUES (?, 0, ?)",
+                     (path, marshal.dumps(items)))
+
+    @staticmethod
+    def _delete(conn, paths):
+        params = [(path,) for path in paths]
+        conn.executemany("DELETE FROM parsed_feeds WHERE path = ?", params)
+        conn.executemany("DELETE FROM feed_chunks WHERE path = ?", params)
+
+    def discard_missing(self, existing_paths):
+        """Remove entries for feed files that no longer exist"""
+        if self._disabled:
+            return
+        try:
+            with self._pool.connection() as conn:
+                cached = {row[0] for row in conn.execute("SELECT path FROM parsed_feeds")}
+                stale = cached - set(existing_paths)
+                if stale:
+                    with conn:
+                        self._delete(conn, stale)
+        except sqlite3.Error as e:
+            print(f"Error pruning feed cache: {e}")
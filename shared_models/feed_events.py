@@ -0,0 +1,90 @@
+"""
+Server-sent events announcing feed changes.
+
+Clients keep one /api/events connection open instead of re-fetching whole
+pages to find out whether anything changed. The generator below checks
+the feed generation and, when it moved, sends one of:
+- 'new_items': feed files brought items newer than any seen before
+- 'state': only read/bookmark/star/dislike state or older items changed
+Comment lines are sent in between so proxies keep the connection open and
+a closed client is noticed.
+
+Checking the generation can mean a stat of every feed file (e.g. the news
+article store, which has no watcher), so all clients of a process share
+one SharedPoll: however many are connected, the feeds are checked at most
+once per EVENT_INTERVAL.
+"""
+import json
+import threading
+import time
+
+# Seconds between generation checks per connected client
+EVENT_INTERVAL = 2.0
+
+# Seconds without an event after which a keep-alive comment is sent
+HEARTBEAT_INTERVAL = 30.0
+
+# Most new items counted for one 'new_items' event
+NEW_ITEMS_LIMIT = 500
+
+
+class SharedPoll:
+    """
+    Wraps get_generation so that calls within interval seconds of the last
+    check return its result instead of checking again.
+    """
+
+    def __init__(self, get_generation, interval=EVENT_INTERVAL):
+        self.get_generation = get_generation
+        self.interval = interval
+        self._generation = None
+        self._checked = None  # time.monotonic() of the last check
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._checked is None or now - self._checked >= self.interval:
+                self._generation = self.get_generation()
+                self._checked = now
+            return self._generation
+
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def feed_events(get_generation, newest_items, interval=EVENT_INTERVAL, heartbeat=HEARTBEAT_INTERVAL):
+    """
+    Yield server-sent events for feed changes, forever.
+
+    Args:
+        get_generation: refreshes the feeds and returns their generation;
+            pass the process-wide SharedPoll so clients share its checks
+        newest_items: callable(count) returning (newest items, total) of
+            all feeds, newest first
+        interval, heartbeat: seconds between checks and keep-alives
+    """
+    generation = get_generation()
+    items, _ = newest_items(1)
+    newest = items[0].time if items else 0
+    yield sse_event('hello', {'generation': generation})
+
+    last_sent = time.monotonic()
+    while True:
+        time.sleep(interval)
+        current = get_generation()
+        if current != generation:
+            generation = current
+            items, total = newest_items(NEW_ITEMS_LIMIT)
+            new_count = sum(1 for item in items if item.time > newest)
+            if new_count:
+                newest = items[0].time
+                yield sse_event('new_items', {'generation': generation, 'count': new_count, 'total': total})
+            else:
+                yield sse_event('state', {'generation': generation, 'total': total})
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= heartbeat:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
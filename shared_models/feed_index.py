@@ -0,0 +1,440 @@
+"""
+Shared index over an sfeed feed directory.
+
+A FeedIndex owns everything between the TSV files on disk and the item
+lists the frontends serve: parsing (through the persistent FeedCache and
+parse_feed_files), the URL state files that drive per-item flags such as
+'read' or 'starred', optional de-duplication by URL, and a date-sorted
+merged view. Both web frontends and scripts/sfeed_random.py go through it,
+so a parsing or caching improvement only has to be made here.
+
+Items are the compact records from feed_items (VideoItem, ArticleItem),
+whose class also supplies the parser and the URL field.
+
+Each flag filter that has been queried (a view such as unread or
+bookmarked) is kept as a sorted list of positions in the merged list.
+When only URL state files change, the URLs that were added or removed are
+applied to those lists in place, so a click does not re-filter every item
+and date-desc pages are plain slices.
+"""
+import os
+import threading
+from bisect import bisect_left, insort
+from operator import attrgetter, itemgetter
+
+from .feed_cache import FeedCache, parse_feed_files
+from .feed_items import content_cache, search_content
+from .feed_watcher import FeedWatcher
+from .search_index import SYNC_UPDATE_ITEMS, SearchIndex, mask_positions
+from .url_state import read_urls_file
+
+SORT_KEYS = ('date-desc', 'date-asc', 'title-asc', 'author-asc')
+
+
+# Sort key for an item's unix timestamp (0 when it could not be parsed)
+_by_time = attrgetter('time')
+
+
+class FeedIndex:
+    """
+    Parsed, flagged and sorted view of one sfeed feed directory.
+
+    Args:
+        feeds_dir: directory holding one sfeed TSV file per feed
+        item_class: FeedItem subclass the files are parsed into
+        state_files: {flag: path} of URL files; every item gets each flag set
+            to whether its URL field is listed in the corresponding file
+        cache_path: FeedCache file for parsed items, or None to keep them in
+            memory only
+        dedupe: keep only the most recent item for each URL
+        workers, executor: passed on to parse_feed_files
+        search_fields: item fields searched by query(); they are covered by
+            an inverted index built on the first search
+        watcher: FeedWatcher mode ('auto', 'inotify', 'poll'), or None to
+            check the files on every refresh
+    """
+
+    def __init__(self, feeds_dir, item_class, state_files, cache_path=None,
+                 dedupe=False, workers=None, executor='thread', search_fields=('title',),
+                 watcher=None):
+        self.feeds_dir = feeds_dir
+        self.item_class = item_class
+        self.state_files = dict(state_files)
+        self.dedupe = dedupe
+        self.workers = workers
+        self.executor = executor
+        self._feed_cache = FeedCache(cache_path, item_class.FORMAT_VERSION) if cache_path else None
+        self._feed_cache_pruned = False
+        self._lock = threading.RLock()
+
+        self._files = {}  # {filepath: (mtime, items, FeedFileState)}
+        self._url_sets = {}  # {flag: (mtime, urls)}
+        self._items = []
+        self._file_items = {}  # {filepath: items} of the merged list, in merge order
+        self._members = None  # ids of the items that survived de-duplication
+        self._applied_urls = {}  # {flag: urls} the item flags currently reflect
+        self._views = {}  # {(include, exclude): ascending positions in self._items}
+        self._url_positions = None  # {url: positions in self._items}, built on demand
+        self._signature = None
+        self.generation = 0
+        self._search_index = SearchIndex(search_fields)
+        self._watcher = FeedWatcher(feeds_dir, self.state_files.values(), watcher) if watcher else None
+        self._watch_version = None  # watcher version the last scan started from
+        self._url_sets_stale = False  # invalidate_url_sets() was called since the last refresh
+
+    def _cached_feed(self, filepath):
+        """Return the cache entry of a feed file, loading it from the on-disk cache if needed"""
+        cached = self._files.get(filepath)
+        if cached is None and self._feed_cache is not None:
+            # Fall back to the on-disk cache from a previous run
+            stored = self._feed_cache.get(filepath)
+            if stored is not None:
+                state, rows = stored
+                from_row = self.item_class.from_row
+                cached = (state.mtime, [from_row(row) for row in rows], state)
+                self._files[filepath] = cached
+        return cached
+
+    def _load_feed_files(self, files):
+        """
+        Return {filepath: items} for a list of (filename, filepath, stat).
+
+        Unchanged files come from the cache. Changed files are parsed in a
+        worker pool when there are enough of them, and files that have only
+        been appended to are parsed from their previous end. Files that fail
+        to parse are left out.
+        """
+        loaded = {}
+        jobs = []
+        for _, filepath, stat in files:
+            cached = self._cached_feed(filepath)
+            if cached and cached[0] == stat.st_mtime and cached[2].size == stat.st_size:
+                loaded[filepath] = cached[1]
+            else:
+                jobs.append((filepath, stat, cached[2] if cached else None))
+
+        results = parse_feed_files(jobs, self.item_class.parse, self.workers, self.executor)
+        for (filepath, stat, previous), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                print(f"Error parsing feed file {filepath}: {result}")
+                continue
+
+            appended, state, new_items = result
+            if appended:
+                items = self._files[filepath][1] + new_items
+            else:
+                # Offsets from before a rewrite no longer point at the same bodies
+                content_cache.discard(filepath)
+                items = new_items
+            self._files[filepath] = (stat.st_mtime, items, state)
+            if self._feed_cache is not None:
+                # An append only stores the new rows, after the cached ones
+                self._feed_cache.put(filepath, state, [item.to_row() for item in new_items],
+                                     appended_at=previous.offset if appended else None)
+            loaded[filepath] = items
+
+        return loaded
+
+    def _url_set(self, flag):
+        """Return (mtime, urls) for a state file, re-reading it only when it changed"""
+        path = self.state_files[flag]
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None, set()
+
+        cached = self._url_sets.get(flag)
+        if cached and cached[0] == mtime:
+            return cached
+        try:
+            cached = (mtime, read_urls_file(path))
+        except OSError as e:
+            print(f"Error reading {path}: {e}")
+            return None, set()
+        self._url_sets[flag] = cached
+        return cached
+
+    def refresh(self):
+        """
+        Bring the index up to date with the feed directory and state files.
+
+        Only feed files whose mtime or size changed are re-read. The merged
+        item list is rebuilt, and the generation bumped, only when something
+        changed. With a watcher, nothing is even checked until it reports a
+        change.
+        """
+        with self._lock:
+            watch_version = self._watcher.version if self._watcher is not None else None
+            if watch_version is not None and watch_version == self._watch_version:
+                if self._url_sets_stale and self._signature is not None:
+                    # Our own state file write: no need to rescan the feeds for it
+                    url_sets = {flag: self._url_set(flag) for flag in self.state_files}
+                    self._apply_url_sets(url_sets, self._signature[0])
+                return self._items
+            # Changes made while scanning bump the version again and are seen next time
+            self._watch_version = watch_version
+
+            try:
+                # scandir yields the file type and stat data in one pass over the directory
+                with os.scandir(self.feeds_dir) as entries:
+                    feed_files = [(entry.name, entry.path, entry.stat()) for entry in entries if entry.is_file()]
+            except OSError as e:
+                print(f"Warning: Cannot read feeds directory {self.feeds_dir}: {e}")
+                feed_files = []
+
+            url_sets = {flag: self._url_set(flag) for flag in self.state_files}
+            signature = (
+                tuple(sorted((filepath, stat.st_mtime, stat.st_size) for _, filepath, stat in feed_files)),
+                tuple(sorted((flag, mtime) for flag, (mtime, _) in url_sets.items()))
+            )
+            if signature == self._signature:
+                return self._items
+            if self._signature is not None and signature[0] == self._signature[0]:
+                # Only URL state files changed: update flags and views in place
+                self._apply_url_sets(url_sets, signature[0])
+                return self._items
+
+            loaded = self._load_feed_files(feed_files)
+            if not self._feed_cache_pruned and self._feed_cache is not None:
+                # Forget feeds that were removed while nothing was watching the directory
+                self._feed_cache.discard_missing([filepath for _, filepath, _ in feed_files])
+                self._feed_cache_pruned = True
+
+            url_field = self.item_class.URL_FIELD
+            all_items = []
+            file_items = {}
+            for _, filepath, _ in feed_files:
+                items = loaded.get(filepath)
+                if items is None:
+                    continue
+                file_items[filepath] = items
+                # Update status flags on the (possibly cached) items
+                for flag, (_, urls) in url_sets.items():
+                    for item in items:
+                        setattr(item, flag, getattr(item, url_field) in urls)
+                all_items.extend(items)
+
+            # Drop files that disappeared from the in-memory cache as well
+            present = {filepath for _, filepath, _ in feed_files}
+            for filepath in list(self._files):
+                if filepath not in present:
+                    del self._files[filepath]
+                    content_cache.discard(filepath)
+
+            if self.dedupe:
+                # Keep only the most recent entry for each URL
+                url_to_item = {}
+                for item in all_items:
+                    url = getattr(item, url_field)
+                    existing = url_to_item.get(url)
+                    if existing is None or item.time > existing.time:
+                        url_to_item[url] = item
+                all_items = list(url_to_item.values())
+                self._members = {id(item) for item in all_items}
+
+            all_items.sort(key=_by_time, reverse=True)
+            self._items = all_items
+            self._file_items = file_items
+            self._applied_urls = {flag: urls for flag, (_, urls) in url_sets.items()}
+            self._views = {}
+            self._url_positions = None
+            self._signature = signature
+            self._url_sets_stale = False
+            self.generation += 1
+
+            # Keep the search index in step without holding up this request
+            search_index = self._search_index
+            if not search_index.building and search_index.pending(file_items) > SYNC_UPDATE_ITEMS:
+                search_index.update_in_background(file_items)
+            return all_items
+
+    def _apply_url_sets(self, url_sets, feed_signature):
+        """Bring item flags and views in line with changed URL sets, keeping the parsed feeds"""
+        self._apply_url_changes(url_sets)
+        self._signature = (feed_signature, tuple(sorted((flag, mtime) for flag, (mtime, _) in url_sets.items())))
+        self._url_sets_stale = False
+        self.generation += 1
+
+    def _apply_url_changes(self, url_sets):
+        """Apply the URLs added to or removed from state files to item flags and views"""
+        url_field = self.item_class.URL_FIELD
+        if self._url_positions is None:
+            # Items dropped by de-duplication are re-flagged by the next full rebuild
+            positions = {}
+            for position, item in enumerate(self._items):
+                positions.setdefault(getattr(item, url_field), []).append(position)
+            self._url_positions = positions
+
+        for flag, (_, urls) in url_sets.items():
+            old_urls = self._applied_urls.get(flag, set())
+            if urls is old_urls:
+                continue
+            for url in old_urls ^ urls:
+                value = url in urls
+                for position in self._url_positions.get(url, ()):
+                    item = self._items[position]
+                    before = {key: self._matches(item, *key) for key in self._views}
+                    setattr(item, flag, value)
+                    for key, view in self._views.items():
+                        after = self._matches(item, *key)
+                        if after and not before[key]:
+                            insort(view, position)
+                        elif before[key] and not after:
+                            del view[bisect_left(view, position)]
+            self._applied_urls[flag] = urls
+
+    @staticmethod
+    def _matches(item, include, exclude):
+        return (all(getattr(item, flag) for flag in include)
+                and not any(getattr(item, flag) for flag in exclude))
+
+    def _view(self, include, exclude):
+        """Return the ascending positions of the items passing a flag filter"""
+        key = (tuple(include), tuple(exclude))
+        view = self._views.get(key)
+        if view is None:
+            view = [position for position, item in enumerate(self._items)
+                    if self._matches(item, *key)]
+            self._views[key] = view
+        return view
+
+    def items(self):
+        """Return all item records, newest first. The list is shared; do not modify it."""
+        return self.refresh()
+
+    def _indexed_search(self, search):
+        """
+        Return the items matching search in merged order, using the inverted
+        index, or None if the query needs a linear scan (including while the
+        index is still being built).
+        """
+        with self._lock:
+            search_index = self._search_index
+            if search_index.building:
+                return None
+            if search_index.pending(self._file_items) > SYNC_UPDATE_ITEMS:
+                search_index.update_in_background(self._file_items)
+                return None
+            search_index.update(self._file_items)
+            result = search_index.search(search)
+            if result is None:
+                return None
+
+            ranks = {filepath: rank for rank, filepath in enumerate(self._file_items)}
+            matches = []
+            for filepath, mask in result.items():
+                items = self._file_items[filepath]
+                for position in mask_positions(mask):
+                    item = items[position]
+                    if self._members is None or id(item) in self._members:
+                        matches.append((-item.time, ranks[filepath], position, item))
+        # Same order as the merged list: newest first, then file and position
+        matches.sort(key=itemgetter(0, 1, 2))
+        return [match[3] for match in matches]
+
+    def _scan(self, items, search, search_fields):
+        """Return the items with search as a substring of one of search_fields"""
+        fields = [field for field in search_fields if field != 'content']
+        hits = [any(search in (getattr(item, field) or '').lower() for field in fields) for item in items]
+        if 'content' in search_fields:
+            # Only items that did not already match need their bodies read
+            found = {id(item) for item in search_content(
+                [item for item, hit in zip(items, hits) if not hit], search)}
+            hits = [hit or id(item) in found for item, hit in zip(items, hits)]
+        return [item for item, hit in zip(items, hits) if hit]
+
+    def query(self, include=(), exclude=(), search=None, search_fields=None, sort_by='date-desc'):
+        """
+        Return a new list of the item records matching a filter.
+
+        Args:
+            include: flags that must be set on every returned item
+            exclude: flags that must not be set on any returned item
+            search: lowercase search string. One word matches as a substring
+                of any search field; several words must all match as word
+                prefixes. Strings with non-word characters are matched as a
+                plain substring.
+            search_fields: fields to search instead of the indexed ones;
+                searching other fields always scans linearly
+            sort_by: one of SORT_KEYS; unknown values sort newest first
+        """
+        with self._lock:
+            items = self.refresh()
+            if not search and (include or exclude):
+                items = [items[position] for position in self._view(include, exclude)]
+                include = exclude = ()
+        if search:
+            matches = None
+            if search_fields is None or tuple(search_fields) == self._search_index.fields:
+                matches = self._indexed_search(search)
+            if matches is None:
+                matches = self._scan(items, search, search_fields or self._search_index.fields)
+            items = matches
+        if include or exclude:
+            items = [
+                item for item in items
+                if all(getattr(item, flag) for flag in include)
+                and not any(getattr(item, flag) for flag in exclude)
+            ]
+        if items is self._items:
+            items = list(items)
+
+        # Items are kept newest first, so date-desc needs no sorting
+        if sort_by == 'date-asc':
+            items.sort(key=_by_time)
+        elif sort_by == 'title-asc':
+            items.sort(key=lambda x: x.title.lower())
+        elif sort_by == 'author-asc':
+            items.sort(key=lambda x: x.author.lower())
+        return items
+
+    def query_page(self, include=(), exclude=(), search=None, sort_by='date-desc', offset=0, count=None):
+        """
+        Return (items, total) for one page of query(). Unsearched date-desc
+        pages are sliced straight from the view, without building the list.
+        """
+        end = None if count is None else offset + count
+        if search or (sort_by in SORT_KEYS and sort_by != 'date-desc'):
+            items = self.query(include, exclude, search, sort_by=sort_by)
+            return items[offset:end], len(items)
+
+        with self._lock:
+            items = self.refresh()
+            positions = self._view(include, exclude) if include or exclude else range(len(items))
+            return [items[position] for position in positions[offset:end]], len(positions)
+
+    def invalidate_files(self, paths=None):
+        """Forget the parsed items of some (default: all) feed files so the next refresh re-reads them"""
+        with self._lock:
+            self._watch_version = None
+            for path in list(self._files) if paths is None else paths:
+                self._files.pop(path, None)
+            self._signature = None
+
+    def invalidate_url_sets(self, flags=None):
+        """
+        Forget the URL sets of some (default: all) state files. The next
+        refresh re-reads them and updates only the items whose URLs were
+        added or removed; parsed items and views are kept, and with a
+        watcher the feed directory is not rescanned.
+        """
+        with self._lock:
+            self._url_sets_stale = True
+            for flag in self.state_files if flags is None else flags:
+                self._url_sets.pop(flag, None)
+            if self._signature is not None:
+                # Keep the feed part so the refresh takes the URL-only path
+                self._signature = (self._signature[0], None)
+
+    def invalidate_views(self):
+        """Drop the derived view lists; they are rebuilt on their next query"""
+        with self._lock:
+            self._views = {}
+            self._url_positions = None
+
+    def invalidate(self):
+        """Drop everything held in memory so the next refresh re-reads all files"""
+        with self._lock:
+            self.invalidate_files()
+            self.invalidate_url_sets()
+            self.invalidate_views()
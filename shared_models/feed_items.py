@@ -0,0 +1,323 @@
+"""
+Compact records for parsed sfeed items.
+
+Each item is a __slots__ object instead of a dict: timestamps are stored as
+integers, repeated strings (authors, feed names, file paths) are interned,
+and fields that can be derived (video dates, thumbnail URLs, article IDs)
+are computed on access. Content fields (YouTube descriptions, full HTML
+article bodies) are not kept in memory at all: the record remembers where
+the field sits in the feed file and reads it back when asked, through a
+small byte-bounded LRU of recently used bodies.
+
+Records behave like read-only dicts (item['title'], item.get('video_id'),
+dict(item)) so the recommendation engine and templates can use them
+unchanged. Call to_dict() to get a JSON-serializable copy, which should only
+be done for the items actually being returned.
+
+Parsing works on raw bytes so content offsets are exact file positions.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Upper bound on the total size of content bodies kept in the LRU
+CONTENT_CACHE_BYTES = 8 * 1024 * 1024
+
+
+def extract_youtube_id(url):
+    """Extracts the YouTube video ID from various URL formats."""
+    if not url:
+        return None
+    patterns = [
+        r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/|youtube\.com/shorts/)([^&\n?#]+)',
+        r'youtube\.com/v/([^&\n?#]+)',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match:
+            return match.group(1)
+    return None
+
+
+def get_youtube_thumbnail(video_id):
+    """Generates a YouTube thumbnail URL from a video ID."""
+    if not video_id:
+        return None
+    return f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
+
+
+class ContentCache:
+    """LRU of content bodies keyed by (path, offset, length), bounded by total size"""
+
+    def __init__(self, max_bytes=CONTENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, offset, length):
+        """Return the content field at offset in path, reading the file on a miss"""
+        key = (path, offset, length)
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+                return content
+
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                content = f.read(length).decode('utf-8', errors='ignore')
+        except OSError as e:
+            print(f"Error reading content from {path}: {e}")
+            return ''
+
+        if length <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = content
+                    self._size += length
+                    while self._size > self.max_bytes:
+                        (_, _, evicted), _ = self._entries.popitem(last=False)
+                        self._size -= evicted
+        return content
+
+    def discard(self, path):
+        """Forget bodies read from path, e.g. after the file was rewritten"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                self._size -= key[2]
+                del self._entries[key]
+
+
+content_cache = ContentCache()
+
+
+def iter_contents(items):
+    """
+    Yield (item, content) for items, grouped by feed file.
+
+    Each feed file is read once and sliced, instead of going through the
+    LRU item by item.
+    """
+    by_path = {}
+    for item in items:
+        by_path.setdefault(item.path, []).append(item)
+
+    for path, path_items in by_path.items():
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print(f"Error reading content from {path}: {e}")
+            continue
+        for item in path_items:
+            end = item.content_offset + item.content_length
+            yield item, data[item.content_offset:end].decode('utf-8', errors='ignore')
+
+
+def search_content(items, search):
+    """Return the items whose content contains search (already lowercase)"""
+    matches = {id(item) for item, content in iter_contents(items) if search in content.lower()}
+    return [item for item in items if id(item) in matches]
+
+
+def _decode(field):
+    return field.decode('utf-8', errors='ignore')
+
+
+def _lines(data, start):
+    """Yield (file offset, line) for each line of a chunk read at offset start"""
+    offset = start
+    for line in data.split(b'\n'):
+        yield offset, line
+        offset += len(line) + 1
+
+
+class FeedItem:
+    """
+    Base class for item records.
+
+    Subclasses list the keys of their dict form in FIELDS (attributes or
+    properties of the same name), the URL state flags they carry in FLAGS,
+    and the field holding the item URL in URL_FIELD. FORMAT_VERSION is the
+    FeedCache format version of their to_row() output.
+
+    The content field is read on demand from path at content_offset.
+    """
+    __slots__ = ('time', '_timestamp_text', 'path', 'content_offset', 'content_length')
+
+    FIELDS = ()
+    FLAGS = ()
+    URL_FIELD = None
+    FORMAT_VERSION = 1
+
+    def _set_timestamp(self, text):
+        """Store a timestamp as an int, keeping the text only if it does not round-trip"""
+        try:
+            self.time = int(text) if text.isdigit() else 0
+        except ValueError:
+            self.time = 0
+        self._timestamp_text = None if text == str(self.time) else text
+
+    @property
+    def timestamp(self):
+        return str(self.time) if self._timestamp_text is None else self._timestamp_text
+
+    @property
+    def content(self):
+        return content_cache.get(self.path, self.content_offset, self.content_length)
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self.FIELDS:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        """Return the item as a plain dict, e.g. for jsonify"""
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild a record from the tuple returned by to_row()"""
+        return cls(*row)
+
+
+class VideoItem(FeedItem):
+    """A YouTube video parsed from an sfeed file"""
+    __slots__ = ('title', 'link', 'author', 'feed_name', 'video_id',
+                 'watched', 'bookmarked', 'starred', 'disliked')
+
+    FIELDS = ('timestamp', 'title', 'link', 'content', 'author', 'date', 'feed_name',
+              'video_id', 'thumbnail_url', 'watched', 'bookmarked', 'starred', 'disliked')
+    FLAGS = ('watched', 'bookmarked', 'starred', 'disliked')
+    URL_FIELD = 'link'
+    FORMAT_VERSION = 3
+
+    def __init__(self, timestamp, title, link, author, feed_name, video_id,
+                 path, content_offset, content_length):
+        self._set_timestamp(timestamp)
+        self.title = title
+        self.link = link
+        self.author = sys.intern(author)
+        self.feed_name = sys.intern(feed_name)
+        self.video_id = video_id
+        self.path = sys.intern(path)
+        self.content_offset = content_offset
+        self.content_length = content_length
+        self.watched = self.bookmarked = self.starred = self.disliked = False
+
+    @property
+    def date(self):
+        try:
+            return datetime.fromtimestamp(int(self.timestamp)).strftime('%Y-%m-%d')
+        except (ValueError, TypeError, OverflowError, OSError):
+            return "Unknown date"
+
+    @property
+    def thumbnail_url(self):
+        return get_youtube_thumbnail(self.video_id)
+
+    def to_row(self):
+        return (self.timestamp, self.title, self.link, self.author, self.feed_name, self.video_id,
+                self.path, self.content_offset, self.content_length)
+
+    @classmethod
+    def parse(cls, data, path, start):
+        """Parses sfeed TSV bytes read from path at offset start into videos."""
+        items = []
+        feed_name = os.path.basename(path)
+        for offset, line in _lines(data, start):
+            fields = line.rstrip(b'\r').split(b'\t')
+            if len(fields) < 8:
+                continue  # Skip malformed rows
+
+            title = _decode(fields[1]).strip()
+            link = _decode(fields[2]).strip()
+            author = _decode(fields[6]).strip()
+            video_id = extract_youtube_id(link)
+
+            if not all([title, link, author, video_id]):
+                continue # Skip if essential data is missing
+
+            content_offset = offset + len(fields[0]) + len(fields[1]) + len(fields[2]) + 3
+            items.append(cls(_decode(fields[0]), title, link, author, feed_name, video_id,
+                             path, content_offset, len(fields[3])))
+        return items
+
+
+class ArticleItem(FeedItem):
+    """A news article parsed from an sfeed file"""
+    __slots__ = ('title', 'url', 'author', 'source', '_article_id',
+                 'read', 'bookmarked', 'starred', 'disliked')
+
+    FIELDS = ('title', 'url', 'timestamp', 'author', 'content', 'read', 'bookmarked',
+              'starred', 'disliked', 'article_id', 'source')
+    FLAGS = ('read', 'bookmarked', 'starred', 'disliked')
+    URL_FIELD = 'url'
+    FORMAT_VERSION = 3
+
+    def __init__(self, timestamp, title, url, author, source, path, content_offset, content_length):
+        self._set_timestamp(timestamp)
+        self.title = title
+        self.url = url
+        self.author = sys.intern(author)
+        self.source = sys.intern(source)
+        self.path = sys.intern(path)
+        self.content_offset = content_offset
+        self.content_length = content_length
+        self._article_id = None
+        self.read = self.bookmarked = self.starred = self.disliked = False
+
+    @property
+    def article_id(self):
+        # Generate article ID from URL on first use
+        if self._article_id is None:
+            self._article_id = hashlib.md5(self.url.encode()).hexdigest()
+        return self._article_id
+
+    def to_row(self):
+        return (self.timestamp, self.title, self.url, self.author, self.source,
+                self.path, self.content_offset, self.content_length)
+
+    @classmethod
+    def parse(cls, data, path, start):
+        """Parse sfeed TSV bytes into articles; status flags are filled in by FeedIndex"""
+        file_articles = []
+        source = os.path.basename(path)
+        for offset, line in _lines(data, start):
+            stripped = line.strip()
+            if not stripped:
+                continue
+
+            # Parse sfeed format: timestamp\ttitle\turl\tcontent\tauthor_html\tid\tactual_author
+            parts = stripped.split(b'\t')
+            if len(parts) >= 5:
+                # Use actual author from field 6 if available, otherwise fall back to field 4
+                if len(parts) > 6 and parts[6].strip():
+                    author = _decode(parts[6])
+                else:
+                    author = _decode(parts[4]) if parts[4] != b'html' else 'Unknown'
+
+                # The body is only located here and read back when needed
+                content_offset = (offset + len(line) - len(line.lstrip())
+                                  + len(parts[0]) + len(parts[1]) + len(parts[2]) + 3)
+                file_articles.append(cls(_decode(parts[0]), _decode(parts[1]), _decode(parts[2]),
+                                         author, source, path, content_offset, len(parts[3])))
+
+        return file_articles
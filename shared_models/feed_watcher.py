@@ -0,0 +1,178 @@
+"""
+Change notification for a feed directory and its URL state files.
+
+A FeedWatcher lets FeedIndex.refresh() skip the directory scan and the
+stat calls on every feed and state file when nothing was written since the
+last refresh. A background thread bumps `version` whenever a watched file
+changes:
+- 'inotify' blocks on Linux inotify events (through ctypes, no extra
+  dependency) for the feed directory and the directories holding the
+  state files, ignoring unrelated files next to them
+- 'poll' re-checks the same mtimes and sizes every `interval` seconds
+- 'auto' uses inotify where available and polls otherwise
+
+When watching stops being reliable (queue overflow, a watched directory
+removed, the thread dying), `version` becomes None and callers go back to
+checking the files themselves on every request.
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+import time
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+# struct inotify_event header: wd, mask, cookie, len
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Seconds between checks in polling mode
+POLL_INTERVAL = 2.0
+
+
+def _load_libc():
+    """Return libc if it provides inotify, else None"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError, TypeError):
+        return None
+    return libc
+
+
+class FeedWatcher:
+    """
+    Args:
+        feeds_dir: directory whose files are all watched
+        files: further files to watch (URL state files)
+        mode: 'auto', 'inotify' or 'poll'
+        interval: seconds between checks in polling mode
+    """
+
+    def __init__(self, feeds_dir, files=(), mode='auto', interval=POLL_INTERVAL):
+        self.feeds_dir = os.path.abspath(feeds_dir)
+        self.files = [os.path.abspath(path) for path in files]
+        self.interval = interval
+        self._version = 0
+        self._reliable = True
+        self._lock = threading.Lock()
+
+        self._fd = None
+        if mode in ('auto', 'inotify'):
+            self._fd = self._start_inotify()
+            if self._fd is None and mode == 'inotify':
+                print("Warning: inotify is not available, polling for feed changes instead")
+        if self._fd is not None:
+            self.mode, target = 'inotify', self._watch_inotify
+        else:
+            # Taken before returning, so no change after construction is missed
+            self._poll_snapshot = self._snapshot()
+            self.mode, target = 'poll', self._watch_poll
+        self._thread = threading.Thread(target=self._run, args=(target,), name='feed-watcher', daemon=True)
+        self._thread.start()
+
+    @property
+    def version(self):
+        """Counter bumped on every change, or None if changes may go unnoticed"""
+        if not self._reliable or not self._thread.is_alive():
+            return None
+        return self._version
+
+    def _bump(self):
+        with self._lock:
+            self._version += 1
+
+    def _run(self, target):
+        try:
+            target()
+        except Exception as e:
+            print(f"Error in feed watcher: {e}")
+        self._reliable = False
+
+    def _start_inotify(self):
+        """Return an inotify fd watching the feed and state file directories, or None"""
+        libc = _load_libc()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            return None
+
+        # {watch descriptor: names of interest in that directory, or None for all}
+        self._watches = {}
+        directories = {self.feeds_dir: None}
+        for path in self.files:
+            directory, name = os.path.split(path)
+            if directory != self.feeds_dir:
+                directories.setdefault(directory, set()).add(name.encode())
+        for directory, names in directories.items():
+            wd = libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK)
+            if wd < 0:
+                print(f"Warning: Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+                os.close(fd)
+                return None
+            self._watches[wd] = names
+        return fd
+
+    def _watch_inotify(self):
+        while True:
+            data = os.read(self._fd, 64 * 1024)
+            changed = False
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += _EVENT_HEADER.size + length
+
+                if mask & (IN_Q_OVERFLOW | IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    # Events were lost or a watched directory went away
+                    self._reliable = False
+                    return
+                names = self._watches.get(wd)
+                if names is None or name in names:
+                    changed = True
+            if changed:
+                self._bump()
+
+    def _snapshot(self):
+        """Return the mtimes and sizes of everything watched"""
+        entries = []
+        try:
+            with os.scandir(self.feeds_dir) as it:
+                for entry in it:
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            pass
+        entries.sort()
+        for path in self.files:
+            try:
+                stat = os.stat(path)
+                entries.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                entries.append((path, None, None))
+        return entries
+
+    def _watch_poll(self):
+        snapshot = self._poll_snapshot
+        while True:
+            time.sleep(self.interval)
+            current = self._snapshot()
+            if current != snapshot:
+                snapshot = current
+                self._bump()
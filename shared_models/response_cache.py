@@ -0,0 +1,106 @@
+"""
+Conditional GET and a small LRU of built responses for the frontends.
+
+An endpoint passes the versions its response depends on (feed generation,
+preference version, file mtimes) and a function building the response.
+The versions make up the ETag:
+- a request whose If-None-Match carries it gets a 304 and nothing is built
+- a response already built for the same path, query and versions is sent
+  from the LRU instead of being recomputed and re-serialized
+Only 200 responses are kept; errors are rebuilt every time.
+"""
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+
+from flask import Response, request, stream_with_context
+
+# Built responses kept per process
+RESPONSE_CACHE_SIZE = 64
+
+# In-memory generations start over on restart, so ETags carry a per-process token
+_INSTANCE = uuid.uuid4().hex[:8]
+
+
+class ResponseCache:
+    def __init__(self, size=RESPONSE_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # (path, query) -> (etag, mimetype, body)
+        self._lock = threading.Lock()
+
+    def _get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, etag, mimetype, body):
+        with self._lock:
+            self._entries[key] = (etag, mimetype, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _etag(versions):
+        digest = hashlib.sha1(repr(tuple(versions)).encode('utf-8')).hexdigest()[:16]
+        return f"{_INSTANCE}-{digest}"
+
+    @staticmethod
+    def _finish(response, etag):
+        response.set_etag(etag)
+        # Let the browser keep the body but ask every time whether it is still current
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def _lookup(self, versions):
+        """Return (etag, key, response or None) for the current request"""
+        etag = self._etag(versions)
+        if request.if_none_match.contains(etag):
+            return etag, None, self._finish(Response(status=304), etag)
+        key = (request.path, request.query_string)
+        entry = self._get(key, etag)
+        if entry is not None:
+            return etag, key, self._finish(Response(entry[2], mimetype=entry[1]), etag)
+        return etag, key, None
+
+    def respond(self, versions, build):
+        """
+        Answer the current request from the cache or with build(), which
+        returns a Response (typically from jsonify).
+        """
+        etag, key, response = self._lookup(versions)
+        if response is not None:
+            return response
+        response = build()
+        if response.status_code != 200:
+            return response
+        self._put(key, etag, response.mimetype, response.get_data())
+        return self._finish(response, etag)
+
+    def respond_stream(self, versions, build, mimetype):
+        """
+        Like respond() for a streamed body: build() returns an iterator of
+        str chunks, which are sent as they come and cached once the stream
+        completes.
+        """
+        etag, key, response = self._lookup(versions)
+        if response is not None:
+            return response
+        chunks = build()
+
+        def stream():
+            sent = []
+            for chunk in chunks:
+                sent.append(chunk)
+                yield chunk
+            self._put(key, etag, mimetype, ''.join(sent).encode('utf-8'))
+
+        return self._finish(Response(stream_with_context(stream()), mimetype=mimetype), etag)
@@ -0,0 +1,249 @@
+"""
+Inverted index for searching feed items.
+
+Titles, authors and (for news) article bodies are tokenized into lowercase
+word tokens. For every token the index keeps, per feed file, a bitmask of
+the positions of the items containing it, so AND-ing query terms is an
+integer AND and removing or re-indexing a file only touches that file's
+entries. Indexing is incremental: appended items are added, rewritten
+files are re-indexed. A full build takes a few seconds on large archives,
+so big updates run in a background thread while callers keep answering
+searches with a linear scan; small ones are applied inline.
+
+Query semantics:
+- a single word keeps the old substring behaviour: it matches every token
+  containing it, which gives exactly the items whose fields contain it
+- several words must all match (AND), each as a token prefix
+Matching tokens are found without walking the whole vocabulary: prefixes
+by bisecting a sorted token list, substrings through a map from each
+trigram to the tokens containing it.
+Queries with non-word characters cannot be answered from word tokens, so
+search() returns None and the caller falls back to a linear scan.
+"""
+import re
+import sys
+import threading
+from bisect import bisect_left
+from itertools import islice
+
+from .feed_items import iter_contents
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Updates touching at most this many items are applied inline by searches
+SYNC_UPDATE_ITEMS = 2000
+
+# Substring terms shorter than this have no trigram to look up; they are
+# checked against every token (they match a large share of them anyway)
+TRIGRAM_LENGTH = 3
+
+
+def tokenize(text):
+    """Return the set of lowercase word tokens in text"""
+    return set(TOKEN_RE.findall(text.lower()))
+
+
+def trigrams(token):
+    """Return the set of 3-character substrings of token"""
+    return {token[i:i + TRIGRAM_LENGTH] for i in range(len(token) - TRIGRAM_LENGTH + 1)}
+
+
+def mask_positions(mask):
+    """Yield the positions of the bits set in mask, ascending"""
+    bits = bin(mask)[:1:-1]
+    position = bits.find('1')
+    while position != -1:
+        yield position
+        position = bits.find('1', position + 1)
+
+
+class SearchIndex:
+    """
+    Token index over the items of several feed files.
+
+    Args:
+        fields: item fields to index; 'content' is read from the feed files
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._postings = {}  # {token: {path: bitmask of item positions}}
+        self._trigrams = {}  # {trigram: set of tokens containing it}
+        self._sorted_tokens = None  # sorted(self._postings), rebuilt after vocabulary changes
+        self._files = {}  # {path: (indexed items, tokens)}
+        self._lock = threading.Lock()
+        self._builder = None
+
+    def _index_items(self, path, items, start, tokens):
+        """Add items[start:] of a file to the postings"""
+        new_items = items[start:]
+        texts = [[getattr(item, field) or '' for field in self.fields if field != 'content']
+                 for item in new_items]
+        if 'content' in self.fields:
+            contents = {id(item): content for item, content in iter_contents(new_items)}
+            for item, text in zip(new_items, texts):
+                text.append(contents.get(id(item), ''))
+
+        # Build this file's bitmasks first: one OR per token occurrence
+        masks = {}
+        get = masks.get
+        for position, text in enumerate(texts, start):
+            bit = 1 << position
+            for token in tokenize(' '.join(text)):
+                masks[token] = get(token, 0) | bit
+
+        for token, mask in masks.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                token = sys.intern(token)
+                postings = self._postings[token] = {}
+                self._add_token(token)
+            postings[path] = postings.get(path, 0) | mask
+            tokens.add(token)
+
+    def _remove_file(self, path):
+        """Drop all postings of a file"""
+        _, tokens = self._files.pop(path)
+        for token in tokens:
+            postings = self._postings[token]
+            del postings[path]
+            if not postings:
+                del self._postings[token]
+                self._drop_token(token)
+
+    def _add_token(self, token):
+        """Enter a new token in the trigram map and the sorted vocabulary"""
+        for trigram in trigrams(token):
+            tokens = self._trigrams.get(trigram)
+            if tokens is None:
+                tokens = self._trigrams[trigram] = set()
+            tokens.add(token)
+        self._sorted_tokens = None
+
+    def _drop_token(self, token):
+        """Remove a token that no longer occurs from the trigram map"""
+        for trigram in trigrams(token):
+            tokens = self._trigrams[trigram]
+            tokens.discard(token)
+            if not tokens:
+                del self._trigrams[trigram]
+        self._sorted_tokens = None
+
+    @staticmethod
+    def _appended(old_items, items):
+        """Whether items is old_items with more items added at the end"""
+        return (len(items) >= len(old_items) and
+                (not old_items or (items[0] is old_items[0] and
+                                   items[len(old_items) - 1] is old_items[-1])))
+
+    def pending(self, files):
+        """Return how many items update(files) would have to index"""
+        count = 0
+        for path, items in files.items():
+            indexed = self._files.get(path)
+            if indexed is None:
+                count += len(items)
+            elif indexed[0] is not items:
+                old_items = indexed[0]
+                count += len(items) - len(old_items) if self._appended(old_items, items) else len(items)
+        return count
+
+    @property
+    def building(self):
+        """Whether a background update is running"""
+        return self._builder is not None and self._builder.is_alive()
+
+    def update(self, files):
+        """
+        Bring the index in line with {path: items}.
+
+        Unchanged item lists are skipped, lists that extend the indexed one
+        (an appended file) only have their new items indexed, and anything
+        else is re-indexed from scratch.
+        """
+        with self._lock:
+            for path in [path for path in self._files if path not in files]:
+                self._remove_file(path)
+
+            for path, items in files.items():
+                indexed = self._files.get(path)
+                if indexed is not None:
+                    old_items, tokens = indexed
+                    if old_items is items:
+                        continue
+                    if self._appended(old_items, items):
+                        self._files[path] = (items, tokens)
+                        self._index_items(path, items, len(old_items), tokens)
+                        continue
+                    self._remove_file(path)
+
+                tokens = set()
+                self._files[path] = (items, tokens)
+                self._index_items(path, items, 0, tokens)
+
+    def update_in_background(self, files):
+        """Start update(files) in a daemon thread unless one is already running"""
+        if self.building:
+            return
+        self._builder = threading.Thread(target=self.update, args=(dict(files),),
+                                         name='search-index', daemon=True)
+        self._builder.start()
+
+    def search(self, query):
+        """
+        Return {path: bitmask of matching item positions} for a lowercase
+        query, or None if the query needs a linear scan.
+        """
+        terms = query.split()
+        if not terms or any(not TOKEN_RE.fullmatch(term) for term in terms):
+            return None
+
+        substring = len(terms) == 1
+        with self._lock:
+            return self._search_terms(terms, substring)
+
+    def _tokens_containing(self, term):
+        """Return the indexed tokens that contain term"""
+        if len(term) < TRIGRAM_LENGTH:
+            return [token for token in self._postings if term in token]
+        # Every match is in the token set of each trigram of term: check the smallest
+        candidates = None
+        for trigram in trigrams(term):
+            tokens = self._trigrams.get(trigram)
+            if not tokens:
+                return []
+            if candidates is None or len(tokens) < len(candidates):
+                candidates = tokens
+        return [token for token in candidates if term in token]
+
+    def _tokens_starting_with(self, term):
+        """Return the indexed tokens that start with term"""
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        tokens = self._sorted_tokens
+        matches = []
+        for token in islice(tokens, bisect_left(tokens, term), None):
+            if not token.startswith(term):
+                break
+            matches.append(token)
+        return matches
+
+    def _search_terms(self, terms, substring):
+        """AND the postings of every term, each matched as a substring or a prefix of tokens"""
+        result = None
+        for term in terms:
+            tokens = self._tokens_containing(term) if substring else self._tokens_starting_with(term)
+
+            masks = {}
+            for token in tokens:
+                for path, mask in self._postings[token].items():
+                    masks[path] = masks.get(path, 0) | mask
+
+            if result is None:
+                result = masks
+            else:
+                result = {path: mask & masks[path] for path, mask in result.items()
+                          if path in masks and mask & masks[path]}
+            if not result:
+                return {}
+        return result
@@ -0,0 +1,224 @@
+"""
+Shared SQLite connections for the recommendation engines, the feed cache
+and the news article store.
+
+Opening a connection for every lookup throws away SQLite's page cache and
+prepared statements, and re-runs the setup pragmas each time. A
+ConnectionPool keeps a small, bounded set of connections instead,
+configured once when they are opened. A thread checks one out for its
+outermost use and checks it back in afterwards, so Flask's short-lived
+request threads share the same few connections. Statements are prepared
+once per connection and reused from sqlite3's statement cache.
+
+A read-only pool (`mode=ro` URI, `query_only`) serves lookups. Under WAL
+its readers work from the last committed snapshot and never wait for a
+writer, in this process or the other frontend's. Writers take the write
+lock up front with begin_write(), which counts the time spent waiting for
+it, so cross-process contention shows up in `stats`.
+
+Connections are never used across fork(): a child process that finds
+connections made by its parent leaves them alone (SQLite forbids even
+closing them there) and opens its own.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+# Applied to every new connection, in order
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('foreign_keys', 'ON'),
+    ('cache_size', -16384),  # in KiB: 16 MiB of page cache per connection
+    ('mmap_size', 64 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+
+# Applied to every new read-only connection, in order
+READ_PRAGMAS = (
+    ('query_only', 'ON'),
+    ('cache_size', -16384),
+    ('mmap_size', 64 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+
+# Waits for the write lock longer than this (seconds) count as contention
+CONTENTION_THRESHOLD = 0.001
+
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Connections a pool keeps open at most; further users wait for one
+POOL_SIZE = 4
+
+
+class ConnectionPool:
+    """
+    Args:
+        db_path: SQLite database file
+        pragmas: (name, value) pairs set on each new connection (default
+            DEFAULT_PRAGMAS, or READ_PRAGMAS when read-only)
+        row_factory: row factory of the connections, e.g. sqlite3.Row
+        timeout: seconds to wait for a lock held by another connection, and
+            for a free connection when all of them are in use
+        read_only: open the database with mode=ro; it must already exist
+        size: connections kept open at most
+    """
+
+    def __init__(self, db_path, pragmas=None, row_factory=None, timeout=30.0, read_only=False,
+                 size=POOL_SIZE):
+        self.db_path = db_path
+        if pragmas is None:
+            pragmas = READ_PRAGMAS if read_only else DEFAULT_PRAGMAS
+        self.pragmas = tuple(pragmas)
+        self.row_factory = row_factory
+        self.timeout = timeout
+        self.read_only = read_only
+        self.size = size
+        self._idle = self._new_idle()
+        self._local = threading.local()  # the connection a thread has checked out, and its nesting
+        self._pid = os.getpid()
+        self._inherited = []  # connections of the parent process, kept unclosed after a fork
+        # Connections opened, waits for the write lock and their total
+        # seconds, and operations that gave up on a locked database
+        self.stats = {'connections': 0, 'lock_waits': 0, 'lock_wait_seconds': 0.0, 'busy_errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def _new_idle(self):
+        # One slot per connection; None marks a slot whose connection is
+        # opened on first use. Last in, first out keeps the warmest ones busy
+        idle = queue.LifoQueue()
+        for _ in range(self.size):
+            idle.put(None)
+        return idle
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _open(self):
+        if self.read_only:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        self._count('connections')
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Forked: every connection so far belongs to the parent
+            self._inherited.append((self._idle, self._local))
+            self._idle = self._new_idle()
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+    def _check_out(self):
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            self._count('busy_errors')
+            raise sqlite3.OperationalError(f"no free connection to {self.db_path} after {self.timeout}s")
+        if conn is None:
+            try:
+                conn = self._open()
+            except BaseException:
+                self._idle.put(None)
+                raise
+        return conn
+
+    def _check_in(self, conn, idle):
+        if idle is not self._idle:
+            return  # checked out before a fork; the parent still owns it
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Unusable: close it now and let the slot open a fresh one
+            conn.close()
+            conn = None
+        idle.put(conn)
+
+    @contextmanager
+    def connection(self, snapshot=False):
+        """
+        Yield a connection checked out for this thread; nested uses in the
+        same thread get the same one. When the outermost use ends, a
+        transaction left open (after an error or a missing commit) is
+        rolled back and the connection goes back to the pool.
+
+        With snapshot=True all queries until then read the same committed
+        state of the database instead of each seeing the latest one.
+        """
+        self._check_fork()
+        local = self._local
+        idle = self._idle
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = self._check_out()
+            local.depth = 0
+        local.depth += 1
+        try:
+            if snapshot and not conn.in_transaction:
+                conn.execute("BEGIN")
+            yield conn
+        except sqlite3.Error as e:
+            if isinstance(e, sqlite3.OperationalError) and 'locked' in str(e):
+                self._count('busy_errors')
+            conn.rollback()
+            raise
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                local.conn = None
+                self._check_in(conn, idle)
+
+    def begin_write(self, conn):
+        """
+        Start a write transaction on conn, taking the write lock now rather
+        than at the first write. Waiting for another connection to release
+        it is counted in `stats`.
+        """
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        waited = time.perf_counter() - start
+        if waited > CONTENTION_THRESHOLD:
+            with self._stats_lock:
+                self.stats['lock_waits'] += 1
+                self.stats['lock_wait_seconds'] += waited
+
+    def get_stats(self):
+        """Return a copy of the connection and contention counters"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def close(self):
+        """
+        Close every connection of the pool, waiting for the ones in use to
+        be checked in; later uses open new ones
+        """
+        self._check_fork()
+        if getattr(self._local, 'conn', None) is not None:
+            raise sqlite3.ProgrammingError("close() called while this thread is using a connection")
+        idle = self._idle
+        slots = []
+        try:
+            for _ in range(self.size):
+                slots.append(idle.get(timeout=self.timeout))
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"connections to {self.db_path} still in use after {self.timeout}s")
+        finally:
+            for conn in slots:
+                if conn is not None:
+                    conn.close()
+                idle.put(None)
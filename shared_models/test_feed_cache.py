@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Tests for incremental reading of sfeed files.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_models import feed_cache
+from shared_models.feed_cache import FeedCache, read_feed_file
+
+
+def _write(path, data, mode='wb'):
+    with open(path, mode) as f:
+        f.write(data)
+    return os.stat(path)
+
+
+def test_append_reads_only_new_bytes():
+    path = os.path.join(tempfile.mkdtemp(), 'feed')
+    stat = _write(path, b"1\tone\thttps://a/1\n2\ttwo\thttps://a/2\n")
+    data, appended, state = read_feed_file(path, stat)
+    assert not appended and data.count(b'\n') == 2
+
+    stat = _write(path, b"3\tthree\thttps://a/3\n", mode='ab')
+    data, appended, state = read_feed_file(path, stat, state)
+    assert appended and data == b"3\tthree\thttps://a/3\n"
+    assert state.offset == stat.st_size
+
+
+def test_rewrite_and_truncation_fall_back_to_full_read():
+    path = os.path.join(tempfile.mkdtemp(), 'feed')
+    stat = _write(path, b"1\tone\thttps://a/1\n2\ttwo\thttps://a/2\n")
+    _, _, state = read_feed_file(path, stat)
+
+    # Same length, different content before the old offset
+    stat = _write(path, b"1\tONE\thttps://a/1\n2\ttwo\thttps://a/2\n3\tx\thttps://a/3\n")
+    data, appended, state = read_feed_file(path, stat, state)
+    assert not appended and data.startswith(b"1\tONE")
+
+    stat = _write(path, b"1\tONE\thttps://a/1\n")
+    data, appended, _ = read_feed_file(path, stat, state)
+    assert not appended and data == b"1\tONE\thttps://a/1\n"
+
+
+def test_unterminated_last_line_forces_full_read_next_time():
+    path = os.path.join(tempfile.mkdtemp(), 'feed')
+    stat = _write(path, b"1\tone\thttps://a/1\n2\ttw")
+    _, _, state = read_feed_file(path, stat)
+    assert state.offset is None
+
+    stat = _write(path, b"o\thttps://a/2\n", mode='ab')
+    data, appended, _ = read_feed_file(path, stat, state)
+    assert not appended and data.endswith(b"2\ttwo\thttps://a/2\n")
+
+
+def test_cache_round_trip_and_format_version():
+    directory = tempfile.mkdtemp()
+    cache_path = os.path.join(directory, 'cache.db')
+    feed_path = os.path.join(directory, 'feed')
+    stat = _write(feed_path, b"1\tone\thttps://a/1\n")
+    _, _, state = read_feed_file(feed_path, stat)
+
+    cache = FeedCache(cache_path)
+    cache.put(feed_path, state, [{'title': 'one'}])
+    assert FeedCache(cache_path).get(feed_path) == (state, [{'title': 'one'}])
+    assert FeedCache(cache_path, format_version=2).get(feed_path) is None
+
+
+def test_appends_are_stored_as_chunks():
+    directory = tempfile.mkdtemp()
+    cache_path = os.path.join(directory, 'cache.db')
+    feed_path = os.path.join(directory, 'feed')
+    stat = _write(feed_path, b"1\tone\thttps://a/1\n")
+    _, _, state = read_feed_file(feed_path, stat)
+    cache = FeedCache(cache_path)
+    cache.put(feed_path, state, [('1', 'one')])
+
+    rows = [('1', 'one')]
+    for n in range(2, feed_cache.MAX_CHUNKS + 3):
+        stat = _write(feed_path, f"{n}\tx\thttps://a/{n}\n".encode(), mode='ab')
+        previous = state
+        _, appended, state = read_feed_file(feed_path, stat, previous)
+        assert appended
+        cache.put(feed_path, state, [(str(n), 'x')], appended_at=previous.offset)
+        rows.append((str(n), 'x'))
+        assert FeedCache(cache_path).get(feed_path) == (state, rows)
+
+    # Only the new rows were written each time, and the chunks were merged
+    # once there were too many of them
+    conn = sqlite3.connect(cache_path)
+    chunks = conn.execute("SELECT start FROM feed_chunks ORDER BY start").fetchall()
+    assert 1 < len(chunks) <= feed_cache.MAX_CHUNKS and chunks[0] == (0,)
+
+    # An append to an entry that is not the stored one drops the entry
+    cache.put(feed_path, state, [('x', 'y')], appended_at=1)
+    assert cache.get(feed_path) is None
+    assert conn.execute("SELECT COUNT(*) FROM feed_chunks").fetchone()[0] == 0
+    conn.close()
+
+
+if __name__ == "__main__":
+    test_append_reads_only_new_bytes()
+    test_rewrite_and_truncation_fall_back_to_full_read()
+    test_unterminated_last_line_forces_full_read_next_time()
+    test_cache_round_trip_and_format_version()
+    test_appends_are_stored_as_chunks()
+    print("✅ Incremental feed reading works")
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the shared feed index.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_models.feed_events import SharedPoll, feed_events
+from shared_models.feed_index import FeedIndex
+from shared_models.feed_items import ArticleItem, VideoItem
+from shared_models.feed_watcher import FeedWatcher
+from shared_models.search_index import SearchIndex, mask_positions, tokenize
+
+
+def _row(timestamp, title, url, author):
+    return f"{timestamp}\t{title}\t{url}\tcontent\thtml\tid\t{author}\t\n"
+
+
+def _make_dirs():
+    base = tempfile.mkdtemp()
+    feeds_dir = os.path.join(base, 'feeds')
+    os.makedirs(feeds_dir)
+    return base, feeds_dir
+
+
+def test_flags_query_and_generation():
+    base, feeds_dir = _make_dirs()
+    with open(os.path.join(feeds_dir, 'alpha'), 'w') as f:
+        f.write(_row(100, "Old rust news", "https://a/1", "Ann"))
+        f.write(_row(300, "New python news", "https://a/2", "Ann"))
+    with open(os.path.join(feeds_dir, 'beta'), 'w') as f:
+        f.write(_row(200, "Middle", "https://b/1", "Bob"))
+    read_file = os.path.join(base, 'urls')
+    with open(read_file, 'w') as f:
+        f.write("https://a/2\n")
+
+    index = FeedIndex(feeds_dir, ArticleItem, {'read': read_file},
+                      cache_path=os.path.join(base, 'cache.db'), workers=1)
+    items = index.items()
+    assert [item['url'] for item in items] == ["https://a/2", "https://b/1", "https://a/1"]
+    assert [item['read'] for item in items] == [True, False, False]
+
+    generation = index.generation
+    assert index.query(exclude=('read',), sort_by='date-asc')[0]['url'] == "https://a/1"
+    assert [item['url'] for item in index.query(search='rust')] == ["https://a/1"]
+    assert index.generation == generation  # nothing changed on disk
+
+    with open(read_file, 'a') as f:
+        f.write("https://b/1\n")
+    os.utime(read_file, (1, 1))
+    assert [item['url'] for item in index.query(exclude=('read',))] == ["https://a/1"]
+    assert index.generation > generation
+
+    # A fresh index picks the parsed files up from the shared cache
+    other = FeedIndex(feeds_dir, ArticleItem, {'read': read_file},
+                      cache_path=os.path.join(base, 'cache.db'), workers=1)
+    assert len(other.items()) == 3
+
+
+def test_dedupe_keeps_most_recent():
+    base, feeds_dir = _make_dirs()
+    url = "https://www.youtube.com/watch?v=abc"
+    with open(os.path.join(feeds_dir, 'one'), 'w') as f:
+        f.write(_row(100, "First upload", url, "Chan"))
+    with open(os.path.join(feeds_dir, 'two'), 'w') as f:
+        f.write(_row(200, "Reupload", url, "Chan"))
+
+    index = FeedIndex(feeds_dir, VideoItem, {}, dedupe=True, workers=1)
+    items = index.items()
+    assert len(items) == 1 and items[0]['title'] == "Reupload"
+
+
+def test_video_content_is_read_from_file():
+    base, feeds_dir = _make_dirs()
+    path = os.path.join(feeds_dir, 'chan')
+    with open(path, 'w') as f:
+        f.write("100\tFirst\thttps://youtu.be/aaa\tDescription \u00e9 one\thtml\tid\tChan\t\n")
+
+    index = FeedIndex(feeds_dir, VideoItem, {}, cache_path=os.path.join(base, 'cache.db'), workers=1)
+    assert index.items()[0]['content'] == "Description \u00e9 one"
+
+    # Appended rows get offsets relative to the whole file
+    with open(path, 'a') as f:
+        f.write("200\tSecond\thttps://youtu.be/bbb\tDescription two\thtml\tid\tChan\t\n")
+    newest = index.items()[0]
+    assert newest['content'] == "Description two"
+    assert newest.to_dict()['thumbnail_url'] == "https://img.youtube.com/vi/bbb/hqdefault.jpg"
+
+    # Records restored from the on-disk cache read the same content
+    other = FeedIndex(feeds_dir, VideoItem, {}, cache_path=os.path.join(base, 'cache.db'), workers=1)
+    assert [item['content'] for item in other.items()] == ["Description two", "Description \u00e9 one"]
+
+
+def test_article_bodies_are_loaded_lazily():
+    base, feeds_dir = _make_dirs()
+    with open(os.path.join(feeds_dir, 'site'), 'w') as f:
+        f.write("  100\tPlain\thttps://s/1\t<p>Quantum body</p>\thtml\tid\tAnn\n")
+        f.write("200\tOther\thttps://s/2\t<p>Nothing here</p>\thtml\tid\tBob\n")
+
+    index = FeedIndex(feeds_dir, ArticleItem, {}, workers=1)
+    items = index.items()
+    assert [item['content'] for item in items] == ["<p>Nothing here</p>", "<p>Quantum body</p>"]
+    assert [item['url'] for item in index.query(search='quantum', search_fields=('title', 'content'))] == ["https://s/1"]
+    assert index.query(search='quantum', search_fields=('title',)) == []
+
+
+def test_search_index_matches_substring_scan():
+    base, feeds_dir = _make_dirs()
+    words = ["rust", "python", "pythonic", "kernel", "c++", "über", "linux"]
+    for name in ('one', 'two'):
+        with open(os.path.join(feeds_dir, name), 'w') as f:
+            for i in range(40):
+                title = " ".join(words[(i * k) % len(words)] for k in (1, 3))
+                f.write(f"{1000 + i}\t{title}\thttps://{name}/{i}\t<p>body {words[i % 7]}</p>\thtml\tid\tAuthor {i % 3}\n")
+
+    fields = ('title', 'author', 'content')
+    index = FeedIndex(feeds_dir, ArticleItem, {}, workers=1, search_fields=fields)
+    for query in ("ytho", "python", "über", "author", "2", "body", "c++", "p>body"):
+        expected = index._scan(index.items(), query, fields)
+        assert index.query(search=query) == expected, query
+
+    # Several words must all match, as word prefixes
+    results = index.query(search="pyth kern")
+    assert results and all('kernel' in item.title and 'pyth' in item.title for item in results)
+
+    # Appended items are found without re-indexing the whole file
+    with open(os.path.join(feeds_dir, 'one'), 'a') as f:
+        f.write("5000\tZephyr news\thttps://one/new\t<p>body</p>\thtml\tid\tAuthor 9\n")
+    assert [item.url for item in index.query(search="zephyr")] == ["https://one/new"]
+
+
+def test_search_index_term_lookup_matches_brute_force():
+    rng = random.Random(3)
+
+    def word():
+        return "".join(rng.choice("abcdeé") for _ in range(rng.randint(1, 7)))
+
+    def make_items(count):
+        return [SimpleNamespace(title=" ".join(word() for _ in range(rng.randint(1, 5))), author=word())
+                for _ in range(count)]
+
+    files = {'one': make_items(200), 'two': make_items(200)}
+    index = SearchIndex(('title', 'author'))
+
+    def check():
+        item_tokens = {(path, position): tokenize(f"{item.title} {item.author}")
+                       for path, items in files.items() for position, item in enumerate(items)}
+        queries = ["a", "é", "ab", "bca", "cab", "dee", "abcd", "zzz", "ab cd", "e a", "bad cab", "cé d"]
+        for query in queries:
+            terms = query.split()
+            if len(terms) == 1:
+                expected = {key for key, tokens in item_tokens.items() if any(terms[0] in t for t in tokens)}
+            else:
+                expected = {key for key, tokens in item_tokens.items()
+                            if all(any(t.startswith(term) for t in tokens) for term in terms)}
+            found = {(path, position) for path, mask in index.search(query).items()
+                     for position in mask_positions(mask)}
+            assert found == expected, query
+
+    index.update(files)
+    check()
+
+    # Vocabulary changes: an appended file, a rewritten one and a removed one
+    files['one'] = files['one'] + make_items(50)
+    files['two'] = make_items(30)
+    index.update(files)
+    check()
+    del files['two']
+    index.update(files)
+    check()
+
+
+def test_views_follow_url_state_changes():
+    base, feeds_dir = _make_dirs()
+    with open(os.path.join(feeds_dir, 'alpha'), 'w') as f:
+        for i in range(6):
+            f.write(_row(100 + i, f"Item {i}", f"https://a/{i}", "Ann"))
+    read_file = os.path.join(base, 'urls')
+    starred_file = os.path.join(base, 'starred')
+    with open(read_file, 'w') as f:
+        f.write("https://a/5\n")
+
+    index = FeedIndex(feeds_dir, ArticleItem, {'read': read_file, 'starred': starred_file}, workers=1)
+    page, total = index.query_page(exclude=('read',), offset=1, count=2)
+    assert [item.url for item in page] == ["https://a/3", "https://a/2"] and total == 5
+    items = index.items()
+
+    # URL file changes update the views in place, without a rebuild
+    with open(read_file, 'w') as f:
+        f.write("https://a/3\n")
+    with open(starred_file, 'w') as f:
+        f.write("https://a/0\n")
+    os.utime(read_file, (1, 1))
+    assert index.items() is items
+    assert [item.url for item in index.query(exclude=('read',))] == [
+        "https://a/5", "https://a/4", "https://a/2", "https://a/1", "https://a/0"]
+    assert [item.url for item in index.query_page(include=('starred',), exclude=('read',))[0]] == ["https://a/0"]
+    assert index.query_page(exclude=('read',), sort_by='date-asc', count=1)[0][0].url == "https://a/0"
+
+    # Invalidating a URL set re-reads it even if its mtime did not move
+    mtime = os.stat(starred_file).st_mtime_ns
+    with open(starred_file, 'w') as f:
+        f.write("https://a/1\n")
+    os.utime(starred_file, ns=(mtime, mtime))
+    index.invalidate_url_sets(['starred'])
+    assert [item.url for item in index.query_page(include=('starred',))[0]] == ["https://a/1"]
+    assert index.items() is items
+
+
+def _wait_for_change(watcher, version):
+    deadline = time.time() + 5
+    while watcher.version == version and time.time() < deadline:
+        time.sleep(0.01)
+    return watcher.version
+
+
+def test_watcher_gates_refresh():
+    for mode in ('inotify', 'poll'):
+        base, feeds_dir = _make_dirs()
+        with open(os.path.join(feeds_dir, 'alpha'), 'w') as f:
+            f.write(_row(100, "First", "https://a/1", "Ann"))
+        read_file = os.path.join(base, 'urls')
+        index = FeedIndex(feeds_dir, ArticleItem, {'read': read_file}, workers=1, watcher=mode)
+        index._watcher.interval = 0.05
+        items = index.refresh()
+        version = index._watcher.version
+        assert version is not None
+
+        # Unrelated files next to a state file are not changes
+        with open(os.path.join(base, 'unrelated'), 'w') as f:
+            f.write("x")
+        time.sleep(0.3)
+        assert index._watcher.version == version
+
+        # Until the watcher reports a change, refresh does not touch the files
+        feeds_dir, index.feeds_dir = index.feeds_dir, os.path.join(base, 'missing')
+        assert index.refresh() is items
+        index.feeds_dir = feeds_dir
+
+        with open(read_file, 'w') as f:
+            f.write("https://a/1\n")
+        assert _wait_for_change(index._watcher, version) != version
+        assert index.query(exclude=('read',)) == []
+
+        # Our own state writes re-read the state files but do not rescan the feeds
+        index.refresh()
+        index._watcher = SimpleNamespace(version=index._watch_version)
+        generation = index.generation
+        with open(read_file, 'w') as f:
+            f.write("")
+        index.invalidate_url_sets(['read'])
+        feeds_dir, index.feeds_dir = index.feeds_dir, os.path.join(base, 'missing')
+        assert [item.url for item in index.query(exclude=('read',))] == ["https://a/1"]
+        assert index.generation == generation + 1
+        index.feeds_dir = feeds_dir
+
+
+def test_feed_events_tell_new_items_from_state_changes():
+    base, feeds_dir = _make_dirs()
+    with open(os.path.join(feeds_dir, 'alpha'), 'w') as f:
+        f.write(_row(100, "First", "https://a/1", "Ann"))
+    read_file = os.path.join(base, 'urls')
+    index = FeedIndex(feeds_dir, ArticleItem, {'read': read_file}, workers=1)
+
+    def get_generation():
+        index.refresh()
+        return index.generation
+
+    events = feed_events(get_generation, lambda count: index.query_page(count=count),
+                         interval=0, heartbeat=0)
+    assert next(events).startswith("event: hello\n")
+
+    with open(os.path.join(feeds_dir, 'alpha'), 'a') as f:
+        f.write(_row(300, "Second", "https://a/2", "Ann"))
+        f.write(_row(200, "Third", "https://a/3", "Ann"))
+    assert next(events) == 'event: new_items\ndata: {"generation": 2, "count": 2, "total": 3}\n\n'
+
+    with open(read_file, 'w') as f:
+        f.write("https://a/2\n")
+    assert next(events) == 'event: state\ndata: {"generation": 3, "total": 3}\n\n'
+    assert next(events) == ": keep-alive\n\n"
+
+
+def test_event_clients_share_generation_checks():
+    checks = []
+    def get_generation():
+        checks.append(1)
+        return len(checks)
+
+    poll = SharedPoll(get_generation, interval=60)
+    clients = [feed_events(poll, lambda count: ([], 0), interval=0, heartbeat=0) for _ in range(5)]
+    for client in clients:
+        assert next(client) == 'event: hello\ndata: {"generation": 1}\n\n'
+        assert next(client) == ": keep-alive\n\n"
+    assert len(checks) == 1
+
+    poll.interval = 0
+    assert next(clients[0]) == 'event: state\ndata: {"generation": 2, "total": 0}\n\n'
+    assert len(checks) == 2
+
+
+if __name__ == "__main__":
+    test_flags_query_and_generation()
+    test_dedupe_keeps_most_recent()
+    test_video_content_is_read_from_file()
+    test_article_bodies_are_loaded_lazily()
+    test_search_index_matches_substring_scan()
+    test_search_index_term_lookup_matches_brute_force()
+    test_views_follow_url_state_changes()
+    test_watcher_gates_refresh()
+    test_feed_events_tell_new_items_from_state_changes()
+    test_event_clients_share_generation_checks()
+    print("✅ Feed index tests passed")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Tests for conditional GET and the response cache.
+"""
+
+import os
+import sys
+
+from flask import Flask, jsonify
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_models.response_cache import ResponseCache
+
+
+def test_etag_304_and_cached_bodies():
+    app = Flask(__name__)
+    cache = ResponseCache(size=2)
+    state = {'version': 1, 'builds': 0}
+
+    def build():
+        state['builds'] += 1
+        return jsonify({'version': state['version']})
+
+    @app.route('/data')
+    def data():
+        return cache.respond((state['version'],), build)
+
+    @app.route('/stream')
+    def stream():
+        return cache.respond_stream((state['version'],), lambda: iter(['a\n', 'b\n']), 'application/x-ndjson')
+
+    client = app.test_client()
+    first = client.get('/data?page=1')
+    etag = first.headers['ETag']
+    assert first.get_json() == {'version': 1} and first.headers['Cache-Control'] == 'no-cache'
+
+    # Same versions: served from the cache, or 304 if the client has it
+    assert client.get('/data?page=1').get_data() == first.get_data()
+    assert client.get('/data?page=1', headers={'If-None-Match': etag}).status_code == 304
+    assert state['builds'] == 1
+
+    # Other query strings are cached separately, evicting the least recently used
+    client.get('/data?page=2')
+    client.get('/data?page=3')
+    client.get('/data?page=1')
+    assert state['builds'] == 4
+
+    # A new version changes the ETag and rebuilds
+    state['version'] = 2
+    second = client.get('/data?page=1', headers={'If-None-Match': etag})
+    assert second.status_code == 200 and second.headers['ETag'] != etag
+    assert second.get_json() == {'version': 2}
+
+    assert client.get('/stream').get_data() == b'a\nb\n'
+    cached = client.get('/stream')
+    assert cached.get_data() == b'a\nb\n' and cached.mimetype == 'application/x-ndjson'
+
+
+if __name__ == "__main__":
+    test_etag_304_and_cached_bodies()
+    print("✅ Response cache tests passed")
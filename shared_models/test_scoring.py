@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+"""
+Parity tests for the vectorized scoring kernel against the per-item scorer,
+and for batched interaction recording against single interactions.
+"""
+
+import importlib
+import os
+import random
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+WORDS = ("python rust linux kernel machine learning science music guitar physics "
+         "chess history economy climate space rocket football election").split()
+
+
+@pytest.fixture
+def engines(tmp_path, monkeypatch):
+    """
+    Return a factory of engines with their own databases under tmp_path.
+    Importing the engine module creates the global instance under ~/rss,
+    so HOME points at tmp_path before the first import.
+    """
+    monkeypatch.setenv('HOME', str(tmp_path))
+    (tmp_path / 'rss').mkdir()
+    module = importlib.import_module('shared_models.unified_recommendation')
+    created = []
+
+    def make(**kwargs):
+        rss_dir = tmp_path / f"engine{len(created)}"
+        rss_dir.mkdir()
+        engine = module.UnifiedRecommendationEngine(str(rss_dir), **kwargs)
+        created.append(engine)
+        return engine
+
+    yield make
+    for engine in created:
+        engine.flush(timeout=10)
+        engine.close()
+
+
+def _make_items(rng, count, prefix, id_key):
+    now = int(time.time())
+    items = []
+    for i in range(count):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8)))
+        items.append({
+            id_key: f"{prefix}{i}",
+            'title': title,
+            'author': rng.choice(["Alpha", "Beta", "Gamma", "Delta", "Unknown"]),
+            'timestamp': str(now - rng.randint(-86400, 45 * 86400)),
+        })
+    # Items without a parsable timestamp or keywords
+    items.append({id_key: f"{prefix}bad", 'title': "a to of", 'author': "Alpha", 'timestamp': "n/a"})
+    return items
+
+
+def _populate(engine, rng, videos, articles):
+    for video in videos[:60]:
+        engine.record_interaction(video['video_id'], 'youtube', video['title'], video['author'], 'video',
+                                  rng.choice(['watched', 'starred', 'disliked']),
+                                  rng.choice(['clicked', 'marked']))
+    for article in articles[:40]:
+        engine.record_interaction(article['article_id'], 'news', article['title'], article['author'],
+                                  'article', rng.choice(['read', 'starred', 'disliked']), 'clicked')
+
+
+def test_kernel_matches_per_item_scorer(engines):
+    rng = random.Random(1234)
+    engine = engines()
+    videos = _make_items(rng, 400, 'v', 'video_id')
+    articles = _make_items(rng, 400, 'a', 'article_id')
+    _populate(engine, rng, videos, articles)
+
+    for platform, items in (('youtube', videos), ('news', articles)):
+        expected = [engine.calculate_content_score(item, platform) for item in items]
+        snapshot = engine._get_snapshot()
+        vectorized = engine._score_with_kernel(items, platform, snapshot)
+        assert len(vectorized) == len(expected)
+        for got, want in zip(vectorized, expected):
+            # Only the recency term may drift, by the time between the two passes
+            assert abs(got - want) < 1e-6, (got, want)
+
+
+def test_kernel_matches_python_fallback(engines, monkeypatch):
+    rng = random.Random(99)
+    engine = engines()
+    videos = _make_items(rng, 300, 'v', 'video_id')
+    articles = _make_items(rng, 300, 'a', 'article_id')
+    _populate(engine, rng, videos, articles)
+
+    vectorized = engine.calculate_content_scores(videos, 'youtube')
+    monkeypatch.setattr('shared_models.unified_recommendation.NUMPY_AVAILABLE', False)
+    python_scores = engine.calculate_content_scores(videos, 'youtube')
+
+    for got, want in zip(vectorized, python_scores):
+        assert abs(got - want) < 1e-6, (got, want)
+
+
+def test_batch_interactions_match_single_ones(engines):
+    rng = random.Random(7)
+    videos = _make_items(rng, 40, 'v', 'video_id')
+    articles = _make_items(rng, 40, 'a', 'article_id')
+    single = engines()
+    batch = engines()
+    # Articles first, so the videos correlate with recent news reads
+    interactions = ([(a['article_id'], 'news', a['title'], a['author'], 'article', 'read', 'clicked')
+                     for a in articles] +
+                    [(v['video_id'], 'youtube', v['title'], v['author'], 'video', 'watched', 'marked')
+                     for v in videos])
+
+    for interaction in interactions:
+        single.record_interaction(*interaction)
+    assert batch.record_interactions(interactions[:len(articles)]) == len(articles)
+    assert batch.record_interactions(interactions[len(articles):]) == len(videos)
+    assert batch.write_stats['transactions'] == 2
+    assert batch.write_stats['interactions'] == single.write_stats['interactions'] == len(interactions)
+    assert 0 < batch.write_stats['rows'] <= single.write_stats['rows']
+
+    queries = ("SELECT keyword, round(score, 6) FROM unified_keyword_scores ORDER BY 1",
+               "SELECT source_name, platform, round(score, 6) FROM source_scores ORDER BY 1, 2",
+               "SELECT keyword1, keyword2, platform1, round(correlation_strength, 6) "
+               "FROM cross_correlations ORDER BY 1, 2, 3")
+    for query in queries:
+        with single._get_connection() as a, batch._get_connection() as b:
+            assert [tuple(row) for row in a.execute(query)] == [tuple(row) for row in b.execute(query)]
+
+
+def test_mixed_platform_batch_matches_single_ones(engines):
+    rng = random.Random(13)
+    videos = _make_items(rng, 20, 'v', 'video_id')
+    articles = _make_items(rng, 20, 'a', 'article_id')
+    single = engines()
+    batch = engines()
+    # Platforms interleaved in runs of different lengths
+    interactions = []
+    for i in range(20):
+        interactions.append((articles[i]['article_id'], 'news', articles[i]['title'], articles[i]['author'],
+                             'article', 'read', 'clicked'))
+        if i % 3:
+            interactions.append((videos[i]['video_id'], 'youtube', videos[i]['title'], videos[i]['author'],
+                                 'video', rng.choice(['watched', 'starred']), 'clicked'))
+
+    timestamp = time.time()
+    for interaction in interactions:
+        single.record_interaction(*interaction, timestamp=timestamp)
+    batch.record_interactions(interactions, timestamp)
+
+    queries = ("SELECT keyword, round(score, 6) FROM unified_keyword_scores ORDER BY 1",
+               "SELECT source_name, platform, round(score, 6) FROM source_scores ORDER BY 1, 2",
+               "SELECT keyword1, keyword2, platform1, round(correlation_strength, 6) "
+               "FROM cross_correlations ORDER BY 1, 2, 3")
+    for query in queries:
+        with single._get_connection() as a, batch._get_connection() as b:
+            rows = [tuple(row) for row in a.execute(query)]
+            assert rows and rows == [tuple(row) for row in b.execute(query)], query
+
+
+def test_cached_partner_keywords_match_fresh_ones(engines):
+    rng = random.Random(11)
+    videos = _make_items(rng, 30, 'v', 'video_id')
+    articles = _make_items(rng, 30, 'a', 'article_id')
+    cached = engines()
+    fresh = engines()
+    for i in range(len(videos) - 1):
+        # Alternate platforms, re-reading some articles, so the bags are both reused and refreshed
+        article = articles[i % 20]
+        video = videos[i]
+        for interaction in ((article['article_id'], 'news', article['title'], article['author'], 'article', 'read', 'clicked'),
+                            (video['video_id'], 'youtube', video['title'], video['author'], 'video', 'watched', 'marked'),
+                            (videos[i + 1]['video_id'], 'youtube', videos[i + 1]['title'], videos[i + 1]['author'], 'video', 'starred', None)):
+            cached.record_interaction(*interaction)
+            fresh._recent_keywords.clear()
+            fresh.record_interaction(*interaction)
+
+    query = ("SELECT keyword1, keyword2, platform1, round(correlation_strength, 6) "
+             "FROM cross_correlations ORDER BY 1, 2, 3")
+    with cached._get_connection() as a, fresh._get_connection() as b:
+        rows = [tuple(row) for row in a.execute(query)]
+        assert rows and rows == [tuple(row) for row in b.execute(query)]
+
+
+def test_queued_interactions_are_group_committed(engines):
+    rng = random.Random(5)
+    videos = _make_items(rng, 60, 'v', 'video_id')
+    interactions = [(v['video_id'], 'youtube', v['title'], v['author'], 'video', 'watched', 'clicked')
+                    for v in videos]
+    sync = engines()
+    queued = engines(durability='queued')
+    for interaction in interactions:
+        sync.record_interaction(*interaction)
+        queued.record_interaction(*interaction)
+    assert queued.flush(timeout=10)
+
+    # Fewer transactions, same result
+    assert queued.write_stats['interactions'] == len(interactions)
+    assert queued.write_stats['transactions'] < len(interactions)
+    query = "SELECT keyword, round(score, 6) FROM unified_keyword_scores ORDER BY 1"
+    with sync._get_connection() as a, queued._get_connection() as b:
+        assert [tuple(row) for row in a.execute(query)] == [tuple(row) for row in b.execute(query)]
+
+
+def test_failed_queued_batch_drops_only_itself(engines):
+    rng = random.Random(6)
+    videos = _make_items(rng, 20, 'v', 'video_id')
+    interactions = [(v['video_id'], 'youtube', v['title'], v['author'], 'video', 'watched', 'clicked')
+                    for v in videos]
+    queued = engines(durability='queued')
+    # A title that is not a str makes tokenizing, and so its whole batch, fail
+    bad = ('bad', 'youtube', 42, 'Alpha', 'video', 'watched', 'clicked')
+    for interaction in interactions[:10] + [bad] + interactions[10:]:
+        queued.record_interaction(*interaction)
+    assert queued.flush(timeout=10)
+
+    assert queued.write_stats['dropped'] == 1
+    assert queued.write_stats['interactions'] == len(interactions)
+    with queued._get_connection() as conn:
+        stored = {row[0] for row in conn.execute("SELECT content_id FROM unified_interactions")}
+    assert stored == {interaction[0] for interaction in interactions}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
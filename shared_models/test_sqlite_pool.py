@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the shared SQLite connection pool.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_models.sqlite_pool import ConnectionPool
+
+
+def test_connections_are_shared_between_threads_and_bounded():
+    db_path = os.path.join(tempfile.mkdtemp(), 'pool.db')
+    pool = ConnectionPool(db_path, row_factory=sqlite3.Row, size=2, timeout=0.1)
+
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+    with pool.connection() as again:
+        assert again is conn
+
+    # A new thread per request, as in Flask, reuses the checked-in connection
+    def use():
+        with pool.connection() as other:
+            others.append(other)
+    others = []
+    for _ in range(3):
+        thread = threading.Thread(target=use)
+        thread.start()
+        thread.join()
+    assert all(other is conn for other in others)
+    assert pool.get_stats()['connections'] == 1
+
+    # Nested uses share the outer transaction; what is left uncommitted
+    # when the outermost use ends is rolled back
+    with pool.connection() as outer:
+        outer.execute("INSERT INTO t VALUES (1)")
+        with pool.connection() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO t VALUES (2)")
+        assert outer.in_transaction
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    # No more than `size` connections are open; a third user waits for one
+    checked_out = threading.Event()
+    done = threading.Event()
+    def hold():
+        with pool.connection():
+            checked_out.set()
+            done.wait()
+    holder = threading.Thread(target=hold)
+    holder.start()
+    checked_out.wait()
+    errors = []
+    def wait():
+        try:
+            use()
+        except sqlite3.OperationalError as e:
+            errors.append(e)
+    with pool.connection():
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        waiter.join()
+    done.set()
+    holder.join()
+    assert errors and pool.get_stats()['connections'] == 2
+
+    # close() closes every connection, not only the calling thread's
+    first = conn
+    pool.close()
+    try:
+        first.execute("SELECT 1")
+        assert False, "closed connections must not be usable"
+    except sqlite3.ProgrammingError:
+        pass
+    with pool.connection() as conn:
+        assert conn is not first
+
+    # A forked child must not use its parent's connections
+    pool._pid = -1
+    with pool.connection() as child:
+        assert child is not conn
+    assert pool._inherited
+    pool.close()
+
+
+def test_readers_do_not_wait_for_writers():
+    db_path = os.path.join(tempfile.mkdtemp(), 'pool.db')
+    writer = ConnectionPool(db_path)
+    readers = ConnectionPool(db_path, read_only=True)
+    with writer.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.commit()
+
+    other = sqlite3.connect(db_path, timeout=0.1, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    other.execute("INSERT INTO t VALUES (2)")
+
+    # The other connection holds the write lock: readers see the last commit
+    with readers.connection(snapshot=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+        try:
+            conn.execute("INSERT INTO t VALUES (3)")
+            assert False, "reader connections must be read-only"
+        except sqlite3.OperationalError:
+            pass
+
+    # ... while a writer waits for it, and the wait is counted
+    release = threading.Timer(0.05, other.commit)
+    release.start()
+    with writer.connection() as conn:
+        writer.begin_write(conn)
+        conn.execute("INSERT INTO t VALUES (3)")
+        conn.commit()
+    release.join()
+    other.close()
+    stats = writer.get_stats()
+    assert stats['lock_waits'] == 1 and stats['lock_wait_seconds'] > 0
+    assert readers.get_stats()['lock_waits'] == 0
+
+    with readers.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 3
+
+
+if __name__ == "__main__":
+    test_connections_are_shared_between_threads_and_bounded()
+    test_readers_do_not_wait_for_writers()
+    print("✅ SQLite pool tests passed")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+"""
+Tests for append-only URL state files.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_models import url_state
+from shared_models.url_state import UrlStateFile, read_urls_file
+
+
+def test_journal_records_and_compaction():
+    path = os.path.join(tempfile.mkdtemp(), 'urls-starred')
+    with open(path, 'w') as f:
+        f.write("https://a/1\nhttps://a/2")  # no trailing newline
+
+    state = UrlStateFile(path)
+    assert state.add("https://a/3") and not state.add("https://a/3")
+    assert state.remove("https://a/1") and not state.remove("https://a/1")
+    assert read_urls_file(path) == {"https://a/2", "https://a/3"}
+    with open(path) as f:
+        assert f.read().endswith("https://a/2\nhttps://a/3\n#-https://a/1\n")
+
+    # Changes made by another writer are picked up
+    other = UrlStateFile(path)
+    other.add("https://a/4")
+    assert "https://a/4" in state
+
+    state.compact()
+    with open(path) as f:
+        assert f.read() == "https://a/2\nhttps://a/3\nhttps://a/4\n"
+
+
+def test_compaction_bounds_the_journal():
+    path = os.path.join(tempfile.mkdtemp(), 'urls-bookmarks')
+    state = UrlStateFile(path)
+    for i in range(url_state.COMPACT_MIN_RECORDS):
+        state.add(f"https://b/{i}")
+        state.remove(f"https://b/{i}")
+    state.add("https://b/kept")
+    with open(path) as f:
+        lines = f.readlines()
+    assert len(lines) < url_state.COMPACT_MIN_RECORDS + 2
+    assert read_urls_file(path) == state.urls() == {"https://b/kept"}
+
+
+def test_plain_file_rewrites_removals():
+    path = os.path.join(tempfile.mkdtemp(), 'urls')
+    with open(path, 'w') as f:
+        f.write("https://c/2\nhttps://c/1\n")
+
+    state = UrlStateFile(path, journal=False)
+    assert state.add_many(["https://c/3", "https://c/1", "https://c/4"]) == ["https://c/3", "https://c/4"]
+    assert state.remove_many(["https://c/1", "https://c/9"]) == ["https://c/1"]
+    with open(path) as f:
+        assert f.read() == "https://c/2\nhttps://c/3\nhttps://c/4\n"
+
+
+if __name__ == "__main__":
+    test_journal_records_and_compaction()
+    test_compaction_bounds_the_journal()
+    test_plain_file_rewrites_removals()
+    print("✅ URL state tests passed")
@@ -1,10 +1,155 @@
 import sqlite3
 import os
 import time
+import heapq
+import queue
 import threading
-from collections import defaultdict, Counter
+import atexit
+from collections import defaultdict, Counter, OrderedDict
+from itertools import groupby
 from datetime import datetime, timedelta
-from contextlib import contextmanager
+
+try:
+    import numpy as np
+    from .scoring import build_keyword_csr, interaction_multiplier, score_candidates, top_k_indices
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from .sqlite_pool import ConnectionPool
+
+# How often (seconds) a process re-checks the shared preference version
+SNAPSHOT_CHECK_INTERVAL = 1.0
+
+# Upper bound on memoized title -> keywords entries
+KEYWORD_CACHE_SIZE = 200000
+
+# Number of ranked candidate lists kept for pagination
+RANKING_CACHE_SIZE = 16
+
+# How the shared engine records interactions:
+# - 'sync': commit in the calling request before it returns
+# - 'queued': return at once; a background writer commits queued
+#   interactions together, at most WRITE_BATCH_INTERVAL later. A crash
+#   loses what was still queued; a normal exit flushes it first. A batch
+#   that cannot be written is dropped and counted in write_stats['dropped'].
+INTERACTION_DURABILITY = 'queued'
+
+# Longest wait (seconds) before queued interactions are committed
+WRITE_BATCH_INTERVAL = 0.05
+
+# Most interaction batches committed in one transaction
+WRITE_BATCH_SIZE = 256
+
+# Longest wait (seconds) for queued interactions to be written at exit
+WRITE_FLUSH_TIMEOUT = 10.0
+
+
+def _top_k(scores, k):
+    """Return indices of the k best scores, best first, ties broken by position"""
+    if NUMPY_AVAILABLE:
+        return top_k_indices(scores, k).tolist()
+    return heapq.nsmallest(k, range(len(scores)), key=lambda i: (-scores[i], i))
+
+
+class RankedCandidates:
+    """
+    A scored candidate list that is ordered lazily.
+
+    Only as many items as the deepest requested page are put in order;
+    the ordered prefix at least doubles each time it has to grow, so paging
+    forward costs a slice rather than a re-rank.
+    """
+
+    def __init__(self, items, scores):
+        self.items = items
+        self.scores = scores
+        self.order = []
+
+    def page(self, offset, count):
+        """Return items[offset:offset + count] in recommendation order"""
+        needed = min(offset + count, len(self.items))
+        if len(self.order) < needed:
+            k = min(len(self.items), max(needed, 2 * len(self.order)))
+            self.order = _top_k(self.scores, k)
+        return [self.items[i] for i in self.order[offset:offset + count]]
+
+
+class PreferenceSnapshot:
+    """
+    In-memory copy of the preference tables used for scoring.
+
+    Built from the database in one pass and tagged with the preference
+    version it was read at, so it can be reused until another write bumps
+    the version.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.source_scores = {}  # {(platform, source_name): score incl. cross-platform boost}
+        self.keyword_scores = {}  # {keyword: score incl. cross-platform boost}
+        self.correlations = defaultdict(dict)  # {(platform1, platform2): {keyword1: (sum, count)}}
+        self.interactions = defaultdict(set)  # {(platform, content_id): {interaction_type}}
+        self._keyword_arrays = None
+        self._correlation_arrays = {}
+
+    @classmethod
+    def load(cls, cursor, version):
+        """Read all preference tables into a new snapshot"""
+        snapshot = cls(version)
+
+        cursor.execute("SELECT source_name, platform, score, cross_platform_boost FROM source_scores")
+        for source_name, platform, score, boost in cursor.fetchall():
+            snapshot.source_scores[(platform, source_name)] = score + (boost * 0.5)
+
+        cursor.execute("SELECT keyword, score + cross_platform_boost * 0.3 FROM unified_keyword_scores")
+        snapshot.keyword_scores = dict(cursor.fetchall())
+
+        cursor.execute("""
+            SELECT platform1, platform2, keyword1, SUM(correlation_strength), COUNT(*)
+            FROM cross_correlations
+            GROUP BY platform1, platform2, keyword1
+        """)
+        for platform1, platform2, keyword, strength_sum, count in cursor.fetchall():
+            snapshot.correlations[(platform1, platform2)][keyword] = (strength_sum, count)
+
+        cursor.execute("SELECT platform, content_id, interaction_type FROM unified_interactions")
+        for platform, content_id, interaction_type in cursor.fetchall():
+            snapshot.interactions[(platform, content_id)].add(interaction_type)
+
+        return snapshot
+
+    def keyword_arrays(self):
+        """
+        Return (keyword_ids, keyword_values) for the vectorized kernel.
+
+        keyword_ids maps every keyword that has a score or a correlation to a
+        column id; keyword_values holds the keyword score per column.
+        """
+        if self._keyword_arrays is None:
+            vocabulary = set(self.keyword_scores)
+            for keywords in self.correlations.values():
+                vocabulary.update(keywords)
+            keyword_ids = {keyword: i for i, keyword in enumerate(vocabulary)}
+            keyword_values = np.zeros(len(keyword_ids))
+            for keyword, score in self.keyword_scores.items():
+                keyword_values[keyword_ids[keyword]] = score
+            self._keyword_arrays = (keyword_ids, keyword_values)
+        return self._keyword_arrays
+
+    def correlation_arrays(self, platform1, platform2):
+        """Return per-column (sums, counts) correlation arrays for a platform pair"""
+        key = (platform1, platform2)
+        if key not in self._correlation_arrays:
+            keyword_ids, _ = self.keyword_arrays()
+            sums = np.zeros(len(keyword_ids))
+            counts = np.zeros(len(keyword_ids))
+            for keyword, (strength_sum, count) in self.correlations.get(key, {}).items():
+                sums[keyword_ids[keyword]] = strength_sum
+                counts[keyword_ids[keyword]] = count
+            self._correlation_arrays[key] = (sums, counts)
+        return self._correlation_arrays[key]
+
 
 class UnifiedRecommendationEngine:
     """
@@ -13,14 +158,42 @@ class UnifiedRecommendationEngine:
     - Cross-platform keyword learning
     - Unified preference scoring
     - Platform-specific adaptations
+    
+    Args:
+        rss_base_dir: directory holding recommendations.db (default ~/rss)
+        durability: 'sync' or 'queued', see INTERACTION_DURABILITY
     """
     
-    def __init__(self, rss_base_dir=None):
+    def __init__(self, rss_base_dir=None, durability='sync'):
         if rss_base_dir is None:
             rss_base_dir = os.path.expanduser("~/rss")
         
         self.db_path = os.path.join(rss_base_dir, "recommendations.db")
+        # Small shared pools, with WAL and the other pragmas set when each
+        # connection opens: writers for mutations (serialized by _lock) and
+        # read-only ones for scoring and stats, which never wait for writers
+        self._write_pool = ConnectionPool(self.db_path, row_factory=sqlite3.Row)
+        self._read_pool = ConnectionPool(self.db_path, row_factory=sqlite3.Row, read_only=True)
         self._lock = threading.RLock()
+        self._snapshot = None
+        self._recent_version = None  # preference version as of _snapshot_checked
+        self._snapshot_checked = 0.0
+        self._snapshot_lock = threading.Lock()
+        self._keyword_cache = {}
+        self._recent_keywords = {}  # platform -> (newest interaction id, [(timestamp, keywords)], Counter)
+        self._ranking_cache = OrderedDict()
+        self._ranking_lock = threading.Lock()
+        # Interaction writes so far: transactions, interactions recorded, rows
+        # touched, and queued interactions dropped because they failed to commit
+        self.write_stats = {'transactions': 0, 'interactions': 0, 'rows': 0, 'dropped': 0}
+        # Write-behind queue, drained by a writer thread started on first use
+        self.durability = durability
+        self._queue = None
+        self._writer = None
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+        if durability == 'queued':
+            atexit.register(self.flush, WRITE_FLUSH_TIMEOUT)
         self._init_database()
     
     def _init_database(self):
@@ -28,11 +201,6 @@ class UnifiedRecommendationEngine:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
-            # Enable foreign keys and WAL mode for better concurrency
-            cursor.execute("PRAGMA foreign_keys = ON")
-            cursor.execute("PRAGMA journal_mode = WAL")
-            cursor.execute("PRAGMA synchronous = NORMAL")
-            
             # Check if we have old schema
             cursor.execute("""
                 SELECT name FROM sqlite_master 
@@ -46,7 +214,27 @@ class UnifiedRecommendationEngine:
             else:
                 # Create new unified schema
                 self._create_unified_schema(cursor)
-            
+
+            # Older databases were created without the keyword boost column
+            # that scoring and cleanup rely on
+            cursor.execute("PRAGMA table_info(unified_keyword_scores)")
+            keyword_columns = {row[1] for row in cursor.fetchall()}
+            if 'cross_platform_boost' not in keyword_columns:
+                cursor.execute("""
+                    ALTER TABLE unified_keyword_scores
+                    ADD COLUMN cross_platform_boost REAL NOT NULL DEFAULT 0.0
+                """)
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS engine_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            cursor.execute("""
+                INSERT OR IGNORE INTO engine_meta (key, value) VALUES ('preference_version', 0)
+            """)
+
             conn.commit()
     
     def _create_unified_schema(self, cursor):
@@ -89,6 +277,7 @@ class UnifiedRecommendationEngine:
         CREATE TABLE IF NOT EXISTS unified_keyword_scores (
             keyword TEXT PRIMARY KEY,
             score REAL NOT NULL DEFAULT 0.0,
+            cross_platform_boost REAL NOT NULL DEFAULT 0.0,
             last_updated REAL NOT NULL
         );
         
@@ -165,77 +354,116 @@ class UnifiedRecommendationEngine:
         
         print("✅ Schema migration completed")
     
-    @contextmanager
     def _get_connection(self):
-        """Get a database connection with proper error handling"""
-        conn = None
-        try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0)
-            conn.row_factory = sqlite3.Row
-            yield conn
-        except sqlite3.Error as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if conn:
-                conn.close()
-    
-    def _ensure_content_exists(self, cursor, content_id, platform, title, author, content_type, timestamp=None):
-        """Ensure a content record exists in the database"""
-        if timestamp is None:
-            timestamp = time.time()
-        
+        """
+        Use a pooled writer connection; an unfinished transaction is rolled
+        back when the outermost use ends, and the connection stays open
+        """
+        return self._write_pool.connection()
+    
+    def _get_reader(self, snapshot=False):
+        """
+        Use a pooled read-only connection; with snapshot=True every
+        query inside reads the same committed state
+        """
+        return self._read_pool.connection(snapshot)
+    
+    def close(self):
+        """Close the pooled connections to the database"""
+        self._write_pool.close()
+        self._read_pool.close()
+    
+    def get_contention_stats(self):
+        """Return connection counts and lock waits of the writer and reader pools"""
+        return {'writer': self._write_pool.get_stats(), 'readers': self._read_pool.get_stats()}
+    
+    def get_write_stats(self):
+        """
+        Return this process's interaction write counters and pool contention.
+        They change without the preference version moving, so they are kept
+        out of get_stats(), whose result is cached per version.
+        """
+        return {'writes': dict(self.write_stats), 'contention': self.get_contention_stats()}
+    
+    def _bump_preference_version(self, cursor):
+        """Mark the preference tables as changed for every process sharing the database"""
         cursor.execute("""
-            INSERT OR IGNORE INTO content 
-            (content_id, platform, title, author, content_type, first_seen_timestamp, last_updated)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (content_id, platform, title, author, content_type, timestamp, timestamp))
+            UPDATE engine_meta SET value = value + 1 WHERE key = 'preference_version'
+        """)
+    
+    def get_preference_version(self):
+        """Return the shared preference version, bumped on every preference write"""
+        with self._get_reader() as conn:
+            row = conn.execute("""
+                SELECT value FROM engine_meta WHERE key = 'preference_version'
+            """).fetchone()
+            return row[0] if row else 0
+    
+    def get_recent_preference_version(self):
+        """
+        Return the preference version without a query on every call: it is
+        re-read at most every SNAPSHOT_CHECK_INTERVAL seconds, and right
+        after this process writes
+        """
+        now = time.time()
+        if self._recent_version is not None and now - self._snapshot_checked < SNAPSHOT_CHECK_INTERVAL:
+            return self._recent_version
         
-        # Update title/author if they've changed
-        cursor.execute("""
-            UPDATE content 
-            SET title = ?, author = ?, last_updated = ?
-            WHERE content_id = ? AND (title != ? OR author != ?)
-        """, (title, author, timestamp, content_id, title, author))
+        with self._snapshot_lock:
+            if self._recent_version is None or now - self._snapshot_checked >= SNAPSHOT_CHECK_INTERVAL:
+                self._recent_version = self.get_preference_version()
+                self._snapshot_checked = now
+            return self._recent_version
     
-    def _update_source_score(self, cursor, source_name, platform, score_delta):
-        """Update source score with cross-platform influence"""
-        cursor.execute("""
+    def _get_snapshot(self):
+        """
+        Return the in-memory preference snapshot, reloading it only when the
+        shared preference version has moved since it was built.
+        """
+        version = self.get_recent_preference_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == self._recent_version:
+                return snapshot
+            
+            # Version and tables from one read snapshot, so they agree
+            with self._get_reader(snapshot=True) as conn:
+                version = self.get_preference_version()
+                snapshot = PreferenceSnapshot.load(conn.cursor(), version)
+            self._snapshot = snapshot
+            self._recent_version = version
+            self._snapshot_checked = time.time()
+            return snapshot
+    
+    def _update_source_scores(self, cursor, source_deltas, now):
+        """
+        Apply {(source_name, platform): score_delta} to the source scores,
+        with cross-platform influence; returns the number of rows touched
+        """
+        cursor.executemany("""
             INSERT INTO source_scores (source_name, platform, score, last_updated)
             VALUES (?, ?, ?, ?)
             ON CONFLICT(source_name, platform) DO UPDATE SET
                 score = score + ?,
                 last_updated = ?
-        """, (source_name, platform, score_delta, time.time(), score_delta, time.time()))
+        """, [(source_name, platform, delta, now, delta, now)
+              for (source_name, platform), delta in source_deltas.items()])
+        rows = cursor.rowcount
         
-        # Apply cross-platform boost (smaller influence from other platforms)
-        other_platform = 'news' if platform == 'youtube' else 'youtube'
-        cross_boost = score_delta * 0.2  # 20% cross-platform influence
-        
-        cursor.execute("""
+        # Apply cross-platform boost (smaller influence from other platforms):
+        # 20% of the delta goes to the same source on the other platform
+        cursor.executemany("""
             UPDATE source_scores 
             SET cross_platform_boost = cross_platform_boost + ?,
                 last_updated = ?
             WHERE source_name = ? AND platform = ?
-        """, (cross_boost, time.time(), source_name, other_platform))
-    
-    def _update_keyword_scores(self, cursor, title, platform, score_delta):
-        """Update keyword scores with platform-specific weights"""
-        keywords = self._extract_keywords(title)
-        current_time = time.time()
-        
-        for keyword in keywords:
-            # Update unified keyword score
-            cursor.execute("""
-                INSERT INTO unified_keyword_scores (keyword, score, last_updated)
-                VALUES (?, ?, ?)
-                ON CONFLICT(keyword) DO UPDATE SET
-                    score = score + ?,
-                    last_updated = ?
-            """, (keyword, score_delta, current_time, score_delta, current_time))
-            
-            # No platform-specific weights needed - unified scoring
+        """, [(delta * 0.2, now, source_name, 'news' if platform == 'youtube' else 'youtube')
+              for (source_name, platform), delta in source_deltas.items()])
+        return rows + cursor.rowcount
     
     def record_interaction(self, content_id, platform, title, author, content_type, 
                           interaction_type, interaction_subtype=None, timestamp=None):
@@ -252,93 +480,306 @@ class UnifiedRecommendationEngine:
             interaction_subtype: 'clicked', 'marked' for watched/read
             timestamp: When the interaction occurred
         """
+        self.record_interactions(
+            [(content_id, platform, title, author, content_type, interaction_type, interaction_subtype)],
+            timestamp
+        )
+    
+    def _interaction_boosts(self, interaction_type, interaction_subtype):
+        """Return the (source, keyword) score deltas of an interaction"""
+        if interaction_type in ['watched', 'read']:
+            if interaction_subtype == 'clicked':
+                return 1.0, 0.5
+            return 0.3, 0.15  # 'marked'
+        if interaction_type == 'starred':
+            return 2.0, 1.5
+        if interaction_type == 'disliked':
+            return -2.0, -1.0
+        return 0.0, 0.0
+    
+    def record_interactions(self, interactions, timestamp=None):
+        """
+        Record many interactions in a single transaction
+        
+        The scores and correlations come out as if the interactions had been
+        recorded one by one, in order, with the same timestamp.
+        
+        With durability 'queued' they are only handed to the background
+        writer, which commits them together with other queued interactions.
+        The write can then still fail after this returns: the interactions
+        are dropped, reported and counted in write_stats['dropped'].
+        
+        Args:
+            interactions: (content_id, platform, title, author, content_type,
+                interaction_type, interaction_subtype) tuples, as taken by
+                record_interaction
+            timestamp: When the interactions occurred
+        
+        Returns:
+            Number of interactions recorded, or queued with durability 'queued'
+        """
+        interactions = list(interactions)
+        if not interactions:
+            return 0
         if timestamp is None:
             timestamp = time.time()
         
+        if self.durability == 'queued':
+            self._enqueue((interactions, timestamp))
+        else:
+            self._commit_interactions([(interactions, timestamp)])
+        return len(interactions)
+    
+    def _commit_interactions(self, batches):
+        """Write (interactions, timestamp) batches in one transaction"""
         with self._lock:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 try:
-                    # Ensure content exists
-                    self._ensure_content_exists(cursor, content_id, platform, title, author, content_type, timestamp)
-                    
-                    # Record interaction
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO unified_interactions 
-                        (content_id, platform, interaction_type, interaction_subtype, timestamp)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (content_id, platform, interaction_type, interaction_subtype, timestamp))
-                    
-                    # Calculate score deltas based on interaction
-                    if interaction_type in ['watched', 'read']:
-                        if interaction_subtype == 'clicked':
-                            source_boost = 1.0
-                            keyword_boost = 0.5
-                        else:  # 'marked'
-                            source_boost = 0.3
-                            keyword_boost = 0.15
-                    elif interaction_type == 'starred':
-                        source_boost = 2.0
-                        keyword_boost = 1.5
-                    elif interaction_type == 'disliked':
-                        source_boost = -2.0
-                        keyword_boost = -1.0
-                    else:
-                        source_boost = 0.0
-                        keyword_boost = 0.0
-                    
-                    # Update scores
-                    if source_boost != 0:
-                        self._update_source_score(cursor, author, platform, source_boost)
-                    if keyword_boost != 0:
-                        self._update_keyword_scores(cursor, title, platform, keyword_boost)
-                    
-                    # Update cross-platform correlations
-                    self._update_cross_correlations(cursor, title, platform)
+                    self._write_pool.begin_write(conn)
+                    now = time.time()
+                    rows = 0
+                    for interactions, timestamp in batches:
+                        rows += self._write_interactions(cursor, interactions, timestamp, now)
                     
+                    self._bump_preference_version(cursor)
                     conn.commit()
+                    self._snapshot_checked = 0.0
+                    self.write_stats['transactions'] += 1
+                    self.write_stats['interactions'] += sum(len(interactions) for interactions, _ in batches)
+                    self.write_stats['rows'] += rows
                     
-                except sqlite3.Error as e:
+                except Exception as e:
                     conn.rollback()
+                    # The cached keyword bags may hold titles that were just rolled back
+                    self._recent_keywords.clear()
                     raise e
     
-    def _update_cross_correlations(self, cursor, title, platform):
-        """Update cross-platform keyword correlations"""
-        keywords = self._extract_keywords(title)
-        if len(keywords) < 2:
+    def _write_interactions(self, cursor, interactions, timestamp, now):
+        """
+        Apply interactions sharing a timestamp; returns the number of rows touched
+        
+        Consecutive interactions on one platform are written together. Each
+        run is correlated with the other platform's recent titles only after
+        the runs before it are written, as if recorded one by one.
+        """
+        rows = 0
+        for _, run in groupby(interactions, key=lambda interaction: interaction[1]):
+            rows += self._write_platform_run(cursor, list(run), timestamp, now)
+        return rows
+    
+    def _write_platform_run(self, cursor, interactions, timestamp, now):
+        """Apply interactions on one platform sharing a timestamp; returns the number of rows touched"""
+        # Tokenize each title once; its keywords feed both the keyword
+        # scores and the cross-platform correlations
+        keywords = [self._extract_keywords(title) for _, _, title, _, _, _, _ in interactions]
+        
+        # Sum the score changes first so every row is written once
+        source_deltas = defaultdict(float)
+        keyword_deltas = defaultdict(float)
+        for (_, platform, _, author, _, interaction_type, interaction_subtype), title_keywords in zip(interactions, keywords):
+            source_boost, keyword_boost = self._interaction_boosts(interaction_type, interaction_subtype)
+            if source_boost != 0:
+                source_deltas[(author, platform)] += source_boost
+            if keyword_boost != 0:
+                for keyword in title_keywords:
+                    keyword_deltas[keyword] += keyword_boost
+        
+        # Ensure content exists, updating title/author if they've changed
+        cursor.executemany("""
+            INSERT OR IGNORE INTO content 
+            (content_id, platform, title, author, content_type, first_seen_timestamp, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(content_id, platform, title, author, content_type, timestamp, timestamp)
+              for content_id, platform, title, author, content_type, _, _ in interactions])
+        rows = cursor.rowcount
+        cursor.executemany("""
+            UPDATE content 
+            SET title = ?, author = ?, last_updated = ?
+            WHERE content_id = ? AND (title != ? OR author != ?)
+        """, [(title, author, timestamp, content_id, title, author)
+              for content_id, _, title, author, _, _, _ in interactions])
+        rows += cursor.rowcount
+        
+        # Record interactions
+        cursor.executemany("""
+            INSERT OR REPLACE INTO unified_interactions 
+            (content_id, platform, interaction_type, interaction_subtype, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(content_id, platform, interaction_type, interaction_subtype, timestamp)
+              for content_id, platform, _, _, _, interaction_type, interaction_subtype in interactions])
+        rows += cursor.rowcount
+        
+        # Update scores
+        rows += self._update_source_scores(cursor, source_deltas, now)
+        cursor.executemany("""
+            INSERT INTO unified_keyword_scores (keyword, score, last_updated)
+            VALUES (?, ?, ?)
+            ON CONFLICT(keyword) DO UPDATE SET
+                score = score + ?,
+                last_updated = ?
+        """, [(keyword, delta, timestamp, delta, timestamp)
+              for keyword, delta in keyword_deltas.items()])
+        rows += cursor.rowcount
+        
+        # Update cross-platform correlations
+        rows += self._update_cross_correlations(
+            cursor, [(title_keywords, platform)
+                     for (_, platform, _, _, _, _, _), title_keywords in zip(interactions, keywords)],
+            now
+        )
+        return rows
+    
+    def _enqueue(self, item):
+        """Hand an item to the background writer, starting it in this process if needed"""
+        with self._writer_lock:
+            if self._writer is None or self._writer_pid != os.getpid() or not self._writer.is_alive():
+                # A forked child inherits neither the thread nor what was queued for it
+                self._queue = queue.Queue()
+                self._writer = threading.Thread(target=self._run_writer, args=(self._queue,),
+                                                name='interaction-writer', daemon=True)
+                self._writer_pid = os.getpid()
+                self._writer.start()
+            self._queue.put(item)
+    
+    def _run_writer(self, pending):
+        """Commit queued interactions in groups of up to WRITE_BATCH_SIZE or WRITE_BATCH_INTERVAL"""
+        while True:
+            batches = []
+            flushes = []
+            item = pending.get()
+            deadline = time.monotonic() + WRITE_BATCH_INTERVAL
+            while True:
+                if isinstance(item, threading.Event):
+                    # A flush() is waiting: commit what came before it right away
+                    flushes.append(item)
+                    break
+                batches.append(item)
+                if len(batches) >= WRITE_BATCH_SIZE:
+                    break
+                try:
+                    item = pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            
+            if batches:
+                self._commit_queued(batches)
+            for flushed in flushes:
+                flushed.set()
+    
+    def _commit_queued(self, batches):
+        """
+        Commit queued batches in one transaction. If that fails, commit them
+        one by one, so only the batches that fail on their own are dropped.
+        """
+        try:
+            self._commit_interactions(batches)
             return
+        except Exception as e:
+            if len(batches) == 1:
+                self._drop_queued(batches[0], e)
+                return
+            print(f"Error writing {len(batches)} queued batches together, retrying one by one: {e}")
+        for batch in batches:
+            try:
+                self._commit_interactions([batch])
+            except Exception as e:
+                self._drop_queued(batch, e)
+    
+    def _drop_queued(self, batch, error):
+        """Count and report a queued batch that could not be written"""
+        interactions, _ = batch
+        with self._lock:
+            self.write_stats['dropped'] += len(interactions)
+        print(f"Error writing {len(interactions)} queued interactions, dropping them: {error}")
+    
+    def flush(self, timeout=None):
+        """
+        Wait until every interaction queued so far is committed or dropped;
+        returns False if that did not happen within timeout seconds. Dropped
+        interactions are counted in write_stats['dropped'].
+        """
+        with self._writer_lock:
+            if self._writer is None or self._writer_pid != os.getpid() or not self._writer.is_alive():
+                return True
+            done = threading.Event()
+            self._queue.put(done)
+        return done.wait(timeout)
+    
+    def _recent_keyword_bag(self, cursor, platform, now):
+        """
+        Return a Counter of the keywords of the last 50 titles consumed or
+        starred on a platform in the past week.
         
-        # Find recent interactions from other platform
-        other_platform = 'news' if platform == 'youtube' else 'youtube'
-        recent_cutoff = time.time() - (7 * 24 * 3600)  # Last 7 days
+        The titles are only re-read and re-tokenized when the platform got a
+        new interaction since the last call (ids only ever grow); otherwise
+        the cached ones that have left the week are dropped.
+        """
+        recent_cutoff = now - (7 * 24 * 3600)  # Last 7 days
+        row = cursor.execute("""
+            SELECT id FROM unified_interactions WHERE platform = ? ORDER BY id DESC LIMIT 1
+        """, (platform,)).fetchone()
+        newest_id = row[0] if row else None
         
-        cursor.execute("""
-            SELECT c.title FROM unified_interactions ui
-            JOIN content c ON ui.content_id = c.content_id
-            WHERE ui.platform = ? AND ui.timestamp > ?
-            AND ui.interaction_type IN ('watched', 'read', 'starred')
-            ORDER BY ui.timestamp DESC
-            LIMIT 50
-        """, (other_platform, recent_cutoff))
-        
-        recent_titles = [row[0] for row in cursor.fetchall()]
-        
-        # Calculate correlations
-        for recent_title in recent_titles:
-            recent_keywords = self._extract_keywords(recent_title)
+        cached = self._recent_keywords.get(platform)
+        if cached is None or cached[0] != newest_id:
+            cursor.execute("""
+                SELECT ui.timestamp, c.title FROM unified_interactions ui
+                JOIN content c ON ui.content_id = c.content_id
+                WHERE ui.platform = ? AND ui.timestamp > ?
+                AND ui.interaction_type IN ('watched', 'read', 'starred')
+                ORDER BY ui.timestamp DESC
+                LIMIT 50
+            """, (platform, recent_cutoff))
+            recent = [(timestamp, self._extract_keywords(title)) for timestamp, title in cursor.fetchall()]
+        elif cached[1] and cached[1][-1][0] <= recent_cutoff:
+            # Anything older than the dropped titles is outside the week too
+            recent = [(timestamp, keywords) for timestamp, keywords in cached[1] if timestamp > recent_cutoff]
+        else:
+            return cached[2]
+        
+        bag = Counter(keyword for _, keywords in recent for keyword in keywords)
+        self._recent_keywords[platform] = (newest_id, recent, bag)
+        return bag
+    
+    def _update_cross_correlations(self, cursor, keyword_lists, now):
+        """
+        Update cross-platform keyword correlations for (keywords, platform)
+        pairs; returns the number of rows touched
+        
+        Each keyword is paired with every keyword occurrence in the other
+        platform's recent titles, so the pair counts come from one keyword
+        Counter per platform instead of a loop over the titles.
+        """
+        pair_counts = defaultdict(int)
+        
+        for keywords, platform in keyword_lists:
+            if len(keywords) < 2:
+                continue
             
+            # Keywords of recent interactions from other platform
+            other_platform = 'news' if platform == 'youtube' else 'youtube'
+            other_keywords = self._recent_keyword_bag(cursor, other_platform, now)
+            
+            # Calculate correlations
             for kw1 in keywords:
-                for kw2 in recent_keywords:
+                for kw2, count in other_keywords.items():
                     if kw1 != kw2:
-                        cursor.execute("""
-                            INSERT INTO cross_correlations 
-                            (keyword1, keyword2, platform1, platform2, correlation_strength, last_updated)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                            ON CONFLICT(keyword1, keyword2, platform1, platform2) DO UPDATE SET
-                                correlation_strength = correlation_strength + 0.1,
-                                last_updated = ?
-                        """, (kw1, kw2, platform, other_platform, 0.1, time.time(), time.time()))
+                        pair_counts[(kw1, kw2, platform, other_platform)] += count
+        
+        if not pair_counts:
+            return 0
+        cursor.executemany("""
+            INSERT INTO cross_correlations 
+            (keyword1, keyword2, platform1, platform2, correlation_strength, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(keyword1, keyword2, platform1, platform2) DO UPDATE SET
+                correlation_strength = correlation_strength + ?,
+                last_updated = ?
+        """, [(kw1, kw2, platform1, platform2, 0.1 * count, now, 0.1 * count, now)
+              for (kw1, kw2, platform1, platform2), count in pair_counts.items()])
+        return cursor.rowcount
     
     def _extract_keywords(self, title):
         """Extract meaningful keywords from content title"""
@@ -362,13 +803,17 @@ class UnifiedRecommendationEngine:
         
         return keywords[:10]  # Limit to top 10 keywords
     
+    def _content_id(self, content_item):
+        """Return the identifier interactions are recorded under for an item"""
+        return content_item.get('video_id') or content_item.get('article_id') or content_item.get('url')
+    
     def calculate_content_score(self, content_item, platform):
         """Calculate unified recommendation score for content"""
-        with self._get_connection() as conn:
+        with self._get_reader(snapshot=True) as conn:
             cursor = conn.cursor()
             
             score = 0.0
-            content_id = content_item.get('video_id') or content_item.get('article_id') or content_item.get('url')
+            content_id = self._content_id(content_item)
             
             # Source preference score (30% weight)
             cursor.execute("""
@@ -434,29 +879,171 @@ class UnifiedRecommendationEngine:
             
             return max(0, score)
     
+    def calculate_content_scores(self, content_items, platform):
+        """
+        Calculate unified recommendation scores for a whole candidate set.
+
+        Scores every item in memory against the preference snapshot, so the
+        database is only touched when another write has bumped the
+        preference version. Scores are returned in the same order as
+        content_items and match calculate_content_score for each item.
+        """
+        if not content_items:
+            return []
+
+        return [float(score) for score in self._score_items(content_items, platform)]
+
+    def _score_items(self, content_items, platform):
+        """Score content_items, returning a NumPy array when the kernel is available"""
+        snapshot = self._get_snapshot()
+        if NUMPY_AVAILABLE:
+            return self._score_with_kernel(content_items, platform, snapshot)
+
+        other_platform = 'news' if platform == 'youtube' else 'youtube'
+        correlations = snapshot.correlations.get((platform, other_platform), {})
+        keyword_scores = snapshot.keyword_scores
+
+        now = time.time()
+        scores = []
+        for item in content_items:
+            score = 0.0
+            keywords = self._title_keywords(item['title'])
+            content_id = self._content_id(item)
+
+            # Source preference score (30% weight)
+            source_score = snapshot.source_scores.get((platform, item['author']))
+            if source_score is not None:
+                score += source_score / (1 + abs(source_score) * 0.1) * 0.30
+
+            # Keyword matching score (40% weight)
+            keyword_score = sum(keyword_scores[kw] for kw in keywords if kw in keyword_scores)
+            if keyword_score:
+                score += keyword_score * 0.40
+
+            # Cross-platform correlation bonus (10% weight), averaged over all matching rows
+            strength_sum = 0.0
+            strength_count = 0
+            for kw in keywords:
+                if kw in correlations:
+                    strength_sum += correlations[kw][0]
+                    strength_count += correlations[kw][1]
+            if strength_count and strength_sum:
+                score += (strength_sum / strength_count) * 0.10
+
+            # Recency bonus (20% weight)
+            try:
+                content_age_days = (now - int(item['timestamp'])) / (24 * 3600)
+                score += max(0, 1 - (content_age_days / 30)) * 0.20
+            except (ValueError, TypeError):
+                pass
+
+            # Handle starred, disliked, and consumed content
+            if content_id:
+                item_interactions = snapshot.interactions.get((platform, content_id), ())
+                if 'disliked' in item_interactions:
+                    score *= 0.01
+                elif 'starred' in item_interactions:
+                    score *= 1.5
+                elif 'watched' in item_interactions or 'read' in item_interactions:
+                    score *= 0.1
+
+            scores.append(max(0, score))
+
+        return scores
+
+    def _title_keywords(self, title):
+        """Return the de-duplicated keywords of a title, memoized across calls"""
+        keywords = self._keyword_cache.get(title)
+        if keywords is None:
+            if len(self._keyword_cache) >= KEYWORD_CACHE_SIZE:
+                self._keyword_cache.clear()
+            keywords = frozenset(self._extract_keywords(title))
+            self._keyword_cache[title] = keywords
+        return keywords
+    
+    def _score_with_kernel(self, content_items, platform, snapshot):
+        """Score content_items with the NumPy kernel, returning a float array"""
+        other_platform = 'news' if platform == 'youtube' else 'youtube'
+        keyword_ids, keyword_values = snapshot.keyword_arrays()
+        correlation_sums, correlation_counts = snapshot.correlation_arrays(platform, other_platform)
+        
+        count = len(content_items)
+        keyword_rows = []
+        source_scores = np.full(count, np.nan)
+        timestamps = np.full(count, np.nan)
+        multipliers = np.ones(count)
+        
+        for i, item in enumerate(content_items):
+            keyword_rows.append([keyword_ids[kw] for kw in self._title_keywords(item['title'])
+                                 if kw in keyword_ids])
+            
+            source_score = snapshot.source_scores.get((platform, item['author']))
+            if source_score is not None:
+                source_scores[i] = source_score
+            
+            try:
+                timestamps[i] = int(item['timestamp'])
+            except (ValueError, TypeError):
+                pass
+            
+            content_id = self._content_id(item)
+            if content_id:
+                interactions = snapshot.interactions.get((platform, content_id))
+                if interactions:
+                    multipliers[i] = interaction_multiplier(interactions)
+        
+        indptr, indices = build_keyword_csr(keyword_rows)
+        return score_candidates(indptr, indices, keyword_values, correlation_sums, correlation_counts,
+                                source_scores, timestamps, multipliers, time.time())
+    
     def get_recommendations(self, content_items, platform, limit=None):
         """Sort content by unified recommendation score"""
         if not content_items:
             return content_items
         
-        # Calculate scores for all content
-        scored_content = []
-        for item in content_items:
-            score = self.calculate_content_score(item, platform)
-            scored_content.append((score, item))
+        # Score the whole candidate set in one pass, then only order the
+        # part that is asked for
+        scores = self._score_items(content_items, platform)
+        order = _top_k(scores, limit if limit else len(content_items))
         
-        # Sort by score (descending)
-        scored_content.sort(key=lambda x: x[0], reverse=True)
+        return [content_items[i] for i in order]
+    
+    def get_recommendation_page(self, platform, cache_key, build_candidates, offset, count):
+        """
+        Return one page of recommended content and the total candidate count.
+        
+        Args:
+            platform: 'youtube' or 'news'
+            cache_key: tuple identifying the candidate set (view, search,
+                feed generation); the preference version is added here
+            build_candidates: callable returning the candidate list, only
+                invoked when no ranking is cached for cache_key
+            offset: index of the first item of the page
+            count: page size
+        """
+        key = (platform, self._get_snapshot().version) + tuple(cache_key)
+        
+        with self._ranking_lock:
+            ranked = self._ranking_cache.get(key)
+            if ranked is not None:
+                self._ranking_cache.move_to_end(key)
         
-        # Return just the content items
-        recommended = [item for score, item in scored_content]
+        if ranked is None:
+            items = build_candidates()
+            ranked = RankedCandidates(items, self._score_items(items, platform))
+            with self._ranking_lock:
+                self._ranking_cache[key] = ranked
+                while len(self._ranking_cache) > RANKING_CACHE_SIZE:
+                    self._ranking_cache.popitem(last=False)
         
-        return recommended[:limit] if limit else recommended
+        with self._ranking_lock:
+            page = ranked.page(offset, count)
+        return page, len(ranked.items)
     
     def get_stats(self, platform=None):
         """Get recommendation engine statistics"""
         try:
-            with self._get_connection() as conn:
+            with self._get_reader(snapshot=True) as conn:
                 cursor = conn.cursor()
                 
                 # Platform filter
@@ -544,6 +1131,7 @@ class UnifiedRecommendationEngine:
     
     def cleanup_old_data(self, days_to_keep=90):
         """Clean up old interaction data"""
+        self.flush(WRITE_FLUSH_TIMEOUT)
         cutoff_time = time.time() - (days_to_keep * 24 * 3600)
         
         with self._lock:
@@ -551,6 +1139,8 @@ class UnifiedRecommendationEngine:
                 cursor = conn.cursor()
                 
                 try:
+                    self._write_pool.begin_write(conn)
+                    
                     # Remove old interactions (but keep starred and disliked)
                     cursor.execute("""
                         DELETE FROM unified_interactions 
@@ -575,14 +1165,17 @@ class UnifiedRecommendationEngine:
                         WHERE last_updated < ? AND correlation_strength < 0.1
                     """, (cutoff_time,))
                     
-                    # Vacuum to reclaim space
-                    cursor.execute("VACUUM")
-                    
+                    self._bump_preference_version(cursor)
                     conn.commit()
+                    self._snapshot_checked = 0.0
+                    self._recent_keywords.clear()
+                    
+                    # Vacuum to reclaim space (must run outside a transaction)
+                    cursor.execute("VACUUM")
                     
                 except sqlite3.Error as e:
                     conn.rollback()
                     raise e
 
 # Global instance
-unified_recommendation_engine = UnifiedRecommendationEngine()
\ No newline at end of file
+unified_recommendation_engine = UnifiedRecommendationEngine(durability=INTERACTION_DURABILITY)
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Append-only URL state files (read items, bookmarks, stars, dislikes).
+
+A state file is a list of URLs, one per line, as used by the sfeed tools.
+Instead of rewriting the whole file on every click, changes are appended
+as journal records: a plain line adds a URL and a REMOVED_PREFIX line
+removes it. The file is compacted back to a sorted plain URL list once the
+journal has grown to about twice the number of URLs it holds, so a click
+costs one short append. sfeed tooling can read the file at any time (a
+'#-' line never matches a feed URL) and sees a plain list after compaction.
+
+The sfeed urls file of read items is opened with journal=False instead,
+as a native replacement for sfeed_markread: marking appends the URLs and
+unmarking rewrites the file without them, so it never holds journal lines.
+
+Writers take an flock on a sidecar lock file, so concurrent requests and
+processes do not interleave records or lose a compaction. Each
+UrlStateFile keeps the current set in memory and only replays the file
+again when another writer has changed it.
+"""
+import fcntl
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Journal record removing the URL that follows it
+REMOVED_PREFIX = '#-'
+
+# Journal records always tolerated before a compaction, however few URLs there are
+COMPACT_MIN_RECORDS = 1000
+
+
+def read_urls_file(file_path):
+    """Read a URL state file (one URL per line, '#' comments, journal removals) into a set"""
+    urls = set()
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if line.startswith(REMOVED_PREFIX):
+                urls.discard(line[len(REMOVED_PREFIX):].strip())
+            elif line.strip() and not line.startswith('#'):
+                urls.add(line.strip())
+    return urls
+
+
+class UrlStateFile:
+    """
+    Set of URLs backed by an append-only state file.
+
+    Args:
+        path: URL file to read and append to (created on first write)
+        journal: record removals as journal lines. Pass False for files
+            other tools parse without knowing about them, such as the sfeed
+            urls file of read items: removals then rewrite the file (through
+            a temp file and rename) without the removed URLs.
+    """
+
+    def __init__(self, path, journal=True):
+        self.path = path
+        self.journal = journal
+        self._urls = None
+        self._records = 0  # lines in the file, including journal records
+        self._file_id = None  # (inode, size, mtime) after our last read or write
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the in-process lock and an exclusive flock on the sidecar lock file"""
+        with self._lock:
+            with open(self.path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stat_id(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _load(self):
+        """Replay the file into memory if another writer changed it"""
+        file_id = self._stat_id()
+        if self._urls is not None and file_id == self._file_id:
+            return
+        urls = set()
+        records = 0
+        if file_id is not None:
+            urls = read_urls_file(self.path)
+            with open(self.path, 'rb') as f:
+                records = sum(1 for _ in f)
+        self._urls = urls
+        self._records = records
+        self._file_id = file_id
+
+    def _append(self, lines):
+        """Append lines to the file in a single write"""
+        data = ''.join(line + '\n' for line in lines).encode('utf-8')
+        with open(self.path, 'ab+') as f:
+            # Do not glue the first line onto a last line written without a newline
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    data = b'\n' + data
+            f.write(data)
+        self._records += len(lines)
+
+    def _replace(self, write):
+        """Atomically replace the file with what write(f) writes to a temp file"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(self.path))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                write(f)
+            if os.path.exists(self.path):
+                os.chmod(temp_path, os.stat(self.path).st_mode & 0o7777)
+            os.replace(temp_path, self.path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+
+    def _compact(self):
+        """Rewrite the file as a sorted URL list"""
+        self._replace(lambda f: f.writelines(url + '\n' for url in sorted(self._urls)))
+        self._records = len(self._urls)
+
+    def _rewrite_without(self, removed):
+        """Rewrite the file without the lines of removed URLs, keeping the order of the rest"""
+        def write(f):
+            with open(self.path, 'r', encoding='utf-8', errors='ignore') as source:
+                f.writelines(line if line.endswith('\n') else line + '\n'
+                             for line in source if line.strip() not in removed)
+        self._replace(write)
+        self._records = len(self._urls)
+
+    def urls(self):
+        """Return a copy of the current set of URLs"""
+        with self._locked():
+            self._load()
+            return set(self._urls)
+
+    def __contains__(self, url):
+        with self._locked():
+            self._load()
+            return url in self._urls
+
+    def add(self, url):
+        """Add a URL; returns False if it was already present"""
+        return bool(self.add_many([url]))
+
+    def remove(self, url):
+        """Remove a URL; returns False if it was not present"""
+        return bool(self.remove_many([url]))
+
+    def add_many(self, urls):
+        """Add URLs with one append; returns the URLs that were not present yet"""
+        with self._locked():
+            self._load()
+            added = []
+            for url in urls:
+                url = url.strip()
+                if url and url not in self._urls:
+                    self._urls.add(url)
+                    added.append(url)
+            if added:
+                self._append(added)
+                self._after_write()
+            return added
+
+    def remove_many(self, urls):
+        """Remove URLs with one append or rewrite; returns the URLs that were present"""
+        with self._locked():
+            self._load()
+            removed = [url for url in dict.fromkeys(url.strip() for url in urls) if url in self._urls]
+            if removed:
+                self._urls.difference_update(removed)
+                if self.journal:
+                    self._append([REMOVED_PREFIX + url for url in removed])
+                else:
+                    self._rewrite_without(set(removed))
+                self._after_write()
+            return removed
+
+    def _after_write(self):
+        if self.journal and self._records > max(COMPACT_MIN_RECORDS, 2 * len(self._urls)):
+            self._compact()
+        self._file_id = self._stat_id()
+
+    def compact(self):
+        """Rewrite the file without journal records"""
+        with self._locked():
+            self._load()
+            self._compact()
+            self._file_id = self._stat_id()
@@ -0,0 +1,344 @@
+"""
+SQLite FTS5-backed article store, an alternative to the in-memory feed index.
+
+sfeed files are ingested into an `articles` table (one row per article with
+its timestamp, status flags and body) mirrored by an `articles_fts` FTS5
+table over title, author, content and url. View filtering, search, sorting
+and LIMIT/OFFSET pagination then run as indexed SQL, so the archive can grow
+to years of articles without the frontend's memory growing with it.
+
+Ingestion is incremental: files that only grew have just their new rows
+inserted, and when a URL file changes only the articles whose URLs were
+added to or removed from it get their flag updated.
+Searches use the trigram tokenizer when SQLite provides it, which keeps the
+substring semantics of the in-memory backend; older SQLite versions fall
+back to word-prefix matching.
+
+Select it with ARTICLE_BACKEND = 'fts5' in config.py.
+"""
+import os
+import sqlite3
+import sys
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from shared_models.feed_cache import FeedFileState, read_feed_file
+from shared_models.url_state import read_urls_file
+from shared_models.feed_items import ArticleItem
+from shared_models.search_index import TOKEN_RE
+from shared_models.sqlite_pool import ConnectionPool
+
+# Bumped whenever the table layout changes; the store is rebuilt from the feeds
+SCHEMA_VERSION = 1
+
+FLAGS = ('read', 'bookmarked', 'starred', 'disliked')
+
+ORDER_BY = {
+    'date-desc': "time DESC, id",
+    'date-asc': "time ASC, id",
+    'title-asc': "lower(title), time DESC, id",
+    'author-asc': "lower(author), time DESC, id",
+}
+
+# A URL file change touching more URLs than this recomputes its flag over
+# the whole table instead of updating the matching articles one batch at a time
+FLAG_FULL_UPDATE_URLS = 5000
+
+# URLs per UPDATE ... WHERE url IN (...) statement
+URL_BATCH_SIZE = 500
+
+ITEM_COLUMNS = "timestamp, title, url, author, source, path, content_offset, content_length, " + ", ".join(FLAGS)
+
+
+class ArticleStore:
+    """
+    Args:
+        db_path: SQLite database file holding the store
+        feeds_dir: directory of sfeed files to ingest
+        state_files: {flag: path} of URL files for the FLAGS
+    """
+
+    def __init__(self, db_path, feeds_dir, state_files):
+        self.db_path = db_path
+        self.feeds_dir = feeds_dir
+        self.state_files = dict(state_files)
+        self.generation = 0
+        # A few shared connections, opened on first use
+        self._pool = ConnectionPool(db_path)
+        self._lock = threading.Lock()
+        self._file_states = {}  # {path: FeedFileState}
+        self._state_mtimes = {}  # {flag: mtime of the URL file last applied}
+        self._state_urls = None  # {flag: set of URLs in state_urls}, loaded on first refresh
+        self._signature = None
+        self._init_database()
+
+    def close(self):
+        """Close the connections to the store"""
+        self._pool.close()
+
+    def _init_database(self):
+        """Create the schema, raising sqlite3.OperationalError if FTS5 is unavailable"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._pool.connection() as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            row = conn.execute("SELECT value FROM store_meta WHERE key = 'schema_version'").fetchone()
+            if row is None or row[0] != SCHEMA_VERSION:
+                for table in ('articles_fts', 'articles', 'feed_files', 'state_urls'):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('schema_version', ?)",
+                             (SCHEMA_VERSION,))
+
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS feed_files (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    parsed_offset INTEGER,
+                    tail_checksum INTEGER
+                );
+
+                CREATE TABLE IF NOT EXISTS articles (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    time INTEGER NOT NULL,
+                    content_offset INTEGER NOT NULL,
+                    content_length INTEGER NOT NULL,
+                    read INTEGER NOT NULL DEFAULT 0,
+                    bookmarked INTEGER NOT NULL DEFAULT 0,
+                    starred INTEGER NOT NULL DEFAULT 0,
+                    disliked INTEGER NOT NULL DEFAULT 0
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_articles_time ON articles(time DESC, id);
+                CREATE INDEX IF NOT EXISTS idx_articles_path ON articles(path);
+                CREATE INDEX IF NOT EXISTS idx_articles_url ON articles(url);
+
+                CREATE TABLE IF NOT EXISTS state_urls (
+                    flag TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    PRIMARY KEY (flag, url)
+                ) WITHOUT ROWID;
+            """)
+
+            try:
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                        title, author, content, url,
+                        content='articles', content_rowid='id', tokenize='trigram'
+                    )
+                """)
+            except sqlite3.OperationalError:
+                # The trigram tokenizer needs SQLite 3.34+
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                        title, author, content, url,
+                        content='articles', content_rowid='id'
+                    )
+                """)
+
+            sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'articles_fts'").fetchone()[0]
+            self._trigram = 'trigram' in sql
+
+            for row in conn.execute("SELECT path, mtime, size, parsed_offset, tail_checksum FROM feed_files"):
+                self._file_states[row[0]] = FeedFileState(*row[1:])
+
+    def _delete_file_rows(self, conn, path):
+        """Remove the articles of a feed file from both tables"""
+        conn.execute("""
+            INSERT INTO articles_fts (articles_fts, rowid, title, author, content, url)
+            SELECT 'delete', id, title, author, content, url FROM articles WHERE path = ?
+        """, (path,))
+        conn.execute("DELETE FROM articles WHERE path = ?", (path,))
+
+    def _apply_flags(self, conn, flags, where="", params=()):
+        """Recompute status flags from state_urls for the articles matching where"""
+        assignments = ", ".join(
+            f"{flag} = EXISTS (SELECT 1 FROM state_urls s WHERE s.flag = '{flag}' AND s.url = articles.url)"
+            for flag in flags
+        )
+        conn.execute(f"UPDATE articles SET {assignments} {where}", params)
+
+    def _ingest_file(self, conn, path, stat):
+        """Insert the new articles of a changed feed file"""
+        previous = self._file_states.get(path)
+        data, appended, state = read_feed_file(path, stat, previous)
+        if not appended:
+            self._delete_file_rows(conn, path)
+
+        start = state.size - len(data)
+        rows = []
+        for article in ArticleItem.parse(data, path, start):
+            body = data[article.content_offset - start:article.content_offset - start + article.content_length]
+            rows.append((path, article.source, article.url, article.title, article.author,
+                         body.decode('utf-8', errors='ignore'), article.timestamp, article.time,
+                         article.content_offset, article.content_length))
+
+        first_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM articles").fetchone()[0]
+        conn.executemany("""
+            INSERT INTO articles (path, source, url, title, author, content, timestamp, time,
+                                  content_offset, content_length)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.execute("""
+            INSERT INTO articles_fts (rowid, title, author, content, url)
+            SELECT id, title, author, content, url FROM articles WHERE id > ?
+        """, (first_id,))
+        self._apply_flags(conn, FLAGS, "WHERE id > ?", (first_id,))
+
+        conn.execute("""
+            INSERT OR REPLACE INTO feed_files (path, mtime, size, parsed_offset, tail_checksum)
+            VALUES (?, ?, ?, ?, ?)
+        """, (path, state.mtime, state.size, state.offset, state.tail))
+        self._file_states[path] = state
+
+    def _reload_state_file(self, conn, flag, path):
+        """
+        Bring the stored URLs of one state file up to date and flag the
+        articles of the URLs added or removed since; returns the new URL set
+        """
+        try:
+            urls = read_urls_file(path)
+        except OSError:
+            urls = set()
+        old_urls = self._state_urls.get(flag, set())
+        added = urls - old_urls
+        removed = old_urls - urls
+        conn.executemany("DELETE FROM state_urls WHERE flag = ? AND url = ?",
+                         [(flag, url) for url in removed])
+        conn.executemany("INSERT OR IGNORE INTO state_urls (flag, url) VALUES (?, ?)",
+                         [(flag, url) for url in added])
+
+        if len(added) + len(removed) > FLAG_FULL_UPDATE_URLS:
+            self._apply_flags(conn, (flag,))
+            return urls
+        for value, changed in ((1, list(added)), (0, list(removed))):
+            for i in range(0, len(changed), URL_BATCH_SIZE):
+                batch = changed[i:i + URL_BATCH_SIZE]
+                conn.execute(f"""
+                    UPDATE articles SET {flag} = ?
+                    WHERE {flag} != ? AND url IN ({", ".join("?" * len(batch))})
+                """, [value, value] + batch)
+        return urls
+
+    def refresh(self):
+        """Ingest changed feed files and URL files; bumps the generation on any change"""
+        with self._lock:
+            try:
+                with os.scandir(self.feeds_dir) as entries:
+                    feed_files = {entry.path: entry.stat() for entry in entries if entry.is_file()}
+            except OSError as e:
+                print(f"Warning: Cannot read feeds directory {self.feeds_dir}: {e}")
+                feed_files = {}
+
+            state_mtimes = {}
+            for flag, path in self.state_files.items():
+                try:
+                    state_mtimes[flag] = os.path.getmtime(path)
+                except OSError:
+                    state_mtimes[flag] = None
+
+            signature = (
+                tuple(sorted((path, stat.st_mtime, stat.st_size) for path, stat in feed_files.items())),
+                tuple(sorted(state_mtimes.items()))
+            )
+            if signature == self._signature:
+                return
+
+            with self._pool.connection() as conn:
+                if self._state_urls is None:
+                    self._state_urls = {flag: set() for flag in self.state_files}
+                    for flag, url in conn.execute("SELECT flag, url FROM state_urls"):
+                        self._state_urls.setdefault(flag, set()).add(url)
+
+                reloaded = {}
+                with conn:
+                    # State URLs first, so newly ingested rows pick up current flags
+                    for flag, mtime in state_mtimes.items():
+                        if self._state_mtimes.get(flag, 0) != mtime:
+                            reloaded[flag] = self._reload_state_file(conn, flag, self.state_files[flag])
+
+                    for path in [path for path in self._file_states if path not in feed_files]:
+                        self._delete_file_rows(conn, path)
+                        conn.execute("DELETE FROM feed_files WHERE path = ?", (path,))
+                        del self._file_states[path]
+                # Only once committed, so a failed update is retried from the old set
+                self._state_urls.update(reloaded)
+                for flag in reloaded:
+                    self._state_mtimes[flag] = state_mtimes[flag]
+
+                # One transaction per file, so an interrupted first ingest resumes where it stopped
+                for path, stat in feed_files.items():
+                    state = self._file_states.get(path)
+                    if state is None or state.mtime != stat.st_mtime or state.size != stat.st_size:
+                        try:
+                            with conn:
+                                self._ingest_file(conn, path, stat)
+                        except (OSError, sqlite3.Error) as e:
+                            self._file_states.pop(path, None)
+                            print(f"Error ingesting feed file {path}: {e}")
+
+            self._signature = signature
+            self.generation += 1
+
+    def invalidate(self, flags=None):
+        """Re-apply the URL files of some (default: all) flags on the next refresh"""
+        with self._lock:
+            for flag in self.state_files if flags is None else flags:
+                self._state_mtimes.pop(flag, None)
+            self._signature = None
+
+    def _search_condition(self, search):
+        """Return (SQL condition, params) for a lowercase search string"""
+        terms = search.split()
+        if self._trigram and terms and all(len(term) >= 3 for term in terms):
+            phrases = " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            return ("id IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?)",
+                    [f"{{title author content}} : ({phrases})"])
+        if not self._trigram and terms and all(TOKEN_RE.fullmatch(term) for term in terms):
+            phrases = " AND ".join(f'"{term}"*' for term in terms)
+            return ("id IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?)",
+                    [f"{{title author content}} : ({phrases})"])
+
+        # Too short for trigrams, or not expressible as FTS terms: scan
+        pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return ("(title LIKE ? ESCAPE '\\' OR author LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\')",
+                [pattern, pattern, pattern])
+
+    def query(self, include=(), exclude=(), search=None, sort_by='date-desc', offset=0, limit=None):
+        """
+        Return (articles, total) for a view, mirroring FeedIndex.query.
+
+        Articles are ArticleItem records whose bodies are read lazily from
+        the feed files; only rows in the LIMIT/OFFSET window are fetched.
+        """
+        self.refresh()
+        conditions = [f"{flag} = 1" for flag in include if flag in FLAGS]
+        conditions += [f"{flag} = 0" for flag in exclude if flag in FLAGS]
+        params = []
+        if search:
+            condition, search_params = self._search_condition(search)
+            conditions.append(condition)
+            params.extend(search_params)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+        # One snapshot, so the total and the page agree
+        with self._pool.connection(snapshot=True) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM articles {where}", params).fetchone()[0]
+            rows = conn.execute(f"""
+                SELECT {ITEM_COLUMNS} FROM articles {where}
+                ORDER BY {ORDER_BY.get(sort_by, ORDER_BY['date-desc'])}
+                LIMIT ? OFFSET ?
+            """, params + [-1 if limit is None else limit, offset]).fetchall()
+
+        articles = []
+        for row in rows:
+            article = ArticleItem(*row[:8])
+            article.read, article.bookmarked, article.starred, article.disliked = map(bool, row[8:])
+            articles.append(article)
+        return articles, total
@@ -18,6 +18,34 @@ STARRED_FILE = os.path.join(RSS_BASE_DIR, "urls-starred-news")
 # Path to the file storing disliked article URLs
 DISLIKED_FILE = os.path.join(RSS_BASE_DIR, "urls-disliked-news")
 
+# SQLite sidecar holding pre-parsed feed files across restarts
+FEED_CACHE_FILE = os.path.join(RSS_BASE_DIR, "feed-cache-news.db")
+
+# Worker count for parsing changed feed files in parallel
+# (None = one per CPU core, 0 or 1 = parse serially)
+FEED_LOAD_WORKERS = None
+
+# Pool used for parallel parsing: 'thread' or 'process'. Worker processes
+# re-import run.py, which builds the app, so the frontends use threads
+FEED_LOAD_EXECUTOR = 'thread'
+
+# Watch the feeds directory and URL files from a background thread so requests
+# skip all file checks while nothing changed: 'auto' (inotify, else polling),
+# 'inotify', 'poll', or None to check the files on every request
+FEED_WATCHER = 'auto'
+
+# Article backend for /api/feeds: 'memory' (in-memory feed index) or 'fts5'
+# (SQLite FTS5 article store; filtering, search and paging run as SQL.
+# The first start ingests the whole archive, which takes a while on large ones)
+ARTICLE_BACKEND = 'memory'
+
+# SQLite database used by the 'fts5' article backend
+ARTICLE_STORE_FILE = os.path.join(RSS_BASE_DIR, "articles-news.db")
+
+# Built API responses (feed pages, stats, subscriptions) kept in memory and
+# answered from while their feed generation and preference version still match
+RESPONSE_CACHE_SIZE = 64
+
 # Path to your sfeedrc file for managing subscriptions
 SFEEDRC_FILE = os.path.join(RSS_BASE_DIR, "news/sfeedrc")
 
@@ -1,21 +1,30 @@
-from flask import Blueprint, render_template, request, jsonify, abort
-import subprocess
+from flask import Blueprint, render_template, request, jsonify, abort, Response, stream_with_context
+from itertools import chain
+import json
 import os
 import sys
 from .utils import (
-    get_all_feeds,
-    format_url_for_sfeed_markread,
+    get_feeds_generation,
+    get_sfeedrc_version,
+    query_feeds,
+    query_feeds_page,
     parse_sfeedrc,
     update_sfeedrc,
     extract_article_preview,
     format_timestamp,
-    invalidate_cache
+    invalidate_cache,
+    read_state,
+    bookmark_state,
+    starred_state,
+    disliked_state,
+    response_cache
 )
-from .config import URLS_FILE, BOOKMARKS_FILE, STARRED_FILE, DISLIKED_FILE, ITEMS_PER_PAGE, SFEEDRC_FILE
+from .config import ITEMS_PER_PAGE, SFEEDRC_FILE
 
 # Import the unified recommendation engine
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from shared_models.unified_recommendation import unified_recommendation_engine
+from shared_models.feed_events import SharedPoll, feed_events
 
 bp = Blueprint('routes', __name__)
 
@@ -24,98 +33,115 @@ def index():
     """Serves the main HTML page."""
     return render_template('index.html')
 
+def _feeds_page():
+    """
+    Return (articles, total, page) for the feed query in the request arguments.
+    Handles filtering, searching, sorting, and pagination on the server-side.
+    """
+    # Get query parameters
+    page = request.args.get('page', 1, type=int)
+    view = request.args.get('view', 'unread').lower()
+    search_query = request.args.get('search', '').lower()
+    sort_by = request.args.get('sort_by', 'date-desc')
+
+    # Bring the feed index up to date (only changed files are re-read)
+    feeds_generation = get_feeds_generation()
+    start_index = (page - 1) * ITEMS_PER_PAGE
+
+    # Recommendation sorting only ranks as far as the requested page
+    if sort_by == 'recommended' or (view == 'discover' and sort_by == 'date-desc'):
+        try:
+            paginated_articles, total_articles = unified_recommendation_engine.get_recommendation_page(
+                'news',
+                (view, search_query, feeds_generation),
+                lambda: query_feeds(view, search_query),
+                start_index, ITEMS_PER_PAGE
+            )
+            return paginated_articles, total_articles, page
+        except Exception as e:
+            print(f"Error in recommendation sorting: {e}")
+            # Fallback to date sorting
+            sort_by = 'date-desc'
+
+    # Filter, search, sort and paginate; newest first is the default
+    paginated_articles, total_articles = query_feeds_page(
+        view, search_query, sort_by, start_index, ITEMS_PER_PAGE
+    )
+    return paginated_articles, total_articles, page
+
+def _article_dict(article):
+    """Turn an article into a dict with its preview and formatted timestamp"""
+    article = article.to_dict()
+    article['preview'] = extract_article_preview(article.get('content', ''))
+    article['formatted_timestamp'] = format_timestamp(article['timestamp'])
+    return article
+
+def _feeds_versions():
+    """Return what a feed page depends on: the feed and URL state generation and the preference version"""
+    return get_feeds_generation(), unified_recommendation_engine.get_recent_preference_version()
+
 @bp.route('/api/feeds')
 def api_feeds():
     """
     Main API endpoint for fetching articles.
-    Handles filtering, searching, sorting, and pagination on the server-side.
+    Unchanged pages are answered with 304 or from the response cache.
     """
-    try:
-        # Get query parameters
-        page = request.args.get('page', 1, type=int)
-        view = request.args.get('view', 'unread').lower()
-        search_query = request.args.get('search', '').lower()
-        sort_by = request.args.get('sort_by', 'date-desc')
-
-        # Get all articles
-        all_articles = get_all_feeds()
-
-        # Apply filtering based on view
-        if view == 'unread':
-            # Show unread articles that are not disliked
-            filtered_articles = [article for article in all_articles if not article['read'] and not article['disliked']]
-        elif view == 'read':
-            # Show read articles that are not disliked
-            filtered_articles = [article for article in all_articles if article['read'] and not article['disliked']]
-        elif view == 'bookmarked':
-            # Show bookmarked articles that are not disliked
-            filtered_articles = [article for article in all_articles if article['bookmarked'] and not article['disliked']]
-        elif view == 'discover':
-            # Show recommended articles that haven't been starred and are not disliked
-            filtered_articles = [article for article in all_articles if not article.get('starred', False) and not article['disliked']]
-        else:  # 'all' view
-            filtered_articles = all_articles
-        
-        # Optional debug (disabled for performance)
-        # print(f"View: {view}, Total articles: {len(all_articles)}, Filtered: {len(filtered_articles)}")
-
-        # Apply search filter
-        if search_query:
-            filtered_articles = [
-                article for article in filtered_articles
-                if search_query in article['title'].lower() 
-                or search_query in article['author'].lower()
-                or search_query in article.get('content', '').lower()
-            ]
-
-        # Apply sorting
-        if view == 'discover' and sort_by == 'date-desc':
-            # Default to recommendation sorting for discover view
-            try:
-                filtered_articles = unified_recommendation_engine.get_recommendations(filtered_articles, 'news')
-            except Exception as e:
-                print(f"Error in recommendation sorting: {e}")
-                # Fallback to date sorting
-                filtered_articles.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0, reverse=True)
-        elif sort_by == 'date-asc':
-            filtered_articles.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0)
-        elif sort_by == 'title-asc':
-            filtered_articles.sort(key=lambda x: x.get('title', '').lower())
-        elif sort_by == 'author-asc':
-            filtered_articles.sort(key=lambda x: x.get('author', '').lower())
-        elif sort_by == 'recommended':
-            # Use unified recommendation engine
-            try:
-                filtered_articles = unified_recommendation_engine.get_recommendations(filtered_articles, 'news')
-            except Exception as e:
-                print(f"Error in recommendation sorting: {e}")
-                # Fallback to date sorting
-                filtered_articles.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0, reverse=True)
-        else:  # 'date-desc' is the default
-            filtered_articles.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0, reverse=True)
-
-        # Apply pagination first to reduce processing
-        total_articles = len(filtered_articles)
-        start_index = (page - 1) * ITEMS_PER_PAGE
-        end_index = start_index + ITEMS_PER_PAGE
-        paginated_articles = filtered_articles[start_index:end_index]
-
-        # Add article previews and format timestamps only for paginated articles
-        for article in paginated_articles:
-            article['preview'] = extract_article_preview(article.get('content', ''))
-            article['formatted_timestamp'] = format_timestamp(article['timestamp'])
+    def build():
+        paginated_articles, total_articles, page = _feeds_page()
 
+        # Turn only the page into dicts, with previews and formatted timestamps
         return jsonify({
-            'feeds': paginated_articles,
+            'feeds': [_article_dict(article) for article in paginated_articles],
             'total': total_articles,
             'page': page,
             'per_page': ITEMS_PER_PAGE,
-            'has_more': end_index < total_articles
+            'has_more': page * ITEMS_PER_PAGE < total_articles
         })
+
+    try:
+        return response_cache.respond(_feeds_versions(), build)
     except Exception as e:
         print(f"Error in /api/feeds: {e}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/api/feeds/stream')
+def api_feeds_stream():
+    """
+    Same page as /api/feeds as newline-delimited JSON: a header line with
+    the paging fields, then one line per article. The page is filtered,
+    ranked and cut before anything is sent; only building the previews and
+    serializing is streamed, so the first articles go out before the rest
+    are serialized.
+    """
+    def build():
+        paginated_articles, total_articles, page = _feeds_page()
+        header = json.dumps({
+            'total': total_articles,
+            'page': page,
+            'per_page': ITEMS_PER_PAGE,
+            'has_more': page * ITEMS_PER_PAGE < total_articles
+        }) + '\n'
+        return chain([header], (json.dumps(_article_dict(article)) + '\n' for article in paginated_articles))
+
+    try:
+        return response_cache.respond_stream(_feeds_versions(), build, 'application/x-ndjson')
+    except Exception as e:
+        print(f"Error in /api/feeds/stream: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Feed generation checks shared by every /api/events client
+_events_poll = SharedPoll(get_feeds_generation)
+
+@bp.route('/api/events')
+def api_events():
+    """Server-sent events announcing new articles and state changes."""
+    events = feed_events(
+        _events_poll,
+        lambda count: query_feeds_page('all', '', 'date-desc', 0, count)
+    )
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @bp.route('/mark_read', methods=['POST'])
 def mark_read():
     """Marks or unmarks an article as read."""
@@ -126,55 +152,86 @@ def mark_read():
         return jsonify({'success': False, 'error': 'No URL provided'}), 400
 
     try:
-        formatted_url = format_url_for_sfeed_markread(url)
-        
         # Optional debug (disabled for performance)
         # print(f"Marking URL as {action}: {url}")
-        
-        # Using sfeed_markread command
-        process = subprocess.Popen(
-            ['sfeed_markread', action, URLS_FILE],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        stdout, stderr = process.communicate(input=formatted_url)
-        
-        if process.returncode == 0:
-            # Debug: Verify the file was updated
-            if os.path.exists(URLS_FILE):
-                with open(URLS_FILE, 'r') as f:
-                    urls_in_file = f.read()
-                    # Optional debug (disabled for performance)
-                    # if action == 'read' and url in urls_in_file:
-                    #     print(f"✅ URL successfully added to read file")
-                    # elif action == 'unread' and url not in urls_in_file:
-                    #     print(f"✅ URL successfully removed from read file")
-            
-            # Invalidate cache to ensure fresh data on next request
-            invalidate_cache()
-            
-            # Record interaction for unified recommendation engine
-            if action == 'read':
-                article_id = data.get('article_id')
-                title = data.get('title', '')
-                author = data.get('author', '')
-                interaction_type = data.get('interaction_type', 'marked')  # 'clicked' or 'marked'
-                if article_id and title and author:
-                    unified_recommendation_engine.record_interaction(
-                        article_id, 'news', title, author, 'article', 
-                        'read', interaction_type
-                    )
-            
-            return jsonify({'success': True, 'action': action})
+
+        # Same file format as sfeed_markread: append to mark, rewrite to unmark
+        if action == 'read':
+            read_state.add(url)
+        elif action == 'unread':
+            read_state.remove(url)
         else:
-            print(f"❌ sfeed_markread failed: {stderr}")
-            return jsonify({'success': False, 'error': stderr}), 500
+            return jsonify({'success': False, 'error': f'Unknown action: {action}'}), 400
+        invalidate_cache('read')
+
+        # Record interaction for unified recommendation engine
+        if action == 'read':
+            article_id = data.get('article_id')
+            title = data.get('title', '')
+            author = data.get('author', '')
+            interaction_type = data.get('interaction_type', 'marked')  # 'clicked' or 'marked'
+            if article_id and title and author:
+                unified_recommendation_engine.record_interaction(
+                    article_id, 'news', title, author, 'article',
+                    'read', interaction_type
+                )
+
+        return jsonify({'success': True, 'action': action})
     except Exception as e:
         print(f"❌ Error in mark_read: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@bp.route('/mark_read_batch', methods=['POST'])
+def mark_read_batch():
+    """
+    Marks or unmarks many articles as read with a single file write.
+    Takes either 'urls', 'items' (articles with url, article_id, title and
+    author) or a 'view' plus optional 'search' selecting every matching article.
+    Newly read items are recorded for recommendations in one transaction.
+    """
+    data = request.get_json()
+    action = data.get('action', 'read')  # 'read' or 'unread'
+    if action not in ('read', 'unread'):
+        return jsonify({'success': False, 'error': f'Unknown action: {action}'}), 400
+
+    try:
+        if 'view' in data:
+            articles = query_feeds(str(data['view']).lower(), str(data.get('search', '')).lower())
+            items = [{'url': article.url, 'article_id': article.article_id, 'title': article.title,
+                      'author': article.author} for article in articles]
+        else:
+            items = data.get('items')
+            if items is None:
+                urls = data.get('urls') or []
+                items = [{'url': url} for url in urls] if isinstance(urls, list) else None
+        if (not isinstance(items, list) or
+                not all(isinstance(item, dict) and isinstance(item.get('url'), str) for item in items)):
+            return jsonify({'success': False, 'error': 'Expected a list of urls or items'}), 400
+
+        urls = [item['url'] for item in items]
+        if action == 'read':
+            changed = read_state.add_many(urls)
+        else:
+            changed = read_state.remove_many(urls)
+        invalidate_cache('read')
+
+        # Record interactions for the articles that were not read before
+        recorded = 0
+        if action == 'read' and changed:
+            changed_urls = set(changed)
+            interaction_type = data.get('interaction_type', 'marked')
+            recorded = unified_recommendation_engine.record_interactions([
+                (item['article_id'], 'news', item['title'], item['author'], 'article',
+                 'read', interaction_type)
+                for item in items
+                if item['url'] in changed_urls and item.get('article_id') and item.get('title') and item.get('author')
+            ])
+
+        return jsonify({'success': True, 'action': action, 'changed': len(changed), 'recorded': recorded})
+    except Exception as e:
+        print(f"❌ Error in mark_read_batch: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @bp.route('/bookmark', methods=['POST'])
 def bookmark():
     """Adds or removes a bookmark."""
@@ -185,28 +242,14 @@ def bookmark():
         return jsonify({'success': False, 'error': 'No URL provided'}), 400
 
     try:
-        # Ensure the bookmarks file exists
-        if not os.path.exists(BOOKMARKS_FILE):
-            with open(BOOKMARKS_FILE, 'w') as f:
-                pass
-
-        # Read all current bookmarks
-        with open(BOOKMARKS_FILE, 'r') as f:
-            bookmarks = set(line.strip() for line in f)
-
-        # Add or remove the URL
+        # Append an add or remove record to the state file
         if action == 'add':
-            bookmarks.add(url)
+            bookmark_state.add(url)
         elif action == 'remove':
-            bookmarks.discard(url)
-
-        # Write the updated set back to the file
-        with open(BOOKMARKS_FILE, 'w') as f:
-            for bookmark_url in sorted(list(bookmarks)):
-                f.write(bookmark_url + '\n')
+            bookmark_state.remove(url)
 
-        # Invalidate cache
-        invalidate_cache()
+        # Re-read only the bookmarked URL set; parsed feeds stay cached
+        invalidate_cache('bookmarked')
         
         return jsonify({'success': True, 'action': action})
     except Exception as e:
@@ -226,35 +269,21 @@ def star():
         return jsonify({'success': False, 'error': 'No URL provided'}), 400
 
     try:
-        # Ensure the starred file exists
-        if not os.path.exists(STARRED_FILE):
-            with open(STARRED_FILE, 'w') as f:
-                pass
-
-        # Read all current starred articles
-        with open(STARRED_FILE, 'r') as f:
-            starred = set(line.strip() for line in f)
-
-        # Add or remove the URL
+        # Append an add or remove record to the state file
         if action == 'star':
-            starred.add(url)
+            starred_state.add(url)
             # Record in unified recommendation engine
             if article_id and title and author:
                 unified_recommendation_engine.record_interaction(
                     article_id, 'news', title, author, 'article', 'starred'
                 )
         elif action == 'unstar':
-            starred.discard(url)
+            starred_state.remove(url)
             # Note: We don't have an "unstar" interaction type in the unified engine
             # The system will handle this through the absence of the starred interaction
 
-        # Write the updated set back to the file
-        with open(STARRED_FILE, 'w') as f:
-            for starred_url in sorted(list(starred)):
-                f.write(starred_url + '\n')
-
-        # Invalidate cache
-        invalidate_cache()
+        # Re-read only the starred URL set; parsed feeds stay cached
+        invalidate_cache('starred')
         
         return jsonify({'success': True, 'action': action})
     except Exception as e:
@@ -277,35 +306,21 @@ def dislike():
         # Optional debug (disabled for performance)
         # print(f"Processing {action} for URL: {url}")
         
-        # Ensure the disliked file exists
-        if not os.path.exists(DISLIKED_FILE):
-            with open(DISLIKED_FILE, 'w') as f:
-                pass
-
-        # Read all current disliked articles
-        with open(DISLIKED_FILE, 'r') as f:
-            disliked = set(line.strip() for line in f)
-
-        # Add or remove the URL
+        # Append an add or remove record to the state file
         if action == 'dislike':
-            disliked.add(url)
+            disliked_state.add(url)
             # Record in unified recommendation engine
             unified_recommendation_engine.record_interaction(
                 article_id, 'news', title, author, 'article', 'disliked'
             )
             # print(f"✅ Added URL to disliked list")
         elif action == 'undislike':
-            disliked.discard(url)
+            disliked_state.remove(url)
             # print(f"✅ Removed URL from disliked list")
             # Note: We don't have an "undislike" interaction type in the unified engine
 
-        # Write the updated set back to the file
-        with open(DISLIKED_FILE, 'w') as f:
-            for disliked_url in sorted(list(disliked)):
-                f.write(disliked_url + '\n')
-
-        # Invalidate cache
-        invalidate_cache()
+        # Re-read only the disliked URL set; parsed feeds stay cached
+        invalidate_cache('disliked')
         
         # print(f"✅ Disliked file updated with {len(disliked)} URLs")
         return jsonify({'success': True, 'action': action})
@@ -341,7 +356,7 @@ def track_interaction():
 @bp.route('/api/recommendation_stats')
 def recommendation_stats():
     """Get unified recommendation engine statistics for news"""
-    try:
+    def build():
         stats = unified_recommendation_engine.get_stats('news')
         
         # Ensure all values are JSON serializable
@@ -354,6 +369,10 @@ def recommendation_stats():
                 safe_stats[key] = float(value) if isinstance(value, (int, float)) else value
         
         return jsonify(safe_stats)
+
+    try:
+        # Stats only change when an interaction is recorded
+        return response_cache.respond((unified_recommendation_engine.get_recent_preference_version(),), build)
     except Exception as e:
         print(f"Error in recommendation_stats: {e}")
         import traceback
@@ -363,7 +382,7 @@ def recommendation_stats():
 @bp.route('/api/unified_stats')
 def unified_stats():
     """Get unified recommendation engine statistics across all platforms"""
-    try:
+    def build():
         stats = unified_recommendation_engine.get_stats()  # No platform filter = unified stats
         
         # Ensure all values are JSON serializable
@@ -376,12 +395,28 @@ def unified_stats():
                 safe_stats[key] = float(value) if isinstance(value, (int, float)) else value
         
         return jsonify(safe_stats)
+
+    try:
+        # Stats only change when an interaction is recorded
+        return response_cache.respond((unified_recommendation_engine.get_recent_preference_version(),), build)
     except Exception as e:
         print(f"Error in unified_stats: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/api/write_stats')
+def write_stats():
+    """
+    Get this process's interaction write and database lock counters. Not
+    cached: they change without a new interaction being recorded.
+    """
+    try:
+        return jsonify(unified_recommendation_engine.get_write_stats())
+    except Exception as e:
+        print(f"Error in write_stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/api/health')
 def health_check():
     """Simple health check endpoint"""
@@ -399,8 +434,7 @@ def favicon():
 def get_subscriptions():
     """API endpoint to get the list of current subscriptions."""
     try:
-        subscriptions = parse_sfeedrc()
-        return jsonify(subscriptions)
+        return response_cache.respond((get_sfeedrc_version(),), lambda: jsonify(parse_sfeedrc()))
     except Exception as e:
         print(f"Error in /api/subscriptions: {e}")
         return jsonify({'error': str(e)}), 500
@@ -1,133 +1,133 @@
 import os
 import re
-import hashlib
+import sqlite3
+import sys
+import threading
 from datetime import datetime
-from .config import FEEDS_DIR, URLS_FILE, BOOKMARKS_FILE, STARRED_FILE, DISLIKED_FILE
+from .config import (
+    FEEDS_DIR, URLS_FILE, BOOKMARKS_FILE, STARRED_FILE, DISLIKED_FILE, FEED_CACHE_FILE,
+    FEED_LOAD_WORKERS, FEED_LOAD_EXECUTOR, FEED_WATCHER, RESPONSE_CACHE_SIZE, ARTICLE_BACKEND, ARTICLE_STORE_FILE
+)
 
-# In-memory cache to avoid re-reading files that haven't changed
-_cache = {
-    'feeds': {},  # {filename: (mtime, articles)}
-    'urls': {'mtime': None, 'data': set()},  # Main URLs file (shared)
-    'bookmarked_urls': {'mtime': None, 'data': set()},
-    'starred_urls': {'mtime': None, 'data': set()},
-    'disliked_urls': {'mtime': None, 'data': set()}
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from shared_models.feed_index import FeedIndex
+from shared_models.feed_items import ArticleItem
+from shared_models.response_cache import ResponseCache
+from shared_models.url_state import UrlStateFile
+
+# URL state files behind the per-article flags
+STATE_FILES = {'read': URLS_FILE, 'bookmarked': BOOKMARKS_FILE, 'starred': STARRED_FILE, 'disliked': DISLIKED_FILE}
+
+# Parsed and flagged view of the news feeds directory, and the optional
+# SQLite FTS5 store answering /api/feeds queries instead of it. Both are
+# opened on first use (get_feed_index, get_article_store), since they
+# create files under ~/rss and the index starts the feed watcher
+_feed_index = None
+_article_store = None
+_article_store_opened = False
+_open_lock = threading.Lock()
+
+# Flags each view requires to be set (include) or unset (exclude);
+# disliked articles only show up in the 'all' view
+VIEW_FILTERS = {
+    'unread': ((), ('read', 'disliked')),
+    'read': (('read',), ('disliked',)),
+    'bookmarked': (('bookmarked',), ('disliked',)),
+    # Recommended articles that haven't been starred
+    'discover': ((), ('starred', 'disliked')),
 }
 
-def read_urls_file_cached(file_path, cache_key):
-    """Read a URLs file with caching to improve performance"""
-    if not os.path.exists(file_path):
-        return set()
-    
-    try:
-        mtime = os.path.getmtime(file_path)
-        if _cache[cache_key]['mtime'] == mtime and _cache[cache_key]['data'] is not None:
-            return _cache[cache_key]['data']
-        
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            data = set(line.strip() for line in f if line.strip() and not line.startswith('#'))
-        
-        _cache[cache_key] = {'mtime': mtime, 'data': data}
-        return data
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-        return set()
+# Read URLs, in the plain sfeed urls format that sfeed_markread also writes
+read_state = UrlStateFile(URLS_FILE, journal=False)
+
+# Append-only state files written by the bookmark, star and dislike routes
+bookmark_state = UrlStateFile(BOOKMARKS_FILE)
+starred_state = UrlStateFile(STARRED_FILE)
+disliked_state = UrlStateFile(DISLIKED_FILE)
+
+# Built API responses, answered from while their ETag versions still match
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+def get_feed_index():
+    """Return the shared feed index, creating it on first use"""
+    global _feed_index
+    if _feed_index is None:
+        with _open_lock:
+            if _feed_index is None:
+                _feed_index = FeedIndex(
+                    FEEDS_DIR, ArticleItem, STATE_FILES,
+                    cache_path=FEED_CACHE_FILE, workers=FEED_LOAD_WORKERS, executor=FEED_LOAD_EXECUTOR,
+                    watcher=FEED_WATCHER, search_fields=('title', 'author', 'content')
+                )
+    return _feed_index
+
+def get_article_store():
+    """
+    Return the article store, opening it on first use, or None when
+    ARTICLE_BACKEND is not 'fts5' or the store could not be opened
+    """
+    global _article_store, _article_store_opened
+    if not _article_store_opened:
+        with _open_lock:
+            if not _article_store_opened:
+                if ARTICLE_BACKEND == 'fts5':
+                    try:
+                        from .article_store import ArticleStore
+                        _article_store = ArticleStore(ARTICLE_STORE_FILE, FEEDS_DIR, STATE_FILES)
+                    except sqlite3.Error as e:
+                        print(f"Error opening article store, using the in-memory index: {e}")
+                _article_store_opened = True
+    return _article_store
+
+def get_feeds_generation():
+    """
+    Bring the feed index up to date and return a counter that changes
+    whenever the feed set or URL state changes
+    """
+    article_store = get_article_store()
+    if article_store is not None:
+        article_store.refresh()
+        return article_store.generation
+    feed_index = get_feed_index()
+    feed_index.refresh()
+    return feed_index.generation
 
 def get_all_feeds():
     """
-    Parse all sfeed files in the feeds directory and return a list of articles.
-    Uses caching to improve performance by avoiding re-reading unchanged files.
+    Return all articles from the sfeed files in the feeds directory, newest first.
+    Unchanged files are served from the feed index instead of being re-read.
     """
     if not os.path.exists(FEEDS_DIR):
         return []
-    
-    # Load URL sets with caching
-    read_urls = read_urls_file_cached(URLS_FILE, 'urls')
-    bookmarked_urls = read_urls_file_cached(BOOKMARKS_FILE, 'bookmarked_urls')
-    starred_urls = read_urls_file_cached(STARRED_FILE, 'starred_urls')
-    disliked_urls = read_urls_file_cached(DISLIKED_FILE, 'disliked_urls')
-    
-    articles = []
-    
-    # Process each feed file with caching
-    try:
-        feed_files = os.listdir(FEEDS_DIR)
-    except OSError:
-        return articles
-    
-    for filename in feed_files:
-        filepath = os.path.join(FEEDS_DIR, filename)
-        if not os.path.isfile(filepath):
-            continue
-        
-        try:
-            # Check cache first
-            mtime = os.path.getmtime(filepath)
-            if filename in _cache['feeds']:
-                cached_mtime, cached_articles = _cache['feeds'][filename]
-                if cached_mtime == mtime:
-                    # Use cached articles but update status flags
-                    for article in cached_articles:
-                        article['read'] = article['url'] in read_urls
-                        article['bookmarked'] = article['url'] in bookmarked_urls
-                        article['starred'] = article['url'] in starred_urls
-                        article['disliked'] = article['url'] in disliked_urls
-                    articles.extend(cached_articles)
-                    continue
-            
-            # Read and parse the file
-            file_articles = []
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # Parse sfeed format: timestamp\ttitle\turl\tcontent\tauthor_html\tid\tactual_author
-                    parts = line.split('\t')
-                    if len(parts) >= 5:
-                        timestamp_str = parts[0]
-                        title = parts[1]
-                        url = parts[2]
-                        content = parts[3]
-                        # Use actual author from field 6 if available, otherwise fall back to field 4
-                        author = parts[6] if len(parts) > 6 and parts[6].strip() else (parts[4] if parts[4] != 'html' else 'Unknown')
-                        
-                        # Generate article ID from URL
-                        article_id = hashlib.md5(url.encode()).hexdigest()
-                        
-                        # Create article dictionary
-                        article = {
-                            'title': title,
-                            'url': url,
-                            'timestamp': timestamp_str,
-                            'author': author,
-                            'content': content,
-                            'read': url in read_urls,
-                            'bookmarked': url in bookmarked_urls,
-                            'starred': url in starred_urls,
-                            'disliked': url in disliked_urls,
-                            'article_id': article_id,
-                            'source': filename  # Feed source file
-                        }
-                        
-                        file_articles.append(article)
-            
-            # Cache the parsed articles
-            _cache['feeds'][filename] = (mtime, file_articles)
-            articles.extend(file_articles)
-            
-        except Exception as e:
-            print(f"Error reading feed file {filename}: {e}")
-            continue
-    
-    return articles
+    return get_feed_index().items()
 
-def format_url_for_sfeed_markread(url):
+def query_feeds(view, search_query, sort_by='date-desc'):
+    """Return the articles of a view matching the search query, sorted as requested"""
+    include, exclude = VIEW_FILTERS.get(view, ((), ()))
+    article_store = get_article_store()
+    if article_store is not None:
+        return article_store.query(include, exclude, search_query, sort_by)[0]
+    return get_feed_index().query(include, exclude, search_query, sort_by=sort_by)
+
+def query_feeds_page(view, search_query, sort_by, offset, count):
     """
-    Format a URL for use with sfeed_markread.
-    sfeed_markread expects URLs with newlines.
+    Return (articles, total) for one page of a view. Both backends fetch
+    only the page for unsearched, newest-first views.
     """
-    return url.strip() + '\n'
+    include, exclude = VIEW_FILTERS.get(view, ((), ()))
+    article_store = get_article_store()
+    if article_store is not None:
+        return article_store.query(include, exclude, search_query, sort_by, offset, count)
+    return get_feed_index().query_page(include, exclude, search_query, sort_by, offset, count)
+
+def get_sfeedrc_version():
+    """Return the sfeedrc file's (mtime, size), which changes whenever subscriptions are edited"""
+    from .config import SFEEDRC_FILE
+    try:
+        stat = os.stat(SFEEDRC_FILE)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
 def parse_sfeedrc():
     """
@@ -265,16 +265,20 @@ def format_timestamp(timestamp_str):
     except (ValueError, TypeError):
         return timestamp_str
 
-def invalidate_cache():
+def invalidate_cache(*flags):
     """
-    Invalidate all caches to force fresh data loading.
-    Call this after updating URL files.
+    Invalidate cached state so the next request re-reads it.
+
+    With flag names ('read', 'bookmarked', 'starred', 'disliked'), only those
+    URL files are re-read and only the articles whose URLs changed are
+    updated; parsed feeds and the other URL sets are kept. Without
+    arguments, parsed feed files are dropped as well.
     """
-    global _cache
-    _cache = {
-        'feeds': {},
-        'urls': {'mtime': None, 'data': set()},  # Main URLs file (shared)
-        'bookmarked_urls': {'mtime': None, 'data': set()},
-        'starred_urls': {'mtime': None, 'data': set()},
-        'disliked_urls': {'mtime': None, 'data': set()}
-    }
\ No newline at end of file
+    # Nothing to invalidate in a backend that has not been opened yet
+    if _feed_index is not None:
+        if flags:
+            _feed_index.invalidate_url_sets(flags)
+        else:
+            _feed_index.invalidate()
+    if _article_store is not None:
+        _article_store.invalidate(flags or None)
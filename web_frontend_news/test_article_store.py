@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the SQLite FTS5 article store.
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_models.feed_index import FeedIndex
+from shared_models.feed_items import ArticleItem
+
+# Loaded by path: the YouTube frontend's tests own the 'app' package name
+_spec = importlib.util.spec_from_file_location(
+    'news_article_store', os.path.join(os.path.dirname(__file__), 'app', 'article_store.py'))
+article_store = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(article_store)
+
+
+def _row(timestamp, title, url, body, author):
+    return f"{timestamp}\t{title}\t{url}\t{body}\thtml\tid\t{author}\n"
+
+
+def test_store_matches_feed_index():
+    base = tempfile.mkdtemp()
+    feeds_dir = os.path.join(base, 'feeds')
+    os.makedirs(feeds_dir)
+    with open(os.path.join(feeds_dir, 'alpha'), 'w') as f:
+        f.write(_row(100, "Old rust news", "https://a/1", "<p>Kernel body</p>", "Ann"))
+        f.write(_row(300, "New python news", "https://a/2", "<p>Über body</p>", "Ann"))
+    with open(os.path.join(feeds_dir, 'beta'), 'w') as f:
+        f.write(_row(200, "Middle", "https://b/1", "<p>Pythonic body</p>", "Bob"))
+    read_file = os.path.join(base, 'urls')
+    with open(read_file, 'w') as f:
+        f.write("https://a/2\n")
+
+    store = article_store.ArticleStore(os.path.join(base, 'articles.db'), feeds_dir, {'read': read_file})
+    index = FeedIndex(feeds_dir, ArticleItem, {'read': read_file}, workers=1,
+                      search_fields=('title', 'author', 'content'))
+
+    for search in (None, "python", "ytho", "body", "über", "bob", "ke", "nothing"):
+        for sort_by in ('date-desc', 'date-asc'):
+            expected = [item.url for item in index.query(exclude=('read',), search=search, sort_by=sort_by)]
+            articles, total = store.query(exclude=('read',), search=search, sort_by=sort_by)
+            assert [article.url for article in articles] == expected, (search, sort_by)
+            assert total == len(expected)
+
+    # Pages come from LIMIT/OFFSET, bodies from the feed files
+    articles, total = store.query(sort_by='date-asc', offset=1, limit=1)
+    assert total == 3 and [article['content'] for article in articles] == ["<p>Pythonic body</p>"]
+
+    # Appended articles and URL file changes are picked up incrementally
+    generation = store.generation
+    with open(os.path.join(feeds_dir, 'beta'), 'a') as f:
+        f.write(_row(400, "Zephyr", "https://b/2", "<p>Wind</p>", "Bob"))
+    with open(read_file, 'a') as f:
+        f.write("https://b/1\n")
+    os.utime(read_file, (1, 1))
+    articles, total = store.query(exclude=('read',))
+    assert [article.url for article in articles] == ["https://b/2", "https://a/1"]
+    assert store.generation > generation
+    assert [article.url for article in store.query(include=('read',), search="pythonic")[0]] == ["https://b/1"]
+
+
+def test_url_file_changes_only_touch_their_articles():
+    base = tempfile.mkdtemp()
+    feeds_dir = os.path.join(base, 'feeds')
+    os.makedirs(feeds_dir)
+    with open(os.path.join(feeds_dir, 'alpha'), 'w') as f:
+        for i in range(50):
+            f.write(_row(100 + i, f"Title {i}", f"https://a/{i}", "<p>body</p>", "Ann"))
+    read_file = os.path.join(base, 'urls')
+    with open(read_file, 'w') as f:
+        f.write("https://a/1\nhttps://a/2\n")
+
+    store = article_store.ArticleStore(os.path.join(base, 'articles.db'), feeds_dir, {'read': read_file})
+    assert store.query(include=('read',))[1] == 2
+
+    # One URL added and one removed: two state_urls rows and two articles change.
+    # Used from one thread, the pool hands out this same connection again
+    with store._pool.connection() as conn:
+        changes = conn.total_changes
+    with open(read_file, 'w') as f:
+        f.write("https://a/2\nhttps://a/3\n")
+    os.utime(read_file, (1, 1))
+    articles, total = store.query(include=('read',))
+    assert sorted(article.url for article in articles) == ["https://a/2", "https://a/3"]
+    assert conn.total_changes - changes == 4
+
+    # Compacting the file rewrites it without changing any URL
+    changes = conn.total_changes
+    with open(read_file, 'w') as f:
+        f.write("https://a/3\nhttps://a/2\n")
+    os.utime(read_file, (2, 2))
+    assert store.query(include=('read',))[1] == 2
+    assert conn.total_changes == changes
+    store.close()
+
+
+if __name__ == "__main__":
+    test_store_matches_feed_index()
+    test_url_file_changes_only_touch_their_articles()
+    print("✅ Article store tests passed")
@@ -18,6 +18,26 @@ STARRED_FILE = os.path.join(RSS_BASE_DIR, "urls-starred-youtube")
 # Path to the file storing disliked video URLs
 DISLIKED_FILE = os.path.join(RSS_BASE_DIR, "urls-disliked-youtube")
 
+# SQLite sidecar holding pre-parsed feed files across restarts
+FEED_CACHE_FILE = os.path.join(RSS_BASE_DIR, "feed-cache-youtube.db")
+
+# Worker count for parsing changed feed files in parallel
+# (None = one per CPU core, 0 or 1 = parse serially)
+FEED_LOAD_WORKERS = None
+
+# Pool used for parallel parsing: 'thread' or 'process'. Worker processes
+# re-import run.py, which builds the app, so the frontends use threads
+FEED_LOAD_EXECUTOR = 'thread'
+
+# Watch the feeds directory and URL files from a background thread so requests
+# skip all file checks while nothing changed: 'auto' (inotify, else polling),
+# 'inotify', 'poll', or None to check the files on every request
+FEED_WATCHER = 'auto'
+
+# Built API responses (feed pages, stats, subscriptions) kept in memory and
+# answered from while their feed generation and preference version still match
+RESPONSE_CACHE_SIZE = 64
+
 # Path to your sfeedrc file for managing subscriptions
 SFEEDRC_FILE = os.path.join(RSS_BASE_DIR, "youtube/sfeedrc")
 
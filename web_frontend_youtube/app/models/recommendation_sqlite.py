@@ -1,12 +1,15 @@
 import sqlite3
 import os
+import sys
 import time
 import threading
 from collections import defaultdict, Counter
 from datetime import datetime, timedelta
-from contextlib import contextmanager
 from ..config import RSS_BASE_DIR
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared_models.sqlite_pool import ConnectionPool
+
 # Import neural network components
 try:
     from .keyword_neural_net import NeuralRecommendationEngine
@@ -22,10 +25,15 @@ class RecommendationEngine:
     - Channel preferences (which channels they watch more)
     - Time-based patterns (when they watch videos)
     - Content keywords (from titles)
+    
+    Each record_* method writes in one transaction and returns the number
+    of rows it touched.
     """
     
     def __init__(self):
         self.db_path = os.path.join(RSS_BASE_DIR, "recommendations.db")
+        # A few shared connections, with WAL and the other pragmas set when each opens
+        self._pool = ConnectionPool(self.db_path, row_factory=sqlite3.Row)
         self._lock = threading.RLock()  # Thread-safe operations
         self._init_database()
         
@@ -44,11 +52,6 @@ class RecommendationEngine:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
-            # Enable foreign keys and WAL mode for better concurrency
-            cursor.execute("PRAGMA foreign_keys = ON")
-            cursor.execute("PRAGMA journal_mode = WAL")
-            cursor.execute("PRAGMA synchronous = NORMAL")
-            
             # Create tables
             cursor.executescript("""
             -- Videos table to store video metadata
@@ -103,24 +106,12 @@ class RecommendationEngine:
             
             conn.commit()
     
-    @contextmanager
     def _get_connection(self):
-        """Get a database connection with proper error handling"""
-        conn = None
-        try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0)
-            conn.row_factory = sqlite3.Row  # Enable dict-like access
-            yield conn
-        except sqlite3.Error as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if conn:
-                conn.close()
+        """Use a pooled connection (kept open between calls)"""
+        return self._pool.connection()
     
     def _ensure_video_exists(self, cursor, video_id, title, author, timestamp=None):
-        """Ensure a video record exists in the database"""
+        """Ensure a video record exists in the database; returns the number of rows touched"""
         if timestamp is None:
             timestamp = time.time()
         
@@ -129,6 +120,7 @@ class RecommendationEngine:
             (video_id, title, author, first_seen_timestamp, last_updated)
             VALUES (?, ?, ?, ?, ?)
         """, (video_id, title, author, timestamp, timestamp))
+        rows = cursor.rowcount
         
         # Update title/author if they've changed
         cursor.execute("""
@@ -136,30 +128,29 @@ class RecommendationEngine:
             SET title = ?, author = ?, last_updated = ?
             WHERE video_id = ? AND (title != ? OR author != ?)
         """, (title, author, timestamp, video_id, title, author))
+        return rows + cursor.rowcount
     
-    def _update_channel_score(self, cursor, channel_name, score_delta):
-        """Update channel score atomically"""
+    def _update_channel_score(self, cursor, channel_name, score_delta, now):
+        """Update channel score atomically; returns the number of rows touched"""
         cursor.execute("""
             INSERT INTO channel_scores (channel_name, score, last_updated)
             VALUES (?, ?, ?)
             ON CONFLICT(channel_name) DO UPDATE SET
                 score = score + ?,
                 last_updated = ?
-        """, (channel_name, score_delta, time.time(), score_delta, time.time()))
+        """, (channel_name, score_delta, now, score_delta, now))
+        return cursor.rowcount
     
-    def _update_keyword_scores(self, cursor, title, score_delta):
-        """Update keyword scores from video title"""
-        keywords = self._extract_keywords(title)
-        current_time = time.time()
-        
-        for keyword in keywords:
-            cursor.execute("""
-                INSERT INTO keyword_scores (keyword, score, last_updated)
-                VALUES (?, ?, ?)
-                ON CONFLICT(keyword) DO UPDATE SET
-                    score = score + ?,
-                    last_updated = ?
-            """, (keyword, score_delta, current_time, score_delta, current_time))
+    def _update_keyword_scores(self, cursor, keywords, score_delta, now):
+        """Update the scores of a title's keywords in one statement; returns the number of rows touched"""
+        cursor.executemany("""
+            INSERT INTO keyword_scores (keyword, score, last_updated)
+            VALUES (?, ?, ?)
+            ON CONFLICT(keyword) DO UPDATE SET
+                score = score + ?,
+                last_updated = ?
+        """, [(keyword, score_delta, now, score_delta, now) for keyword in keywords])
+        return cursor.rowcount
     
     def record_watch(self, video_id, title, author, timestamp=None, interaction_type='clicked'):
         """Record that a user watched a video
@@ -170,13 +161,17 @@ class RecommendationEngine:
         if timestamp is None:
             timestamp = time.time()
         
+        # Tokenize the title once, before taking the lock
+        keywords = self._extract_keywords(title)
+        now = time.time()
+        
         with self._lock:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 try:
                     # Ensure video exists
-                    self._ensure_video_exists(cursor, video_id, title, author, timestamp)
+                    rows = self._ensure_video_exists(cursor, video_id, title, author, timestamp)
                     
                     # Record interaction
                     cursor.execute("""
@@ -184,6 +179,7 @@ class RecommendationEngine:
                         (video_id, interaction_type, interaction_subtype, timestamp)
                         VALUES (?, ?, ?, ?)
                     """, (video_id, 'watched', interaction_type, timestamp))
+                    rows += cursor.rowcount
                     
                     # Different reinforcement based on interaction type
                     if interaction_type == 'clicked':
@@ -194,10 +190,11 @@ class RecommendationEngine:
                         keyword_boost = 0.15
                     
                     # Update scores
-                    self._update_channel_score(cursor, author, channel_boost)
-                    self._update_keyword_scores(cursor, title, keyword_boost)
+                    rows += self._update_channel_score(cursor, author, channel_boost, now)
+                    rows += self._update_keyword_scores(cursor, keywords, keyword_boost, now)
                     
                     conn.commit()
+                    return rows
                     
                 except sqlite3.Error as e:
                     conn.rollback()
@@ -208,13 +205,17 @@ class RecommendationEngine:
         if timestamp is None:
             timestamp = time.time()
         
+        # Tokenize the title once, before taking the lock
+        keywords = self._extract_keywords(title)
+        now = time.time()
+        
         with self._lock:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 try:
                     # Ensure video exists
-                    self._ensure_video_exists(cursor, video_id, title, author, timestamp)
+                    rows = self._ensure_video_exists(cursor, video_id, title, author, timestamp)
                     
                     # Record interaction
                     cursor.execute("""
@@ -222,12 +223,14 @@ class RecommendationEngine:
                         (video_id, interaction_type, interaction_subtype, timestamp)
                         VALUES (?, ?, ?, ?)
                     """, (video_id, 'starred', None, timestamp))
+                    rows += cursor.rowcount
                     
                     # Higher positive reinforcement for starred videos
-                    self._update_channel_score(cursor, author, 2.0)
-                    self._update_keyword_scores(cursor, title, 1.5)
+                    rows += self._update_channel_score(cursor, author, 2.0, now)
+                    rows += self._update_keyword_scores(cursor, keywords, 1.5, now)
                     
                     conn.commit()
+                    return rows
                     
                 except sqlite3.Error as e:
                     conn.rollback()
@@ -235,6 +238,10 @@ class RecommendationEngine:
     
     def record_unstar(self, video_id, title, author):
         """Record that a user unstarred a video"""
+        # Tokenize the title once, before taking the lock
+        keywords = self._extract_keywords(title)
+        now = time.time()
+        
         with self._lock:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
@@ -245,24 +252,26 @@ class RecommendationEngine:
                         DELETE FROM user_interactions 
                         WHERE video_id = ? AND interaction_type = 'starred'
                     """, (video_id,))
+                    rows = cursor.rowcount
                     
                     # Reduce the bonus scores (but don't go too negative)
                     cursor.execute("""
                         UPDATE channel_scores 
                         SET score = MAX(0, score - 1.0), last_updated = ?
                         WHERE channel_name = ?
-                    """, (time.time(), author))
+                    """, (now, author))
+                    rows += cursor.rowcount
                     
                     # Reduce keyword scores
-                    keywords = self._extract_keywords(title)
-                    for keyword in keywords:
-                        cursor.execute("""
-                            UPDATE keyword_scores 
-                            SET score = MAX(0, score - 1.0), last_updated = ?
-                            WHERE keyword = ?
-                        """, (time.time(), keyword))
+                    cursor.executemany("""
+                        UPDATE keyword_scores 
+                        SET score = MAX(0, score - 1.0), last_updated = ?
+                        WHERE keyword = ?
+                    """, [(now, keyword) for keyword in keywords])
+                    rows += cursor.rowcount
                     
                     conn.commit()
+                    return rows
                     
                 except sqlite3.Error as e:
                     conn.rollback()
@@ -273,13 +282,17 @@ class RecommendationEngine:
         if timestamp is None:
             timestamp = time.time()
         
+        # Tokenize the title once, before taking the lock
+        keywords = self._extract_keywords(title)
+        now = time.time()
+        
         with self._lock:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 try:
                     # Ensure video exists
-                    self._ensure_video_exists(cursor, video_id, title, author, timestamp)
+                    rows = self._ensure_video_exists(cursor, video_id, title, author, timestamp)
                     
                     # Record interaction
                     cursor.execute("""
@@ -287,12 +300,14 @@ class RecommendationEngine:
                         (video_id, interaction_type, interaction_subtype, timestamp)
                         VALUES (?, ?, ?, ?)
                     """, (video_id, 'disliked', None, timestamp))
+                    rows += cursor.rowcount
                     
                     # Significant negative reinforcement
-                    self._update_channel_score(cursor, author, -2.0)
-                    self._update_keyword_scores(cursor, title, -1.0)
+                    rows += self._update_channel_score(cursor, author, -2.0, now)
+                    rows += self._update_keyword_scores(cursor, keywords, -1.0, now)
                     
                     conn.commit()
+                    return rows
                     
                 except sqlite3.Error as e:
                     conn.rollback()
@@ -300,6 +315,10 @@ class RecommendationEngine:
     
     def record_undislike(self, video_id, title, author):
         """Record that a user removed dislike from a video"""
+        # Tokenize the title once, before taking the lock
+        keywords = self._extract_keywords(title)
+        now = time.time()
+        
         with self._lock:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
@@ -310,24 +329,26 @@ class RecommendationEngine:
                         DELETE FROM user_interactions 
                         WHERE video_id = ? AND interaction_type = 'disliked'
                     """, (video_id,))
+                    rows = cursor.rowcount
                     
                     # Restore some of the negative scores (but cap at reasonable values)
                     cursor.execute("""
                         UPDATE channel_scores 
                         SET score = MIN(score + 1.5, 0.5), last_updated = ?
                         WHERE channel_name = ?
-                    """, (time.time(), author))
+                    """, (now, author))
+                    rows += cursor.rowcount
                     
                     # Restore keyword scores
-                    keywords = self._extract_keywords(title)
-                    for keyword in keywords:
-                        cursor.execute("""
-                            UPDATE keyword_scores 
-                            SET score = MIN(score + 0.75, 0.25), last_updated = ?
-                            WHERE keyword = ?
-                        """, (time.time(), keyword))
+                    cursor.executemany("""
+                        UPDATE keyword_scores 
+                        SET score = MIN(score + 0.75, 0.25), last_updated = ?
+                        WHERE keyword = ?
+                    """, [(now, keyword) for keyword in keywords])
+                    rows += cursor.rowcount
                     
                     conn.commit()
+                    return rows
                     
                 except sqlite3.Error as e:
                     conn.rollback()
@@ -335,16 +356,21 @@ class RecommendationEngine:
     
     def record_skip(self, video_id, title, author):
         """Record that a user skipped/ignored a video"""
+        # Tokenize the title once, before taking the lock
+        keywords = self._extract_keywords(title)
+        now = time.time()
+        
         with self._lock:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 try:
                     # Slight negative reinforcement
-                    self._update_channel_score(cursor, author, -0.1)
-                    self._update_keyword_scores(cursor, title, -0.05)
+                    rows = self._update_channel_score(cursor, author, -0.1, now)
+                    rows += self._update_keyword_scores(cursor, keywords, -0.05, now)
                     
                     conn.commit()
+                    return rows
                     
                 except sqlite3.Error as e:
                     conn.rollback()
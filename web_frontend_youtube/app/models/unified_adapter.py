@@ -24,6 +24,14 @@ class YouTubeRecommendationAdapter:
             'watched', interaction_type, timestamp
         )
     
+    def record_watches(self, videos, timestamp=None, interaction_type='marked'):
+        """Record many watched (video_id, title, author) videos in one transaction"""
+        return self.unified_engine.record_interactions(
+            [(video_id, 'youtube', title, author, 'video', 'watched', interaction_type)
+             for video_id, title, author in videos],
+            timestamp
+        )
+    
     def record_star(self, video_id, title, author, timestamp=None):
         """Record that a user starred a video"""
         self.unified_engine.record_interaction(
@@ -63,6 +71,20 @@ class YouTubeRecommendationAdapter:
         """Sort videos by recommendation score"""
         return self.unified_engine.get_recommendations(videos, 'youtube', limit)
     
+    def get_recommendation_page(self, cache_key, build_candidates, offset, count):
+        """Return one page of recommended videos and the total candidate count"""
+        return self.unified_engine.get_recommendation_page(
+            'youtube', cache_key, build_candidates, offset, count
+        )
+    
+    def get_preference_version(self):
+        """Get the preference version, which changes on every recorded interaction"""
+        return self.unified_engine.get_preference_version()
+    
+    def get_recent_preference_version(self):
+        """Get the preference version as last checked, re-read at most once a second"""
+        return self.unified_engine.get_recent_preference_version()
+    
     def get_stats(self):
         """Get recommendation engine statistics"""
         stats = self.unified_engine.get_stats('youtube')
@@ -80,6 +102,10 @@ class YouTubeRecommendationAdapter:
             'last_updated': stats.get('last_updated', 0)
         }
     
+    def get_write_stats(self):
+        """Get interaction write and lock contention counters of this process"""
+        return self.unified_engine.get_write_stats()
+    
     def cleanup_old_data(self, days_to_keep=90):
         """Clean up old data"""
         self.unified_engine.cleanup_old_data(days_to_keep)
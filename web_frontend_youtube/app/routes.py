@@ -1,15 +1,28 @@
-from flask import Blueprint, render_template, request, jsonify, abort
-import subprocess
+from flask import Blueprint, render_template, request, jsonify, abort, Response, stream_with_context
+from itertools import chain
+import json
 import os
+import sys
 from .utils import (
-    get_all_feeds,
-    format_url_for_sfeed_markread,
+    get_feeds_generation,
+    get_sfeedrc_version,
+    query_feeds,
+    query_feeds_page,
     parse_sfeedrc,
-    update_sfeedrc
+    update_sfeedrc,
+    invalidate_cache,
+    watched_state,
+    bookmark_state,
+    starred_state,
+    disliked_state,
+    response_cache
 )
-from .config import URLS_FILE, BOOKMARKS_FILE, STARRED_FILE, DISLIKED_FILE, ITEMS_PER_PAGE, SFEEDRC_FILE
+from .config import ITEMS_PER_PAGE, SFEEDRC_FILE
 from .models.unified_adapter import recommendation_engine
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from shared_models.feed_events import SharedPoll, feed_events
+
 bp = Blueprint('routes', __name__)
 
 @bp.route('/')
@@ -17,91 +30,112 @@ def index():
     """Serves the main HTML page."""
     return render_template('index.html')
 
+def _feeds_page():
+    """
+    Returns (videos, total, page) for the feed query in the request arguments.
+    It handles filtering, searching, sorting, and pagination on the server-side.
+    """
+    # --- 1. Get query parameters from the request ---
+    page = request.args.get('page', 1, type=int)
+    view = request.args.get('view', 'unwatched').lower()
+    search_query = request.args.get('search', '').lower()
+    sort_by = request.args.get('sort_by', 'date-desc')
+
+    # --- 2. Bring the feed index up to date (only changed files are re-read) ---
+    feeds_generation = get_feeds_generation()
+    start_index = (page - 1) * ITEMS_PER_PAGE
+
+    # --- 3. Recommendation sorting ranks only what the page needs ---
+    # For discover view, always use recommendations unless explicitly overridden
+    if sort_by == 'recommended' or (view == 'discover' and sort_by == 'date-desc'):
+        try:
+            paginated_items, total_items = recommendation_engine.get_recommendation_page(
+                (view, search_query, feeds_generation),
+                lambda: query_feeds(view, search_query),
+                start_index, ITEMS_PER_PAGE
+            )
+            return paginated_items, total_items, page
+        except Exception as e:
+            print(f"Error in recommendation sorting: {e}")
+            # Fallback to date sorting if recommendations fail
+            sort_by = 'date-desc'
+
+    # --- 4. Apply filtering, search, sorting and pagination ---
+    # The default sort is by timestamp descending (newest first),
+    # which is served as a slice of the precomputed view.
+    paginated_items, total_items = query_feeds_page(
+        view, search_query, sort_by, start_index, ITEMS_PER_PAGE
+    )
+    return paginated_items, total_items, page
+
+def _feeds_versions():
+    """Returns what a feed page depends on: the feed and URL state generation and the preference version."""
+    return get_feeds_generation(), recommendation_engine.get_recent_preference_version()
+
 @bp.route('/api/feeds')
 def api_feeds():
     """
     This is the main API endpoint for fetching videos.
-    It handles filtering, searching, sorting, and pagination on the server-side.
+    Unchanged pages are answered with 304 or from the response cache.
     """
-    try:
-        # --- 1. Get query parameters from the request ---
-        page = request.args.get('page', 1, type=int)
-        view = request.args.get('view', 'unwatched').lower()
-        search_query = request.args.get('search', '').lower()
-        sort_by = request.args.get('sort_by', 'date-desc')
-
-        # --- 2. Get all video items from the utility function (uses caching) ---
-        all_items = get_all_feeds()
-
-        # --- 3. Apply filtering based on the 'view' parameter ---
-        if view == 'unwatched':
-            filtered_items = [item for item in all_items if not item['watched']]
-        elif view == 'watched':
-            filtered_items = [item for item in all_items if item['watched']]
-        elif view == 'bookmarked':
-            filtered_items = [item for item in all_items if item['bookmarked']]
-        elif view == 'discover':
-            # Show recommended videos that haven't been starred
-            filtered_items = [item for item in all_items if not item.get('starred', False)]
-        else:  # 'all' view
-            filtered_items = all_items
-
-        # --- 4. Apply search filter if a query is provided ---
-        if search_query:
-            filtered_items = [
-                item for item in filtered_items
-                if search_query in item['title'].lower() or search_query in item['author'].lower()
-            ]
-
-        # --- 5. Apply sorting ---
-        # The default sort is by timestamp descending (newest first).
-        # For discover view, always use recommendations unless explicitly overridden
-        if view == 'discover' and sort_by == 'date-desc':
-            # Default to recommendation sorting for discover view
-            try:
-                filtered_items = recommendation_engine.get_recommendations(filtered_items)
-            except Exception as e:
-                print(f"Error in recommendation sorting: {e}")
-                # Fallback to date sorting if recommendations fail
-                filtered_items.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0, reverse=True)
-        elif sort_by == 'date-asc':
-            filtered_items.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0)
-        elif sort_by == 'title-asc':
-            filtered_items.sort(key=lambda x: x.get('title', '').lower())
-        elif sort_by == 'author-asc':
-            filtered_items.sort(key=lambda x: x.get('author', '').lower())
-        elif sort_by == 'recommended':
-            # Use recommendation engine to sort videos
-            try:
-                filtered_items = recommendation_engine.get_recommendations(filtered_items)
-            except Exception as e:
-                print(f"Error in recommendation sorting: {e}")
-                # Fallback to date sorting if recommendations fail
-                filtered_items.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0, reverse=True)
-        else:  # 'date-desc' is the default
-            filtered_items.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0, reverse=True)
-
-        # --- 6. Apply pagination to the final, filtered list ---
-        total_items = len(filtered_items)
-        start_index = (page - 1) * ITEMS_PER_PAGE
-        end_index = start_index + ITEMS_PER_PAGE
-        paginated_items = filtered_items[start_index:end_index]
-
-        # --- 7. Return the data as JSON ---
+    def build():
+        paginated_items, total_items, page = _feeds_page()
+
+        # --- 5. Return the data as JSON; only the page is turned into dicts ---
         return jsonify({
-            'feeds': paginated_items,
+            'feeds': [item.to_dict() for item in paginated_items],
             'total': total_items,
             'page': page,
             'per_page': ITEMS_PER_PAGE,
-            'has_more': end_index < total_items
+            'has_more': page * ITEMS_PER_PAGE < total_items
         })
+
+    try:
+        return response_cache.respond(_feeds_versions(), build)
     except Exception as e:
         print(f"Error in /api/feeds: {e}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/api/feeds/stream')
+def api_feeds_stream():
+    """
+    Same page as /api/feeds as newline-delimited JSON: a header line with
+    the paging fields, then one line per video. The page is filtered,
+    ranked and cut before anything is sent; only the serialization is
+    streamed, one video at a time.
+    """
+    def build():
+        paginated_items, total_items, page = _feeds_page()
+        header = json.dumps({
+            'total': total_items,
+            'page': page,
+            'per_page': ITEMS_PER_PAGE,
+            'has_more': page * ITEMS_PER_PAGE < total_items
+        }) + '\n'
+        return chain([header], (json.dumps(item.to_dict()) + '\n' for item in paginated_items))
+
+    try:
+        return response_cache.respond_stream(_feeds_versions(), build, 'application/x-ndjson')
+    except Exception as e:
+        print(f"Error in /api/feeds/stream: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Feed generation checks shared by every /api/events client
+_events_poll = SharedPoll(get_feeds_generation)
+
+@bp.route('/api/events')
+def api_events():
+    """Server-sent events announcing new videos and state changes."""
+    events = feed_events(
+        _events_poll,
+        lambda count: query_feeds_page('all', '', 'date-desc', 0, count)
+    )
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @bp.route('/mark_watched', methods=['POST'])
 def mark_watched():
-    """Marks or unmarks a video as watched by calling an external script."""
+    """Marks or unmarks a video as watched in the sfeed urls file."""
     data = request.get_json()
     url = data.get('url')
     action = data.get('action', 'read')  # 'read' or 'unread'
@@ -109,29 +143,74 @@ def mark_watched():
         return jsonify({'success': False, 'error': 'No URL provided'}), 400
 
     try:
-        formatted_url = format_url_for_sfeed_markread(url)
-        # Using an external command 'sfeed_markread'
-        process = subprocess.Popen(
-            ['sfeed_markread', action, URLS_FILE],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        stdout, stderr = process.communicate(input=formatted_url)
-        if process.returncode == 0:
-            # Record interaction for recommendation engine
-            if action == 'read':
-                video_id = data.get('video_id')
-                title = data.get('title', '')
-                author = data.get('author', '')
-                interaction_type = data.get('interaction_type', 'marked')  # 'clicked' or 'marked'
-                if video_id and title and author:
-                    recommendation_engine.record_watch(video_id, title, author, interaction_type=interaction_type)
-            
-            return jsonify({'success': True, 'action': action})
+        # Same file format as sfeed_markread: append to mark, rewrite to unmark
+        if action == 'read':
+            watched_state.add(url)
+        elif action == 'unread':
+            watched_state.remove(url)
         else:
-            return jsonify({'success': False, 'error': stderr}), 500
+            return jsonify({'success': False, 'error': f'Unknown action: {action}'}), 400
+        invalidate_cache('watched')
+
+        # Record interaction for recommendation engine
+        if action == 'read':
+            video_id = data.get('video_id')
+            title = data.get('title', '')
+            author = data.get('author', '')
+            interaction_type = data.get('interaction_type', 'marked')  # 'clicked' or 'marked'
+            if video_id and title and author:
+                recommendation_engine.record_watch(video_id, title, author, interaction_type=interaction_type)
+
+        return jsonify({'success': True, 'action': action})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/mark_watched_batch', methods=['POST'])
+def mark_watched_batch():
+    """
+    Marks or unmarks many videos as watched with a single file write.
+    Takes either 'urls', 'items' (videos with url, video_id, title and
+    author) or a 'view' plus optional 'search' selecting every matching video.
+    Newly watched items are recorded for recommendations in one transaction.
+    """
+    data = request.get_json()
+    action = data.get('action', 'read')  # 'read' or 'unread'
+    if action not in ('read', 'unread'):
+        return jsonify({'success': False, 'error': f'Unknown action: {action}'}), 400
+
+    try:
+        if 'view' in data:
+            videos = query_feeds(str(data['view']).lower(), str(data.get('search', '')).lower())
+            items = [{'url': video.link, 'video_id': video.video_id, 'title': video.title,
+                      'author': video.author} for video in videos]
+        else:
+            items = data.get('items')
+            if items is None:
+                urls = data.get('urls') or []
+                items = [{'url': url} for url in urls] if isinstance(urls, list) else None
+        if (not isinstance(items, list) or
+                not all(isinstance(item, dict) and isinstance(item.get('url'), str) for item in items)):
+            return jsonify({'success': False, 'error': 'Expected a list of urls or items'}), 400
+
+        urls = [item['url'] for item in items]
+        if action == 'read':
+            changed = watched_state.add_many(urls)
+        else:
+            changed = watched_state.remove_many(urls)
+        invalidate_cache('watched')
+
+        # Record interactions for the videos that were not watched before
+        recorded = 0
+        if action == 'read' and changed:
+            changed_urls = set(changed)
+            interaction_type = data.get('interaction_type', 'marked')
+            recorded = recommendation_engine.record_watches(
+                [(item['video_id'], item['title'], item['author']) for item in items
+                 if item['url'] in changed_urls and item.get('video_id') and item.get('title') and item.get('author')],
+                interaction_type=interaction_type
+            )
+
+        return jsonify({'success': True, 'action': action, 'changed': len(changed), 'recorded': recorded})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -145,25 +224,12 @@ def bookmark():
         return jsonify({'success': False, 'error': 'No URL provided'}), 400
 
     try:
-        # Ensure the bookmarks file exists
-        if not os.path.exists(BOOKMARKS_FILE):
-            with open(BOOKMARKS_FILE, 'w') as f:
-                pass  # Create empty file
-
-        # Read all current bookmarks
-        with open(BOOKMARKS_FILE, 'r') as f:
-            bookmarks = set(line.strip() for line in f)
-
-        # Add or remove the URL
+        # Append an add or remove record to the state file
         if action == 'add':
-            bookmarks.add(url)
+            bookmark_state.add(url)
         elif action == 'remove':
-            bookmarks.discard(url)
-
-        # Write the updated set back to the file
-        with open(BOOKMARKS_FILE, 'w') as f:
-            for bookmark_url in sorted(list(bookmarks)):
-                f.write(bookmark_url + '\n')
+            bookmark_state.remove(url)
+        invalidate_cache('bookmarked')
 
         return jsonify({'success': True, 'action': action})
     except Exception as e:
@@ -216,7 +282,7 @@ def star_video():
 @bp.route('/api/recommendation_stats')
 def recommendation_stats():
     """Get recommendation engine statistics"""
-    try:
+    def build():
         print("Getting recommendation stats...")
         stats = recommendation_engine.get_stats()
         
@@ -238,12 +304,28 @@ def recommendation_stats():
         
         print(f"Safe stats: {safe_stats}")
         return jsonify(safe_stats)
+
+    try:
+        # Stats only change when an interaction is recorded
+        return response_cache.respond((recommendation_engine.get_recent_preference_version(),), build)
     except Exception as e:
         print(f"Error in recommendation_stats: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/api/write_stats')
+def write_stats():
+    """
+    Get this process's interaction write and database lock counters. Not
+    cached: they change without a new interaction being recorded.
+    """
+    try:
+        return jsonify(recommendation_engine.get_write_stats())
+    except Exception as e:
+        print(f"Error in write_stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/api/neural/train', methods=['POST'])
 def train_neural_network():
     """Train the neural network model"""
@@ -336,31 +418,18 @@ def star():
         return jsonify({'success': False, 'error': 'No URL provided'}), 400
 
     try:
-        # Ensure the starred file exists
-        if not os.path.exists(STARRED_FILE):
-            with open(STARRED_FILE, 'w') as f:
-                pass  # Create empty file
-
-        # Read all current starred videos
-        with open(STARRED_FILE, 'r') as f:
-            starred = set(line.strip() for line in f)
-
-        # Add or remove the URL
+        # Append an add or remove record to the state file
         if action == 'star':
-            starred.add(url)
+            starred_state.add(url)
             # Also record in recommendation engine
             if video_id and title and author:
                 recommendation_engine.record_star(video_id, title, author)
         elif action == 'unstar':
-            starred.discard(url)
+            starred_state.remove(url)
             # Also record in recommendation engine
             if video_id and title and author:
                 recommendation_engine.record_unstar(video_id, title, author)
-
-        # Write the updated set back to the file
-        with open(STARRED_FILE, 'w') as f:
-            for starred_url in sorted(list(starred)):
-                f.write(starred_url + '\n')
+        invalidate_cache('starred')
 
         return jsonify({'success': True, 'action': action})
     except Exception as e:
@@ -380,29 +449,16 @@ def dislike():
         return jsonify({'success': False, 'error': 'Missing required data'}), 400
 
     try:
-        # Ensure the disliked file exists
-        if not os.path.exists(DISLIKED_FILE):
-            with open(DISLIKED_FILE, 'w') as f:
-                pass  # Create empty file
-
-        # Read all current disliked videos
-        with open(DISLIKED_FILE, 'r') as f:
-            disliked = set(line.strip() for line in f)
-
-        # Add or remove the URL
+        # Append an add or remove record to the state file
         if action == 'dislike':
-            disliked.add(url)
+            disliked_state.add(url)
             # Also record in recommendation engine
             recommendation_engine.record_dislike(video_id, title, author)
         elif action == 'undislike':
-            disliked.discard(url)
+            disliked_state.remove(url)
             # Also record in recommendation engine
             recommendation_engine.record_undislike(video_id, title, author)
-
-        # Write the updated set back to the file
-        with open(DISLIKED_FILE, 'w') as f:
-            for disliked_url in sorted(list(disliked)):
-                f.write(disliked_url + '\n')
+        invalidate_cache('disliked')
 
         return jsonify({'success': True, 'action': action})
     except Exception as e:
@@ -415,8 +471,7 @@ def dislike():
 def get_subscriptions():
     """API endpoint to get the list of current subscriptions."""
     try:
-        subscriptions = parse_sfeedrc()
-        return jsonify(subscriptions)
+        return response_cache.respond((get_sfeedrc_version(),), lambda: jsonify(parse_sfeedrc()))
     except Exception as e:
         print(f"Error in /api/subscriptions: {e}")
         return jsonify({'error': str(e)}), 500
@@ -78,6 +78,22 @@ document.addEventListener('DOMContentLoaded', () => {
     const themeManager = new ThemeManager();
 
     // --- UTILITY FUNCTIONS ---
+    // Calls onLine with each parsed line of a newline-delimited JSON response as it arrives
+    async function readNdjson(response, onLine) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => onLine(JSON.parse(line)));
+            if (done) break;
+        }
+        if (buffer.trim()) onLine(JSON.parse(buffer));
+    }
+
     function escapeHtml(text) {
         if (typeof text !== 'string') return '';
         const div = document.createElement('div');
@@ -188,11 +204,21 @@ document.addEventListener('DOMContentLoaded', () => {
         });
 
         try {
-            const response = await fetch(`/api/feeds?${params.toString()}`);
+            // Videos are streamed one per line and rendered as they arrive
+            const response = await fetch(`/api/feeds/stream?${params.toString()}`);
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-            const data = await response.json();
+            let data = null;
+            let received = 0;
+            await readNdjson(response, line => {
+                if (data === null) {
+                    data = line;
+                    return;
+                }
+                videoGrid.insertAdjacentHTML('beforeend', getVideoCardHTML(line));
+                received++;
+            });
 
-            if (data.feeds.length === 0 && state.currentPage === 1) {
+            if (received === 0 && state.currentPage === 1) {
                 let emptyMessage = 'No videos found for this view.';
                 if (state.activeView === 'discover') {
                     emptyMessage = `
@@ -212,14 +238,10 @@ document.addEventListener('DOMContentLoaded', () => {
                     `;
                 }
                 videoGrid.innerHTML = `<div style="grid-column: 1 / -1;">${emptyMessage}</div>`;
-            } else {
-                data.feeds.forEach(video => {
-                    videoGrid.insertAdjacentHTML('beforeend', getVideoCardHTML(video));
-                });
             }
 
             state.hasMore = data.has_more;
-            if (!state.hasMore && data.feeds.length > 0) {
+            if (!state.hasMore && received > 0) {
                 endOfResultsMessage.style.display = 'block';
             }
 
@@ -901,10 +923,26 @@ document.addEventListener('DOMContentLoaded', () => {
         if (e.target === recommendationsModal) closeRecommendationsModal();
     });
 
+    // --- LIVE UPDATES ---
+    // The server pushes an event when feed updates bring new videos,
+    // instead of the page re-fetching to find out
+    function listenForUpdates() {
+        if (!window.EventSource) return;
+        const events = new EventSource('/api/events');
+        events.addEventListener('new_items', (e) => {
+            const data = JSON.parse(e.data);
+            showNotification(`${data.count} new video${data.count === 1 ? '' : 's'} available`, 'info', 6000);
+            if (state.sortBy === 'date-desc' && window.scrollY === 0 && !state.isLoading) {
+                fetchVideos(true);
+            }
+        });
+    }
+
     // --- INITIALIZATION ---
     function initialize() {
         updateUI();
         fetchVideos(true);
+        listenForUpdates();
     }
 
     initialize();
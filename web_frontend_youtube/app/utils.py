@@ -1,153 +1,106 @@
 import os
 import re
-import csv
+import sys
 import shlex
-from datetime import datetime
-from .config import FEEDS_DIR, URLS_FILE, BOOKMARKS_FILE, STARRED_FILE, DISLIKED_FILE, SFEEDRC_FILE
-
-# Increase CSV field size limit to handle large content fields
-csv.field_size_limit(1000000)
-
-# In-memory cache to avoid re-reading files that haven't changed
-_cache = {
-    'feeds': {},  # {filename: (mtime, items)}
-    'bookmarks': {'mtime': None, 'data': set()},
-    'watched': {'mtime': None, 'data': set()}
+import threading
+from .config import (
+    FEEDS_DIR, URLS_FILE, BOOKMARKS_FILE, STARRED_FILE, DISLIKED_FILE, SFEEDRC_FILE, FEED_CACHE_FILE,
+    FEED_LOAD_WORKERS, FEED_LOAD_EXECUTOR, FEED_WATCHER, RESPONSE_CACHE_SIZE
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from shared_models.feed_index import FeedIndex
+from shared_models.feed_items import VideoItem
+from shared_models.response_cache import ResponseCache
+from shared_models.url_state import UrlStateFile
+
+# Parsed, flagged and de-duplicated view of the YouTube feeds directory.
+# Created by get_feed_index() on first use, since it opens the feed cache
+# under ~/rss and starts the feed watcher
+_feed_index = None
+_feed_index_lock = threading.Lock()
+
+# Flags each view requires to be set (include) or unset (exclude)
+VIEW_FILTERS = {
+    'unwatched': ((), ('watched',)),
+    'watched': (('watched',), ()),
+    'bookmarked': (('bookmarked',), ()),
+    # Show recommended videos that haven't been starred
+    'discover': ((), ('starred',)),
 }
 
-def extract_youtube_id(url):
-    """Extracts the YouTube video ID from various URL formats."""
-    if not url:
-        return None
-    patterns = [
-        r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/|youtube\.com/shorts/)([^&\n?#]+)',
-        r'youtube\.com/v/([^&\n?#]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    return None
-
-def get_youtube_thumbnail(video_id):
-    """Generates a YouTube thumbnail URL from a video ID."""
-    if not video_id:
-        return None
-    return f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
-
-def read_urls_file(file_path):
-    """Generic function to read a file of URLs into a set, with caching."""
-    cache_key = os.path.basename(file_path)
-    if not os.path.exists(file_path):
-        return set()
-
-    mtime = os.path.getmtime(file_path)
-    if _cache.get(cache_key) and _cache[cache_key]['mtime'] == mtime:
-        return _cache[cache_key]['data']
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = set(line.strip() for line in f if line.strip())
-
-    _cache[cache_key] = {'mtime': mtime, 'data': data}
-    return data
-
-def parse_feed_file(filepath):
-    """Parses a single sfeed data file."""
-    if not os.path.exists(filepath):
-        print(f"Error: Feed file does not exist: {filepath}")
-        return []
-
-    mtime = os.path.getmtime(filepath)
-    if _cache['feeds'].get(filepath) and _cache['feeds'][filepath][0] == mtime:
-        return _cache['feeds'][filepath][1]
-
-    items = []
-    try:
-        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-            reader = csv.reader(f, delimiter='\t')
-            for row in reader:
-                if len(row) < 8:
-                    continue  # Skip malformed rows
-
-                timestamp, title, link, content, _, _, author, _ = row[:8]
-                video_id = extract_youtube_id(link)
-
-                if not all([title, link, author, video_id]):
-                    continue # Skip if essential data is missing
-
-                try:
-                    dt = datetime.fromtimestamp(int(timestamp))
-                    formatted_date = dt.strftime('%Y-%m-%d')
-                except (ValueError, TypeError):
-                    formatted_date = "Unknown date"
-
-                items.append({
-                    'timestamp': timestamp,
-                    'title': title.strip(),
-                    'link': link.strip(),
-                    'content': content,
-                    'author': author.strip(),
-                    'date': formatted_date,
-                    'feed_name': os.path.basename(filepath),
-                    'video_id': video_id,
-                    'thumbnail_url': get_youtube_thumbnail(video_id)
-                })
-    except Exception as e:
-        print(f"Error parsing feed file {filepath}: {e}")
-        return []
-
-    _cache['feeds'][filepath] = (mtime, items)
-    return items
+# Watched URLs, in the plain sfeed urls format that sfeed_markread also writes
+watched_state = UrlStateFile(URLS_FILE, journal=False)
+
+# Append-only state files written by the bookmark, star and dislike routes
+bookmark_state = UrlStateFile(BOOKMARKS_FILE)
+starred_state = UrlStateFile(STARRED_FILE)
+disliked_state = UrlStateFile(DISLIKED_FILE)
+
+# Built API responses, answered from while their ETag versions still match
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+def get_feed_index():
+    """Returns the shared feed index, creating it on first use."""
+    global _feed_index
+    if _feed_index is None:
+        with _feed_index_lock:
+            if _feed_index is None:
+                _feed_index = FeedIndex(
+                    FEEDS_DIR, VideoItem,
+                    {'watched': URLS_FILE, 'bookmarked': BOOKMARKS_FILE,
+                     'starred': STARRED_FILE, 'disliked': DISLIKED_FILE},
+                    cache_path=FEED_CACHE_FILE, dedupe=True, workers=FEED_LOAD_WORKERS,
+                    executor=FEED_LOAD_EXECUTOR, watcher=FEED_WATCHER, search_fields=('title', 'author')
+                )
+    return _feed_index
+
+def get_feeds_generation():
+    """
+    Brings the feed index up to date and returns a counter that changes
+    whenever the feed set or URL state changes.
+    """
+    feed_index = get_feed_index()
+    feed_index.refresh()
+    return feed_index.generation
 
 def get_all_feeds():
-    """Aggregates all items from all feed files with deduplication by URL."""
-    all_items = []
-    watched_urls = read_urls_file(URLS_FILE)
-    bookmarked_urls = read_urls_file(BOOKMARKS_FILE)
-    starred_urls = read_urls_file(STARRED_FILE)
-    disliked_urls = read_urls_file(DISLIKED_FILE)
-
+    """Aggregates all items from all feed files with deduplication by URL, newest first."""
     if not os.path.exists(FEEDS_DIR):
         print(f"Warning: Feeds directory does not exist: {FEEDS_DIR}")
         return []
+    return get_feed_index().items()
 
+def query_feeds(view, search_query, sort_by='date-desc'):
+    """Returns the videos of a view matching the search query, sorted as requested."""
+    include, exclude = VIEW_FILTERS.get(view, ((), ()))
+    return get_feed_index().query(include, exclude, search_query, sort_by=sort_by)
+
+def query_feeds_page(view, search_query, sort_by, offset, count):
+    """Returns (videos, total) for one page of a view."""
+    include, exclude = VIEW_FILTERS.get(view, ((), ()))
+    return get_feed_index().query_page(include, exclude, search_query, sort_by, offset, count)
+
+def invalidate_cache(*flags):
+    """
+    Marks URL state files (by flag name) as changed, or everything if no
+    flag is given, so the next request re-reads them without waiting for
+    the feed watcher to notice our own write.
+    """
+    if _feed_index is None:
+        return  # not loaded yet: the first request reads everything anyway
+    if flags:
+        _feed_index.invalidate_url_sets(flags)
+    else:
+        _feed_index.invalidate()
+
+def get_sfeedrc_version():
+    """Returns the sfeedrc file's (mtime, size), which changes whenever subscriptions are edited."""
     try:
-        for filename in os.listdir(FEEDS_DIR):
-            filepath = os.path.join(FEEDS_DIR, filename)
-            if not os.path.isfile(filepath):
-                continue
-
-            items = parse_feed_file(filepath)
-            for item in items:
-                item['watched'] = item['link'] in watched_urls
-                item['bookmarked'] = item['link'] in bookmarked_urls
-                item['starred'] = item['link'] in starred_urls
-                item['disliked'] = item['link'] in disliked_urls
-            all_items.extend(items)
-    except Exception as e:
-        print(f"Critical error reading feeds directory: {e}")
-
-    # Deduplicate by URL, keeping only the most recent entry for each URL
-    url_to_item = {}
-    for item in all_items:
-        url = item['link']
-        if url not in url_to_item:
-            url_to_item[url] = item
-        else:
-            # Keep the item with the most recent timestamp
-            existing_timestamp = int(url_to_item[url]['timestamp']) if str(url_to_item[url].get('timestamp')).isdigit() else 0
-            current_timestamp = int(item['timestamp']) if str(item.get('timestamp')).isdigit() else 0
-            if current_timestamp > existing_timestamp:
-                url_to_item[url] = item
-
-    # Convert back to list and sort by date descending
-    deduplicated_items = list(url_to_item.values())
-    deduplicated_items.sort(key=lambda x: int(x['timestamp']) if str(x.get('timestamp')).isdigit() else 0, reverse=True)
-    return deduplicated_items
-
-def format_url_for_sfeed_markread(url):
-    """Ensures the URL has a trailing newline for the sfeed_markread command."""
-    return url if url.endswith('\n') else url + '\n'
+        stat = os.stat(SFEEDRC_FILE)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
 def parse_sfeedrc():
     """Parses the sfeedrc file to extract feed information."""
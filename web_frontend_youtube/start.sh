@@ -16,13 +16,6 @@ if [ ! -d "$HOME/rss/youtube/feeds" ]; then
     echo ""
 fi
 
-# Check if sfeed_markread is available
-if ! command -v sfeed_markread &> /dev/null; then
-    echo "Warning: sfeed_markread command not found!"
-    echo "Please make sure sfeed is installed and in your PATH."
-    echo ""
-fi
-
 # Create bookmarks file if it doesn't exist
 mkdir -p "$HOME/rss"
 touch "$HOME/rss/urls-bookmarks-youtube"